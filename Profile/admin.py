@@ -1,9 +1,9 @@
 from django.contrib import admin
-from .models import User, Post, Comment
-from .models import Notification, Message
+from .models import User, Post, Comment, TimelineEntry
+from .models import Notification, Message, FriendRequest
 
 
 admin.site.register([
-    User, Post, Comment,
-    Notification, Message
+    User, Post, Comment, TimelineEntry,
+    Notification, Message, FriendRequest
 ])
\ No newline at end of file
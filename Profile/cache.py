@@ -0,0 +1,131 @@
+"""
+Read-through caching for hot Profile data.
+
+Three namespaces are cached: post cards (a ``Post`` with its author),
+profile header stats and friend-id arrays (owned by ``Profile.graph``).
+Entries are loaded from the primary database, never a replica, and
+dropped by the signal handlers in ``Profile.signals``; every lookup is
+counted so the hit rate can be scraped from ``/metrics/cache/``.
+
+The backend is whatever ``CACHES[PROFILE_CACHE_ALIAS]`` is configured as;
+the project default is a bounded, strictly-LRU local-memory cache.
+"""
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .models import Post, User
+from .routers import primary_reads
+
+PROFILE_CACHE_ALIAS = getattr(settings, "PROFILE_CACHE_ALIAS", "default")
+PROFILE_CACHE_TIMEOUT = getattr(settings, "PROFILE_CACHE_TIMEOUT", 600)
+
+POST_CARD = "post-card"
+PROFILE_STATS = "profile-stats"
+FRIEND_IDS = "friend-ids"
+
+_MISSING = object()
+_lock = threading.Lock()
+_stats = defaultdict(lambda: {"hits": 0, "misses": 0, "invalidations": 0})
+
+
+def get_cache():
+    return caches[PROFILE_CACHE_ALIAS]
+
+
+def make_key(namespace, key):
+    return f"profile:{namespace}:{key}"
+
+
+def _record(namespace, event, amount=1):
+    with _lock:
+        _stats[namespace][event] += amount
+
+
+def record_hits(namespace, amount=1):
+    """Count lookups in ``namespace`` served from a cache this module does not manage itself."""
+    _record(namespace, "hits", amount)
+
+
+def record_misses(namespace, amount=1):
+    _record(namespace, "misses", amount)
+
+
+def cached(namespace, key, loader, timeout=PROFILE_CACHE_TIMEOUT):
+    """Return the cached value for ``key``, calling ``loader()`` and storing its result on a miss."""
+    cache_key = make_key(namespace, key)
+    value = get_cache().get(cache_key, _MISSING)
+    if value is not _MISSING:
+        _record(namespace, "hits")
+        return value
+    _record(namespace, "misses")
+    with primary_reads():
+        value = loader()
+    get_cache().set(cache_key, value, timeout)
+    return value
+
+
+def cached_many(namespace, keys, loader, timeout=PROFILE_CACHE_TIMEOUT):
+    """
+    Return ``{key: value}`` for ``keys`` with one cache round trip.
+
+    ``loader(missing_keys)`` must return a dict covering every missing key;
+    its values are stored together.
+    """
+    cache_keys = {make_key(namespace, key): key for key in keys}
+    found = get_cache().get_many(cache_keys)
+    values = {cache_keys[cache_key]: value for cache_key, value in found.items()}
+    missing = [key for key in cache_keys.values() if key not in values]
+    _record(namespace, "hits", len(values))
+    if missing:
+        _record(namespace, "misses", len(missing))
+        with primary_reads():
+            loaded = loader(missing)
+        get_cache().set_many({make_key(namespace, key): loaded[key] for key in missing}, timeout)
+        values.update(loaded)
+    return values
+
+
+def invalidate(namespace, *keys):
+    """
+    Drop cached entries now and again once the surrounding transaction commits.
+
+    The second delete closes the window in which another request could
+    re-cache a value read before the writing transaction committed.
+    """
+    cache_keys = [make_key(namespace, key) for key in keys]
+    if not cache_keys:
+        return
+    get_cache().delete_many(cache_keys)
+    transaction.on_commit(lambda: get_cache().delete_many(cache_keys))
+    _record(namespace, "invalidations", len(cache_keys))
+
+
+def metrics():
+    """Return a snapshot of ``{namespace: {"hits", "misses", "invalidations"}}``."""
+    with _lock:
+        return {namespace: dict(counts) for namespace, counts in _stats.items()}
+
+
+def reset_metrics():
+    with _lock:
+        _stats.clear()
+
+
+def get_post_card(post_id):
+    """Return the ``Post`` with its author loaded, or ``None`` if it does not exist."""
+    return cached(POST_CARD, post_id, lambda: Post.objects.select_related("user").filter(id=post_id).first())
+
+
+def get_profile_stats(user_id):
+    def load():
+        user = User.objects.filter(id=user_id).values("friend_count").first() or {"friend_count": 0}
+        return {
+            "post_count": Post.objects.filter(user_id=user_id).count(),
+            "friend_count": user["friend_count"],
+            "saved_count": User.saved_posts.through.objects.filter(user_id=user_id).count(),
+        }
+    return cached(PROFILE_STATS, user_id, load)
@@ -0,0 +1,64 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from django.db.models import Q
+
+from .models import Post
+
+FEED_PAGE_SIZE = 10
+
+
+@dataclass
+class FeedPage:
+    posts: list
+    next_cursor: str = None
+    liked_ids: set = field(default_factory=set)
+    saved_ids: set = field(default_factory=set)
+
+
+def encode_cursor(row) -> str:
+    """Encode the ``(created_at, id)`` position of a post (or any row with both fields)."""
+    return f"{row.created_at.isoformat()}_{row.id}"
+
+
+def decode_cursor(cursor: str):
+    """Return ``(created_at, id)`` for a cursor, or ``None`` if it is malformed."""
+    try:
+        created_at, post_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(created_at), int(post_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def feed_queryset():
+    # Comments are fetched by Profile.fragments, and only for cards not already cached.
+    return Post.objects.select_related("user").order_by("-created_at", "-id")
+
+
+def after_position(queryset, position, id_field="id"):
+    """Filter ``queryset`` to rows strictly older than a decoded cursor."""
+    created_at, row_id = position
+    return queryset.filter(
+        Q(created_at__lt=created_at) | Q(created_at=created_at, **{f"{id_field}__lt": row_id})
+    )
+
+
+def build_page(viewer, posts, page_size=FEED_PAGE_SIZE):
+    """Wrap up to ``page_size + 1`` ordered posts into a :class:`FeedPage`."""
+    next_cursor = None
+    if len(posts) > page_size:
+        posts = posts[:page_size]
+        next_cursor = encode_cursor(posts[-1])
+
+    page = FeedPage(posts=posts, next_cursor=next_cursor)
+    post_ids = [post.id for post in posts]
+    if viewer is not None and post_ids:
+        page.liked_ids = set(
+            Post.likes.through.objects.filter(user_id=viewer.id, post_id__in=post_ids)
+            .values_list("post_id", flat=True)
+        )
+        page.saved_ids = set(
+            viewer.saved_posts.through.objects.filter(user_id=viewer.id, post_id__in=post_ids)
+            .values_list("post_id", flat=True)
+        )
+    return page
@@ -0,0 +1,103 @@
+"""
+Cached post card HTML.
+
+A card is rendered once for all viewers and cached under the post id plus a
+version stamp: ``Post.version``, which likes, comments, edits and commenter
+renames bump, and the author's ``updated_at``. A changed post is therefore
+simply looked up under a new key; stale entries age out.
+
+Whatever depends on the viewer is left in the cached HTML as marked blocks
+that ``personalize`` resolves with one regex pass per card:
+
+* ``<!--only:KEY-->...<!--/only-->`` is kept when the viewer has ``KEY``
+  and dropped otherwise; ``<!--unless:KEY-->...<!--/unless-->`` is the
+  reverse. Keys are ``user:<viewer id>``, ``liked:<post id>`` and
+  ``saved:<post id>``.
+* ``<!--csrf-->`` becomes the request's CSRF hidden input.
+
+User text is autoescaped when the card is rendered, so it can never
+produce a marker.
+"""
+import re
+
+from django.conf import settings
+from django.db.models import Prefetch, prefetch_related_objects
+from django.middleware.csrf import get_token
+from django.template.loader import get_template
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+
+from . import cache
+from .models import Comment
+
+POST_FRAGMENT = "post-fragment"
+POST_FRAGMENT_TIMEOUT = getattr(settings, "POST_FRAGMENT_TIMEOUT", 3600)
+
+CARD_TEMPLATES = {
+    "feed": "Post/cards/feed.html",
+    "own-grid": "Post/cards/own_grid.html",
+    "grid": "Post/cards/grid.html",
+}
+# Card kinds that list the post's comments.
+WITH_COMMENTS = {"feed"}
+
+VIEWER_BLOCK = re.compile(r"<!--(only|unless):([a-z]+:\d+)-->(.*?)<!--/\1-->", re.S)
+CSRF_MARKER = "<!--csrf-->"
+
+
+def fragment_key(kind, post):
+    return f"{kind}:{post.id}:{post.version}.{post.user.updated_at.timestamp():.6f}"
+
+
+def viewer_keys(viewer, liked_ids=(), saved_ids=()):
+    keys = {f"liked:{post_id}" for post_id in liked_ids} | {f"saved:{post_id}" for post_id in saved_ids}
+    if viewer is not None:
+        keys.add(f"user:{viewer.id}")
+    return keys
+
+
+def personalize(html, keys, csrf_input=""):
+    def resolve(match):
+        kind, key, body = match.groups()
+        return body if (key in keys) == (kind == "only") else ""
+    return VIEWER_BLOCK.sub(resolve, html).replace(CSRF_MARKER, csrf_input)
+
+
+def render_cards(request, viewer, posts, kind="feed", liked_ids=(), saved_ids=(), eager=0):
+    """
+    Return ``viewer``'s rendering of the card for each of ``posts`` (authors loaded), in order.
+
+    Cards come from one ``get_many``; only the misses are rendered, and for
+    feed cards only the misses have their comments fetched. The first
+    ``eager`` cards drop ``loading="lazy"`` since they are above the fold.
+    """
+    if not posts:
+        return []
+    keys = {post.id: cache.make_key(POST_FRAGMENT, fragment_key(kind, post)) for post in posts}
+    backend = cache.get_cache()
+    found = backend.get_many(list(keys.values()))
+    missing = [post for post in posts if keys[post.id] not in found]
+    cache.record_hits(POST_FRAGMENT, len(posts) - len(missing))
+
+    if missing:
+        cache.record_misses(POST_FRAGMENT, len(missing))
+        if kind in WITH_COMMENTS:
+            prefetch_related_objects(
+                missing, Prefetch("comments", queryset=Comment.objects.select_related("user").order_by("created_at")),
+            )
+        template = get_template(CARD_TEMPLATES[kind])
+        rendered = {keys[post.id]: template.render({"post": post}) for post in missing}
+        backend.set_many(rendered, POST_FRAGMENT_TIMEOUT)
+        found.update(rendered)
+
+    keys_for_viewer = viewer_keys(viewer, liked_ids, saved_ids)
+    csrf_input = ""
+    if CSRF_MARKER in found[keys[posts[0].id]]:
+        csrf_input = format_html('<input type="hidden" name="csrfmiddlewaretoken" value="{}">', get_token(request))
+    cards = []
+    for position, post in enumerate(posts):
+        html = personalize(found[keys[post.id]], keys_for_viewer, csrf_input)
+        if position < eager:
+            html = html.replace(' loading="lazy"', "")
+        cards.append(mark_safe(html))
+    return cards
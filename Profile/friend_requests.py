@@ -0,0 +1,137 @@
+"""
+Two-phase friendships: a request, then an accept or decline.
+
+Every write is settled inside one transaction by the database, not by a
+check made beforehand, so a double click or two concurrent requests do the
+work (and send the notification) once:
+
+* ``send`` inserts the request in a savepoint; losing the unique
+  constraint to another insert is a no-op, as with ``INSERT ... ON
+  CONFLICT DO NOTHING``. A declined or stale request is reopened by a
+  conditional ``UPDATE``, which likewise only one caller can win.
+* ``respond`` moves only requests that are still pending, locking them
+  first, and adds the friendships with ``friends.add``, which inserts the
+  through rows ignoring conflicts.
+
+Sending a request to someone who already asked you accepts theirs.
+Notifications are queued only for the writes that happened, after the
+transaction commits.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .identity import invalidate_user
+from .models import FriendRequest, User
+from .timeline import on_friend_added
+from .utils import create_notification
+
+# Outcomes of ``send``.
+SENT = "sent"
+ALREADY_SENT = "already sent"
+ACCEPTED = "accepted"
+ALREADY_FRIENDS = "already friends"
+SELF = "self"
+
+Friendship = User.friends.through
+
+
+def _notify_after_commit(sender, receiver, verb, link):
+    transaction.on_commit(lambda: create_notification(sender=sender, receiver=receiver, verb=verb, link=link))
+
+
+def send(sender, receiver):
+    """Ask ``receiver`` to be ``sender``'s friend; returns one of the outcome constants above."""
+    if sender.id == receiver.id:
+        return SELF
+    with transaction.atomic():
+        if Friendship.objects.filter(from_user_id=sender.id, to_user_id=receiver.id).exists():
+            return ALREADY_FRIENDS
+        theirs = FriendRequest.objects.filter(from_user=receiver, to_user=sender, status=FriendRequest.PENDING).first()
+        if theirs is not None and respond(sender, [theirs.id], accept=True):
+            return ACCEPTED
+        try:
+            with transaction.atomic():
+                FriendRequest.objects.create(from_user=sender, to_user=receiver)
+        except IntegrityError:
+            # A request exists already, maybe from a concurrent click. Reopen it
+            # if it was declined, or accepted before an unfriend; otherwise do nothing.
+            reopened = (
+                FriendRequest.objects.filter(from_user=sender, to_user=receiver)
+                .exclude(status=FriendRequest.PENDING)
+                .update(status=FriendRequest.PENDING, created_at=timezone.now(), responded_at=None)
+            )
+            if not reopened:
+                return ALREADY_SENT
+        _notify_after_commit(sender, receiver, "sent you a friend request", "/friend-requests/")
+    return SENT
+
+
+def respond(user, request_ids, accept):
+    """
+    Accept or decline those of ``request_ids`` that are pending and addressed
+    to ``user``; returns the ``FriendRequest`` rows that changed.
+    """
+    now = timezone.now()
+    status = FriendRequest.ACCEPTED if accept else FriendRequest.DECLINED
+    new_friend_ids = []
+    with transaction.atomic():
+        requests = list(
+            FriendRequest.objects.select_for_update(of=("self",))
+            .select_related("from_user")
+            .filter(id__in=request_ids, to_user=user, status=FriendRequest.PENDING)
+        )
+        if not requests:
+            return []
+        FriendRequest.objects.filter(id__in=[r.id for r in requests]).update(status=status, responded_at=now)
+        if accept:
+            sender_ids = {r.from_user_id for r in requests}
+            existing = set(
+                Friendship.objects.filter(from_user_id=user.id, to_user_id__in=sender_ids)
+                .values_list("to_user_id", flat=True)
+            )
+            new_friend_ids = sorted(sender_ids - existing)
+            if new_friend_ids:
+                user.friends.add(*new_friend_ids)
+                User.objects.filter(id__in=new_friend_ids).update(friend_count=F("friend_count") + 1)
+                User.objects.filter(id=user.id).update(friend_count=F("friend_count") + len(new_friend_ids))
+            # Anything ``user`` had asked of the same people is settled too.
+            FriendRequest.objects.filter(
+                from_user=user, to_user_id__in=sender_ids, status=FriendRequest.PENDING,
+            ).update(status=FriendRequest.ACCEPTED, responded_at=now)
+        for r in requests:
+            r.status, r.responded_at = status, now
+            if r.from_user_id in new_friend_ids:
+                _notify_after_commit(user, r.from_user, "accepted your friend request", f"/profile/{user.id}/")
+
+    if new_friend_ids:
+        invalidate_user(user.id, *new_friend_ids)
+        user.refresh_from_db(fields=["friend_count"])
+        for r in requests:
+            if r.from_user_id in new_friend_ids:
+                on_friend_added(user, r.from_user)
+    return requests
+
+
+def pending_between(user, other):
+    """The pending request between ``user`` and ``other`` in either direction, or ``None``."""
+    return FriendRequest.objects.filter(
+        Q(from_user=user, to_user=other) | Q(from_user=other, to_user=user),
+        status=FriendRequest.PENDING,
+    ).first()
+
+
+def incoming(user):
+    return (
+        FriendRequest.objects.filter(to_user=user, status=FriendRequest.PENDING)
+        .select_related("from_user")
+        .order_by("-created_at", "-id")
+    )
+
+
+def outgoing(user):
+    return (
+        FriendRequest.objects.filter(from_user=user, status=FriendRequest.PENDING)
+        .select_related("to_user")
+        .order_by("-created_at", "-id")
+    )
@@ -0,0 +1,104 @@
+"""
+The friend graph, answered from cached adjacency arrays instead of joins.
+
+Each user's friend ids are cached as a sorted ``array("q")`` (8 bytes per
+friend, where a frozenset of ints costs several times that) under the
+``cache.FRIEND_IDS`` namespace; ``Profile.signals`` drops the arrays of
+both sides whenever ``User.friends`` changes. On top of them:
+
+* ``is_friend`` is a binary search;
+* ``mutual_count(s)`` intersect two arrays as sets;
+* ``suggestions`` counts friends of friends, fetching all of a user's
+  friends' arrays in one cache round trip and any missing ones in one query.
+
+These read the cache, so they may trail a write made by another request
+for a moment; ``User.add_friend`` and ``remove_friend`` keep checking the
+database inside their transaction.
+"""
+import heapq
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from . import cache
+from .models import User
+
+# Friends-of-friends are counted over at most this many of a user's friends,
+# spread evenly over the sorted ids, so users with huge friend lists stay cheap.
+SUGGESTION_FRIEND_SAMPLE = 200
+
+Friendship = User.friends.through
+
+
+def _load(user_ids):
+    adjacency = defaultdict(list)
+    rows = (
+        Friendship.objects.filter(from_user_id__in=user_ids)
+        .order_by("from_user_id", "to_user_id")
+        .values_list("from_user_id", "to_user_id")
+    )
+    for from_id, to_id in rows:
+        adjacency[from_id].append(to_id)
+    return {user_id: array("q", adjacency[user_id]) for user_id in user_ids}
+
+
+def friend_ids(user_id):
+    """Return the ids of ``user_id``'s friends as a sorted ``array("q")``."""
+    return cache.cached(cache.FRIEND_IDS, user_id, lambda: _load([user_id])[user_id])
+
+
+def friend_ids_many(user_ids):
+    """Return ``{user_id: friend_ids(user_id)}`` with one cache round trip and at most one query."""
+    return cache.cached_many(cache.FRIEND_IDS, user_ids, _load)
+
+
+def contains(ids, user_id):
+    """Whether the sorted array ``ids`` contains ``user_id``."""
+    index = bisect_left(ids, user_id)
+    return index < len(ids) and ids[index] == user_id
+
+
+def is_friend(user_id, other_id):
+    return contains(friend_ids(user_id), other_id)
+
+
+def mutual_counts(user_id, other_ids):
+    """Return ``{other_id: number of friends shared with user_id}``."""
+    ids = friend_ids_many([user_id, *other_ids])
+    mine = set(ids[user_id])
+    return {other_id: len(mine.intersection(ids[other_id])) for other_id in other_ids}
+
+
+def mutual_count(user_id, other_id):
+    return mutual_counts(user_id, [other_id])[other_id]
+
+
+def suggestions(user_id, limit=5):
+    """
+    Return up to ``limit`` ``(user_id, mutual_count)`` pairs for people who
+    are not yet friends with ``user_id``: most mutual friends first, then
+    lowest id.
+    """
+    mine = friend_ids(user_id)
+    step = -(-len(mine) // SUGGESTION_FRIEND_SAMPLE) or 1
+    counts = Counter()
+    for ids in friend_ids_many(list(mine[::step])).values():
+        counts.update(ids)
+    excluded = set(mine)
+    excluded.add(user_id)
+    best = heapq.nsmallest(
+        limit, ((-count, candidate) for candidate, count in counts.items() if candidate not in excluded)
+    )
+    return [(candidate, -count) for count, candidate in best]
+
+
+def suggested_users(user_id, limit=5):
+    """``suggestions`` as ``User`` objects, each with a ``mutual_count`` attribute."""
+    picks = suggestions(user_id, limit)
+    people = User.objects.in_bulk([candidate for candidate, _ in picks])
+    users = []
+    for candidate, count in picks:
+        if candidate in people:
+            people[candidate].mutual_count = count
+            users.append(people[candidate])
+    return users
@@ -0,0 +1,75 @@
+"""
+Resolve the logged-in ``User`` once per request.
+
+The row is also kept in the cache under a versioned key, so authenticated
+page views normally make no user query at all. ``User.save`` and the
+counter updates on ``User`` bump the version, which orphans stale copies.
+The version is bumped again once the writing transaction commits, so a
+copy read before the commit cannot outlive it, and misses are read from
+the primary so a lagging replica cannot refill the new version with the
+old row. A version evicted from the cache restarts from the current time,
+never from a number an older copy may still be stored under.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .routers import primary_reads
+
+USER_CACHE_TIMEOUT = getattr(settings, "USER_CACHE_TIMEOUT", 300)
+
+
+def _version_key(user_id):
+    return f"profile:user:{user_id}:version"
+
+
+def _user_key(user_id, version):
+    return f"profile:user:{user_id}:v{version}"
+
+
+def _current_version(user_id):
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(_version_key(user_id), version, None):
+            version = cache.get(_version_key(user_id), version)
+    return version
+
+
+def _bump(user_ids):
+    for user_id in user_ids:
+        try:
+            cache.incr(_version_key(user_id))
+        except ValueError:
+            cache.set(_version_key(user_id), time.time_ns(), None)
+
+
+def invalidate_user(*user_ids):
+    if not user_ids:
+        return
+    _bump(user_ids)
+    transaction.on_commit(lambda: _bump(user_ids))
+
+
+def load_user(user_id):
+    from .models import User
+
+    if not user_id:
+        return None
+    key = _user_key(user_id, _current_version(user_id))
+    user = cache.get(key)
+    if user is None:
+        with primary_reads():
+            user = User.objects.filter(id=user_id).first()
+        if user is not None:
+            cache.set(key, user, USER_CACHE_TIMEOUT)
+    return user
+
+
+def get_session_user(request):
+    """Return the ``User`` stored in the session, resolving it at most once per request."""
+    if not hasattr(request, "_current_user"):
+        request._current_user = load_user(request.session.get("user_id"))
+    return request._current_user
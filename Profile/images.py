@@ -0,0 +1,211 @@
+"""
+Responsive image variants for ``Post.image`` and ``User.photo``.
+
+After an upload is committed, a background worker re-encodes the image at
+a few fixed widths as WebP and JPEG, with EXIF orientation applied and all
+metadata dropped, and records the variant paths (and, for posts, the
+original dimensions) on the row. An original that carries EXIF (camera
+serial, GPS position) is replaced by a copy without it. Templates render them through the
+``images`` template tags and fall back to the original file until the
+variants exist.
+
+``IMAGE_PIPELINE["SYNC"]`` runs the work inline instead; the test suite
+does that.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from PIL import Image, ImageOps, JpegImagePlugin
+
+from . import cache
+from .identity import invalidate_user
+from .models import Post, User
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {"SYNC": False, "WORKERS": 2}
+POST_WIDTHS = (320, 640, 1080)
+AVATAR_SIZES = (64, 128, 256)
+FORMATS = (
+    ("webp", "WEBP", {"quality": 80, "method": 4}),
+    ("jpeg", "JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def pipeline_setting(name):
+    return getattr(settings, "IMAGE_PIPELINE", {}).get(name, DEFAULTS[name])
+
+
+def _open(field_file):
+    with field_file.open("rb") as handle:
+        image = Image.open(handle)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    if image.mode not in ("RGB", "L"):
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image.convert("RGBA"), mask=image.convert("RGBA").getchannel("A"))
+        image = background
+    return image.convert("RGB")
+
+
+def _encode(image, fmt, options):
+    buffer = BytesIO()
+    image.save(buffer, fmt, **options)  # no exif= argument, so no metadata is written
+    return ContentFile(buffer.getvalue())
+
+
+def strip_metadata(field_file):
+    """
+    Save a copy of ``field_file`` without EXIF and return its storage name,
+    or ``None`` if there was nothing to strip. The EXIF orientation is
+    applied to the pixels first, so the copy matches its variants and the
+    recorded size. JPEGs keep their quantization tables and subsampling, so
+    the copy is not visibly recompressed.
+    """
+    with field_file.open("rb") as handle:
+        image = Image.open(handle)
+        if not image.getexif():
+            return None
+        image.load()
+        fmt = image.format
+        options = {}
+        if fmt == "JPEG":
+            options = {"qtables": image.quantization, "subsampling": JpegImagePlugin.get_sampling(image)}
+        image = ImageOps.exif_transpose(image)
+        buffer = BytesIO()
+        image.save(buffer, fmt, **options)
+    return field_file.storage.save(field_file.name, ContentFile(buffer.getvalue()))
+
+
+def render_variants(field_file, widths, square=False):
+    """
+    Write resized copies of ``field_file`` and return ``(variants, (width, height))``.
+
+    ``variants`` maps format to ``{str(width): storage name}``. Widths larger
+    than the original are skipped (the smallest is always kept) so images
+    are never upscaled.
+    """
+    image = _open(field_file)
+    storage = field_file.storage
+    directory, filename = os.path.split(field_file.name)
+    stem = os.path.splitext(filename)[0]
+
+    variants = {ext: {} for ext, _, _ in FORMATS}
+    limit = min(image.size) if square else image.width
+    targets = [w for w in widths if w <= limit] or [min(widths)]
+    for width in targets:
+        if square:
+            resized = ImageOps.fit(image, (width, width), Image.LANCZOS)
+        else:
+            resized = image.copy()
+            resized.thumbnail((width, image.height), Image.LANCZOS)
+        for ext, fmt, options in FORMATS:
+            name = f"{directory}/variants/{stem}_{width}.{ext}"
+            variants[ext][str(width)] = storage.save(name, _encode(resized, fmt, options))
+    return variants, image.size
+
+
+def _delete_files(storage, variants, original=None):
+    for names in (variants or {}).values():
+        for name in names.values():
+            storage.delete(name)
+    if original:
+        storage.delete(original)
+
+
+def process_post_image(post_id):
+    post = Post.objects.filter(id=post_id).first()
+    if post is None or not post.image:
+        return
+    storage, original = post.image.storage, post.image.name
+    stripped = strip_metadata(post.image)
+    variants, (width, height) = render_variants(post.image, POST_WIDTHS)
+    # Only record the results if the image was not replaced while we worked.
+    updated = Post.objects.filter(id=post_id, image=original).update(
+        image=stripped or original, image_variants=variants, image_width=width, image_height=height,
+        version=F("version") + 1,
+    )
+    if updated:
+        _delete_files(storage, post.image_variants, original if stripped else None)
+        cache.invalidate(cache.POST_CARD, post_id)
+    else:
+        _delete_files(storage, variants, stripped)
+
+
+def process_user_photo(user_id):
+    user = User.objects.filter(id=user_id).first()
+    if user is None or not user.photo:
+        return
+    storage, original = user.photo.storage, user.photo.name
+    stripped = strip_metadata(user.photo)
+    variants, _ = render_variants(user.photo, AVATAR_SIZES, square=True)
+    updated = User.objects.filter(id=user_id, photo=original).update(
+        photo=stripped or original, photo_variants=variants, updated_at=timezone.now(),
+    )
+    if updated:
+        _delete_files(storage, user.photo_variants, original if stripped else None)
+        invalidate_user(user_id)
+    else:
+        _delete_files(storage, variants, stripped)
+
+
+def _run(job, *args):
+    try:
+        job(*args)
+    except Exception:
+        logger.exception("Image processing failed: %s%r", job.__name__, args)
+    finally:
+        close_old_connections()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=pipeline_setting("WORKERS"), thread_name_prefix="images")
+    return _executor
+
+
+def schedule(job, *args):
+    """Run ``job(*args)`` in the worker pool once the current transaction commits."""
+    if pipeline_setting("SYNC"):
+        try:
+            job(*args)
+        except Exception:
+            logger.exception("Image processing failed: %s%r", job.__name__, args)
+        return
+    transaction.on_commit(lambda: _get_executor().submit(_run, job, *args))
+
+
+def replace_post_image(post, upload):
+    """Assign a new upload to ``post``; the old variants are removed once the change commits."""
+    old = post.image_variants
+    post.image, post.image_variants, post.image_width, post.image_height = upload, {}, None, None
+    transaction.on_commit(lambda: _delete_files(post.image.storage, old))
+
+
+def replace_user_photo(user, upload):
+    old = user.photo_variants
+    user.photo, user.photo_variants = upload, {}
+    transaction.on_commit(lambda: _delete_files(user.photo.storage, old))
+
+
+def schedule_post_image(post):
+    if post.image:
+        schedule(process_post_image, post.id)
+
+
+def schedule_user_photo(user):
+    if user.photo:
+        schedule(process_user_photo, user.id)
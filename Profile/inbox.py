@@ -0,0 +1,70 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .feed import after_position, decode_cursor, encode_cursor
+from .models import Conversation, Message
+
+HISTORY_PAGE_SIZE = 30
+
+
+def conversation_list(user, query=""):
+    """
+    Return ``user``'s friends annotated for the chat sidebar in a single query.
+
+    Each friend carries ``unread`` (messages they sent that ``user`` has not
+    read), ``last_text``/``last_attachment`` (preview of the latest message in
+    either direction) and ``last_activity``. Friends with recent messages come
+    first; friends never messaged follow alphabetically.
+    """
+    # The pair's conversation, found with two point lookups on the unique
+    # (low_user, high_user) index rather than an OR.
+    conversation = Coalesce(
+        Subquery(Conversation.objects.filter(low_user=user, high_user=OuterRef("pk")).values("id")[:1]),
+        Subquery(Conversation.objects.filter(low_user=OuterRef("pk"), high_user=user).values("id")[:1]),
+    )
+    # Newest message first, read from message_history_idx.
+    latest = Message.objects.filter(conversation=OuterRef("conversation_id")).order_by("-created_at", "-id")
+    unread = (
+        Message.objects.filter(sender=OuterRef("pk"), receiver=user, is_read=False)
+        .order_by()
+        .values("receiver")
+        .annotate(total=Count("*"))
+        .values("total")
+    )
+
+    friends = user.friends.all()
+    if query:
+        friends = friends.filter(username__icontains=query)
+    return friends.annotate(
+        conversation_id=conversation,
+        unread=Coalesce(Subquery(unread, output_field=IntegerField()), 0),
+        last_text=Subquery(latest.values("text")[:1]),
+        last_attachment=Subquery(latest.values("attachment")[:1]),
+        last_activity=Subquery(latest.values("created_at")[:1]),
+    ).order_by(F("last_activity").desc(nulls_last=True), "username")
+
+
+def message_history(user, other, before=None, page_size=HISTORY_PAGE_SIZE):
+    """
+    Return ``(messages, older_cursor)`` for the conversation between two users.
+
+    Messages are read newest-first from the ``(conversation, created_at)``
+    index, one keyset page at a time, and returned oldest-first for display.
+    ``older_cursor`` is ``None`` once the start of the conversation is reached.
+    """
+    conversation = Conversation.between(user, other, create=False)
+    if conversation is None:
+        return [], None
+
+    history = conversation.messages.select_related("sender").order_by("-created_at", "-id")
+    position = decode_cursor(before) if before else None
+    if position:
+        history = after_position(history, position)
+    page = list(history[:page_size + 1])
+
+    older_cursor = None
+    if len(page) > page_size:
+        page = page[:page_size]
+        older_cursor = encode_cursor(page[-1])
+    page.reverse()
+    return page, older_cursor
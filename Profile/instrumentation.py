@@ -0,0 +1,207 @@
+"""
+Per-request query and timing instrumentation.
+
+With ``REQUEST_INSTRUMENTATION["ENABLED"]`` set, ``InstrumentationMiddleware``
+records for every request:
+
+* the number of queries and the time spent in the database, through
+  ``connection.execute_wrapper`` on every configured database;
+* how often each query *shape* ran: SQL is fingerprinted with ``IN (...)``
+  lists and literals collapsed, so an N+1 loop shows up as one fingerprint
+  with a high count;
+* template render time (outermost renders only, so includes are not
+  counted twice) and view time.
+
+Each request is logged as one JSON line on the ``Profile.instrumentation``
+logger and summarized in a ``Server-Timing`` header, which browser dev
+tools display. A ``SLOW_SAMPLE_RATE`` fraction of requests also records
+where repeated queries come from (the innermost project stack frames and
+the template being rendered); when such a request is slower than
+``SLOW_REQUEST_MS`` or repeats a query ``DUPLICATE_THRESHOLD`` times, that
+detail goes to ``Profile.instrumentation.slow``.
+
+When disabled the middleware raises ``MiddlewareNotUsed`` at startup, so
+Django drops it from the chain and requests pay nothing.
+"""
+import json
+import logging
+import os
+import random
+import re
+import time
+import traceback
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import Template as DjangoTemplate
+
+logger = logging.getLogger(__name__)
+slow_logger = logging.getLogger(f"{__name__}.slow")
+
+DEFAULTS = {
+    "ENABLED": False,
+    "SERVER_TIMING": True,
+    "SLOW_REQUEST_MS": 500,
+    "SLOW_SAMPLE_RATE": 0.1,
+    "DUPLICATE_THRESHOLD": 3,
+    "STACK_DEPTH": 4,
+}
+
+IN_LIST = re.compile(r"\(\s*%s(?:\s*,\s*%s)*\s*\)")
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+
+_current = ContextVar("request_metrics", default=None)
+
+
+def instrumentation_setting(name):
+    return getattr(settings, "REQUEST_INSTRUMENTATION", {}).get(name, DEFAULTS[name])
+
+
+def fingerprint(sql):
+    """``sql`` with parameter lists and literals collapsed, so repeats of one query shape compare equal."""
+    sql = IN_LIST.sub("(...)", sql)
+    sql = STRING_LITERAL.sub("?", sql)
+    sql = NUMBER_LITERAL.sub("?", sql)
+    return " ".join(sql.split())
+
+
+def _is_project_frame(filename):
+    return (
+        filename.startswith(str(settings.BASE_DIR))
+        and "site-packages" not in filename
+        and filename != __file__
+    )
+
+
+def origin(templates):
+    """The innermost project frames of the current stack, plus the template being rendered, if any."""
+    frames = [frame for frame in traceback.extract_stack() if _is_project_frame(frame.filename)]
+    depth = instrumentation_setting("STACK_DEPTH")
+    parts = [
+        f"{os.path.relpath(frame.filename, settings.BASE_DIR)}:{frame.lineno} in {frame.name}"
+        for frame in reversed(frames[-depth:])
+    ]
+    if templates:
+        parts.insert(0, f"template {templates[-1]}")
+    return " < ".join(parts)
+
+
+class RequestMetrics:
+    """Collects one request's figures; also usable directly as an ``execute_wrapper``."""
+
+    def __init__(self, capture_stacks=False):
+        self.capture_stacks = capture_stacks
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.templates = []  # names of the templates currently rendering, outermost first
+        self.fingerprints = Counter()
+        self.origins = defaultdict(Counter)
+        self.view_started = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+            key = fingerprint(sql)
+            self.fingerprints[key] += 1
+            # The first run of a shape is not a repeat; only pay for the stack once it is.
+            if self.capture_stacks and self.fingerprints[key] > 1:
+                self.origins[key][origin(self.templates)] += 1
+
+    def duplicates(self, threshold):
+        return [
+            {"sql": sql[:500], "count": count, "origins": dict(self.origins[sql].most_common(3))}
+            for sql, count in self.fingerprints.most_common()
+            if count >= threshold
+        ]
+
+
+_render = DjangoTemplate.render
+
+
+def _timed_render(self, context=None, request=None):
+    metrics = _current.get()
+    if metrics is None:
+        return _render(self, context, request)
+    metrics.templates.append(self.template.name)
+    started = time.perf_counter()
+    try:
+        return _render(self, context, request)
+    finally:
+        metrics.templates.pop()
+        if not metrics.templates:
+            metrics.template_time += time.perf_counter() - started
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+class InstrumentationMiddleware:
+    """Time each request's queries, templates and view; see the module docstring. Place it near the top."""
+
+    def __init__(self, get_response):
+        if not instrumentation_setting("ENABLED"):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        DjangoTemplate.render = _timed_render
+
+    def __call__(self, request):
+        metrics = RequestMetrics(capture_stacks=random.random() < instrumentation_setting("SLOW_SAMPLE_RATE"))
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        finished = time.perf_counter()
+        self.report(request, response, metrics, finished - started, finished)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.view_started = time.perf_counter()
+
+    def report(self, request, response, metrics, total, finished):
+        view_time = finished - metrics.view_started if metrics.view_started else 0.0
+        match = getattr(request, "resolver_match", None)
+        threshold = instrumentation_setting("DUPLICATE_THRESHOLD")
+        duplicates = metrics.duplicates(threshold)
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "view": match.view_name if match else None,
+            "status": response.status_code,
+            "queries": metrics.queries,
+            "db_ms": _ms(metrics.db_time),
+            "template_ms": _ms(metrics.template_time),
+            "view_ms": _ms(view_time),
+            "total_ms": _ms(total),
+            "duplicates": [{"sql": d["sql"], "count": d["count"]} for d in duplicates],
+        }
+        logger.info(json.dumps(record))
+
+        slow = total * 1000 >= instrumentation_setting("SLOW_REQUEST_MS")
+        if metrics.capture_stacks and (slow or duplicates):
+            slow_logger.warning(json.dumps({**record, "slow": slow, "duplicates": duplicates}))
+
+        if instrumentation_setting("SERVER_TIMING"):
+            response["Server-Timing"] = ", ".join([
+                f'db;dur={record["db_ms"]};desc="{metrics.queries} queries"',
+                f'tpl;dur={record["template_ms"]};desc="templates"',
+                f'view;dur={record["view_ms"]};desc="view"',
+                f'total;dur={record["total_ms"]};desc="request"',
+            ])
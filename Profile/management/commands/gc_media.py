@@ -0,0 +1,105 @@
+import os
+import time
+from collections import Counter
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from Profile.models import Message, Post, StoredFile, User
+
+MEDIA_DIRS = ("posts", "profile", "messages")
+
+
+def referenced_names():
+    """Count how many field values point at each media file, variants included."""
+    refs = Counter()
+    for model, field, variants_field in (
+        (Post, "image", "image_variants"), (User, "photo", "photo_variants"), (Message, "attachment", None),
+    ):
+        columns = [field, variants_field] if variants_field else [field]
+        for row in model.objects.exclude(**{field: ""}).exclude(**{f"{field}__isnull": True}).values_list(*columns).iterator():
+            refs[row[0]] += 1
+            if variants_field:
+                for group in (row[1] or {}).values():
+                    refs.update(group.values())
+    return refs
+
+
+def walk(storage, directory):
+    directories, files = storage.listdir(directory)
+    for name in files:
+        yield f"{directory}/{name}"
+    for child in directories:
+        yield from walk(storage, f"{directory}/{child}")
+
+
+def _size(num_bytes):
+    return f"{num_bytes / (1024 * 1024):.1f} MB"
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount media references, delete files nothing points at and report the space "
+        "content-addressed storage saves through deduplication."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace", type=int, default=3600,
+            help="Leave unreferenced files younger than this many seconds alone; they may belong to an upload in flight.",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Report what would be removed without removing it.")
+
+    def handle(self, *args, **options):
+        storage = default_storage
+        cutoff = time.time() - options["grace"]
+        dry_run = options["dry_run"]
+
+        fixed, counted = 0, {}
+        with transaction.atomic():
+            # Lock the rows before counting, so uploads cannot change the counts underneath.
+            for stored in StoredFile.objects.select_for_update().iterator():
+                counted[stored.name] = stored.refcount
+            refs = referenced_names()
+            for name, refcount in counted.items():
+                actual = refs.get(name, 0)
+                if actual and actual != refcount:
+                    fixed += 1
+                    if not dry_run:
+                        StoredFile.objects.filter(name=name).update(refcount=actual)
+
+        removed, reclaimed = 0, 0
+        for directory in MEDIA_DIRS:
+            if not storage.exists(directory):
+                continue
+            for name in walk(storage, directory):
+                if name in refs or os.path.basename(name).startswith("."):
+                    continue
+                path = storage.path(name)
+                if os.path.getmtime(path) > cutoff:
+                    continue
+                with transaction.atomic():
+                    # A deduplicated upload takes a reference without rewriting the file,
+                    # so its age says nothing; a count that moved since the snapshot does.
+                    stored = StoredFile.objects.select_for_update().filter(name=name).first()
+                    if stored is not None and stored.refcount != counted.get(name, 0):
+                        continue
+                    removed += 1
+                    reclaimed += os.path.getsize(path)
+                    if not dry_run:
+                        StoredFile.objects.filter(name=name).delete()
+                        os.remove(path)
+        if not dry_run:
+            # Rows whose file is already gone, e.g. removed by hand.
+            missing = [name for name in counted if name not in refs and not storage.exists(name)]
+            StoredFile.objects.filter(name__in=missing).delete()
+
+        usage = storage.usage() if hasattr(storage, "usage") else None
+        verb = "Would remove" if dry_run else "Removed"
+        self.stdout.write(f"{verb} {removed} unreferenced files ({_size(reclaimed)}); corrected {fixed} reference counts.")
+        if usage:
+            self.stdout.write(
+                f"{usage['files']} stored files, {_size(usage['stored_bytes'])} on disk for "
+                f"{_size(usage['referenced_bytes'])} referenced: deduplication saves {_size(usage['saved_bytes'])}."
+            )
@@ -0,0 +1,61 @@
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from Profile.models import Notification
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete read notifications older than a retention period, optionally archiving them to a JSON Lines file. "
+        "Rows are removed in small batches, each in its own short transaction, so SQLite's write lock is never held for long."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=getattr(settings, "NOTIFICATION_RETENTION_DAYS", 30),
+            help="Keep read notifications younger than this many days (default: NOTIFICATION_RETENTION_DAYS or 30).",
+        )
+        parser.add_argument("--batch-size", type=int, default=500, help="Rows deleted per transaction.")
+        parser.add_argument("--pause", type=float, default=0.05, help="Seconds to sleep between batches.")
+        parser.add_argument("--archive", metavar="PATH", help="Append each deleted row to this JSON Lines file first.")
+        parser.add_argument("--dry-run", action="store_true", help="Only report how many rows would be removed.")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options["days"])
+        expired = Notification.objects.filter(is_read=True, created_at__lt=cutoff)
+        if options["dry_run"]:
+            self.stdout.write(f"{expired.count()} read notifications older than {options['days']} days.")
+            return
+
+        archive = open(options["archive"], "a", encoding="utf-8") if options["archive"] else None
+        removed = 0
+        try:
+            while True:
+                with transaction.atomic():
+                    batch = list(
+                        expired.order_by("created_at", "id")
+                        .values("id", "sender_id", "receiver_id", "message", "link", "verb", "actor_count", "created_at")
+                        [:options["batch_size"]]
+                    )
+                    if not batch:
+                        break
+                    if archive:
+                        # Archived before the delete commits: a failure can duplicate rows, never lose them.
+                        for row in batch:
+                            archive.write(json.dumps(row, default=str) + "\n")
+                        archive.flush()
+                    Notification.objects.filter(id__in=[row["id"] for row in batch]).delete()
+                removed += len(batch)
+                if options["pause"]:
+                    time.sleep(options["pause"])
+        finally:
+            if archive:
+                archive.close()
+
+        self.stdout.write(self.style.SUCCESS(f"Removed {removed} read notifications older than {options['days']} days."))
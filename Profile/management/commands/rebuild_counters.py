@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from Profile.models import Comment, Post, User
+
+
+def _count(model, fk_name):
+    counts = (
+        model.objects.filter(**{fk_name: OuterRef("pk")})
+        .order_by()
+        .values(fk_name)
+        .annotate(total=Count("*"))
+        .values("total")
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+# (model, counter field, source table, foreign key on the source table)
+COUNTERS = [
+    (Post, "like_count", Post.likes.through, "post"),
+    (Post, "comment_count", Comment, "post"),
+    (User, "friend_count", User.friends.through, "from_user"),
+]
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized like, comment and friend counters from their source tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check", action="store_true",
+            help="Only report rows whose counters disagree with the source tables; exit non-zero if any do.",
+        )
+
+    def handle(self, *args, **options):
+        drift = 0
+        for model, field, source, fk_name in COUNTERS:
+            actual = _count(source, fk_name)
+            stale = model.objects.alias(actual=actual).filter(~Q(**{field: actual}))
+            if options["check"]:
+                mismatched = stale.count()
+                drift += mismatched
+                self.stdout.write(f"{model.__name__}.{field}: {mismatched} mismatched rows")
+                continue
+            with transaction.atomic():
+                updated = stale.update(**{field: actual})
+            self.stdout.write(f"{model.__name__}.{field}: fixed {updated} rows")
+
+        if drift:
+            raise CommandError(f"{drift} counters are out of sync; run without --check to rebuild them.")
+        self.stdout.write(self.style.SUCCESS("Counters are consistent."))
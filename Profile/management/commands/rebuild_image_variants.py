@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from Profile.images import process_post_image, process_user_photo
+from Profile.models import Post, User
+
+
+class Command(BaseCommand):
+    help = "Generate responsive image variants for posts and profile photos that do not have them yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Regenerate variants that already exist too.")
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image="")
+        users = User.objects.exclude(photo="").exclude(photo=None)
+        if not options["all"]:
+            posts = posts.filter(image_variants={})
+            users = users.filter(photo_variants={})
+
+        failed = 0
+        for job, ids in ((process_post_image, posts.values_list("id", flat=True)),
+                         (process_user_photo, users.values_list("id", flat=True))):
+            for object_id in ids.iterator():
+                try:
+                    job(object_id)
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f"{job.__name__}({object_id}): {exc}")
+        self.stdout.write(self.style.SUCCESS(f"Image variants rebuilt ({failed} failed)."))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from Profile.search import get_backend, get_post_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the user and post search indexes from their source tables."
+
+    def handle(self, *args, **options):
+        get_backend().rebuild()
+        get_post_backend().rebuild()
+        self.stdout.write(self.style.SUCCESS("Search indexes rebuilt."))
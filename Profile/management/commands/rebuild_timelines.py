@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from Profile.models import User
+from Profile.timeline import rebuild_timeline
+
+
+class Command(BaseCommand):
+    help = "Rebuild materialized home timelines from each user's own and friends' recent posts."
+
+    def add_arguments(self, parser):
+        parser.add_argument("user_ids", nargs="*", type=int, help="Only rebuild these users' timelines.")
+
+    def handle(self, *args, **options):
+        users = User.objects.only("id", "friend_count").order_by("id")
+        if options["user_ids"]:
+            users = users.filter(id__in=options["user_ids"])
+
+        rebuilt = 0
+        for user in users.iterator(chunk_size=500):
+            rebuild_timeline(user)
+            rebuilt += 1
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rebuilt} timelines."))
@@ -0,0 +1,34 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from Profile.routers import PRIMARY
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database over each SQLite read replica. Run it whenever the "
+        "replicas should catch up; between runs they lag like a real replica would."
+    )
+
+    def handle(self, *args, **options):
+        primary = connections[PRIMARY]
+        if primary.vendor != "sqlite":
+            raise CommandError("The primary database is not SQLite; replicate it with the database's own tools.")
+        if not settings.READ_REPLICAS:
+            raise CommandError("No read replicas are configured; set DATABASE_REPLICAS.")
+
+        primary.ensure_connection()
+        for alias in settings.READ_REPLICAS:
+            replica = connections[alias]
+            if replica.vendor != "sqlite":
+                raise CommandError(f"Replica {alias} is not SQLite.")
+            replica.close()
+            target = sqlite3.connect(replica.settings_dict["NAME"])
+            try:
+                primary.connection.backup(target)
+            finally:
+                target.close()
+            self.stdout.write(f"Copied {primary.settings_dict['NAME']} to {alias} ({replica.settings_dict['NAME']}).")
@@ -0,0 +1,14 @@
+from django.utils.functional import SimpleLazyObject
+
+from .identity import get_session_user
+
+
+class CurrentUserMiddleware:
+    """Attach the session's ``User`` to ``request.current_user``, loaded on first access."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.current_user = SimpleLazyObject(lambda: get_session_user(request))
+        return self.get_response(request)
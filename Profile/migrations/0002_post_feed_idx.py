@@ -0,0 +1,17 @@
+# Generated by Django 5.0.2 on 2026-10-17 03:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Profile', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-created_at', '-id'], name='post_feed_idx'),
+        ),
+    ]
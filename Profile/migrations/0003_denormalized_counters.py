@@ -0,0 +1,50 @@
+# Generated by Django 5.0.2 on 2026-10-17 03:49
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    Post = apps.get_model('Profile', 'Post')
+    User = apps.get_model('Profile', 'User')
+    Comment = apps.get_model('Profile', 'Comment')
+
+    def count(model, fk_name):
+        counts = (
+            model.objects.filter(**{fk_name: OuterRef('pk')})
+            .order_by().values(fk_name).annotate(total=Count('*')).values('total')
+        )
+        return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+    Post.objects.update(
+        like_count=count(Post.likes.through, 'post'),
+        comment_count=count(Comment, 'post'),
+    )
+    User.objects.update(friend_count=count(User.friends.through, 'from_user'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Profile', '0002_post_feed_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='friend_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,99 @@
+# Generated by Django 5.0.2 on 2026-10-17 03:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_timelines(apps, schema_editor):
+    """
+    Build every existing user's timeline as ``rebuild_timeline`` would: each
+    author's most recent posts go to the author and, unless they have more
+    than ``TIMELINE_FANOUT_LIMIT`` friends, to each of their friends.
+    """
+    fanout_limit = getattr(settings, 'TIMELINE_FANOUT_LIMIT', 1000)
+    backfill_size = getattr(settings, 'TIMELINE_BACKFILL_SIZE', 100)
+    User = apps.get_model('Profile', 'User')
+    Post = apps.get_model('Profile', 'Post')
+    TimelineEntry = apps.get_model('Profile', 'TimelineEntry')
+    quote = schema_editor.connection.ops.quote_name
+    tables = {
+        'timeline': quote(TimelineEntry._meta.db_table),
+        'post': quote(Post._meta.db_table),
+        'user': quote(User._meta.db_table),
+        'friends': quote(User.friends.through._meta.db_table),
+    }
+    recent = """
+        SELECT id, user_id, created_at FROM (
+            SELECT id, user_id, created_at,
+                   ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY created_at DESC, id DESC) AS position
+            FROM {post}
+        ) ranked WHERE position <= %s
+    """.format(**tables)
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO {timeline} (owner_id, post_id, author_id, created_at)
+            SELECT p.user_id, p.id, p.user_id, p.created_at FROM ({recent}) p
+            """.format(recent=recent, **tables),
+            [backfill_size],
+        )
+        cursor.execute(
+            """
+            INSERT INTO {timeline} (owner_id, post_id, author_id, created_at)
+            SELECT f.to_user_id, p.id, p.user_id, p.created_at FROM ({recent}) p
+            JOIN {friends} f ON f.from_user_id = p.user_id
+            JOIN {user} u ON u.id = p.user_id
+            WHERE u.friend_count <= %s
+            """.format(recent=recent, **tables),
+            [backfill_size, fanout_limit],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Profile', '0003_denormalized_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='post_author_feed_idx'),
+        ),
+        migrations.AddField(
+            model_name='timelineentry',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='Profile.user'),
+        ),
+        migrations.AddField(
+            model_name='timelineentry',
+            name='owner',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='Profile.user'),
+        ),
+        migrations.AddField(
+            model_name='timelineentry',
+            name='post',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='Profile.post'),
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['owner', '-created_at', '-post'], name='timeline_range_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['owner', 'author'], name='timeline_author_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='timelineentry',
+            constraint=models.UniqueConstraint(fields=('owner', 'post'), name='unique_timeline_entry'),
+        ),
+        migrations.RunPython(backfill_timelines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.2 on 2026-10-17 03:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Profile', '0004_timeline'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['sender', 'receiver', '-created_at'], name='message_pair_idx'),
+        ),
+    ]
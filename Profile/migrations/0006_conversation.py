@@ -0,0 +1,61 @@
+# Generated by Django 5.0.2 on 2026-10-17 03:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_conversations(apps, schema_editor):
+    Conversation = apps.get_model('Profile', 'Conversation')
+    Message = apps.get_model('Profile', 'Message')
+
+    pairs = Message.objects.filter(conversation__isnull=True).values_list('sender_id', 'receiver_id').distinct()
+    keys = {(min(pair), max(pair)) for pair in pairs}
+    for low, high in keys:
+        conversation, _ = Conversation.objects.get_or_create(low_user_id=low, high_user_id=high)
+        Message.objects.filter(
+            models.Q(sender_id=low, receiver_id=high) | models.Q(sender_id=high, receiver_id=low),
+            conversation__isnull=True,
+        ).update(conversation=conversation)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Profile', '0005_message_pair_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('high_user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='Profile.user')),
+                ('low_user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='Profile.user')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='conversation',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='Profile.conversation'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['conversation', '-created_at', '-id'], name='message_history_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['receiver', 'is_read'], name='message_unread_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='conversation',
+            constraint=models.UniqueConstraint(fields=('low_user', 'high_user'), name='unique_conversation_pair'),
+        ),
+        migrations.AddConstraint(
+            model_name='conversation',
+            constraint=models.CheckConstraint(check=models.Q(('low_user__lte', models.F('high_user'))), name='conversation_pair_ordered'),
+        ),
+        # The column becomes NOT NULL in 0017_message_conversation_not_null: on
+        # PostgreSQL it cannot be altered in the transaction that backfilled it.
+        migrations.RunPython(backfill_conversations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.2 on 2026-10-17 03:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Profile', '0006_conversation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='actor_count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='verb',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+    ]
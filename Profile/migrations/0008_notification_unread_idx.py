@@ -0,0 +1,17 @@
+# Generated by Django 5.0.2 on 2026-10-17 03:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Profile', '0007_notification_coalescing'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('is_read', False)), fields=['receiver', 'is_read'], name='notification_unread_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.2 on 2026-10-17 03:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Profile', '0008_notification_unread_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['receiver', '-created_at', '-id'], name='notification_inbox_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('is_read', True)), fields=['created_at', 'id'], name='notification_read_age_idx'),
+        ),
+    ]
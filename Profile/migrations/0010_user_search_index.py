@@ -0,0 +1,37 @@
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS Profile_user_search USING fts5(username, name, tokenize='trigram')"
+    )
+    schema_editor.execute(
+        "INSERT INTO Profile_user_search (rowid, username, name) SELECT id, username, name FROM Profile_user"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS Profile_user_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Profile', '0009_notification_retention_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(django.db.models.functions.text.Lower('username'), name='user_username_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(django.db.models.functions.text.Lower('name'), name='user_name_lower_idx'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
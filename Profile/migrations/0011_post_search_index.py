@@ -0,0 +1,31 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS Profile_post_search "
+        "USING fts5(description, comments, tokenize='porter unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        "INSERT INTO Profile_post_search (rowid, description, comments) "
+        "SELECT p.id, p.description, COALESCE((SELECT group_concat(c.text, char(10)) "
+        "FROM Profile_comment c WHERE c.post_id = p.id), '') FROM Profile_post p"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS Profile_post_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Profile', '0010_user_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
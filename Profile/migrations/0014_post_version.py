@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-17 04:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Profile', '0013_stored_file'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
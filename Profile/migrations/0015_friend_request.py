@@ -0,0 +1,36 @@
+# Generated by Django 5.0.2 on 2026-10-17 04:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Profile', '0014_post_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FriendRequest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('accepted', 'Accepted'), ('declined', 'Declined')], default='pending', max_length=8)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('responded_at', models.DateTimeField(blank=True, null=True)),
+                ('from_user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sent_friend_requests', to='Profile.user')),
+                ('to_user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='received_friend_requests', to='Profile.user')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('status', 'pending')), fields=['to_user', '-created_at'], name='friend_request_inbox_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='friendrequest',
+            constraint=models.UniqueConstraint(fields=('from_user', 'to_user'), name='unique_friend_request'),
+        ),
+        migrations.AddConstraint(
+            model_name='friendrequest',
+            constraint=models.CheckConstraint(check=models.Q(('from_user', models.F('to_user')), _negated=True), name='friend_request_not_self'),
+        ),
+    ]
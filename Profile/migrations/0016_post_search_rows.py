@@ -0,0 +1,43 @@
+from django.db import migrations
+
+
+def index_rows(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS Profile_post_search")
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE Profile_post_search "
+        "USING fts5(post_id UNINDEXED, body, tokenize='porter unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        "INSERT INTO Profile_post_search (rowid, post_id, body) SELECT id * 2, id, description FROM Profile_post"
+    )
+    schema_editor.execute(
+        "INSERT INTO Profile_post_search (rowid, post_id, body) SELECT id * 2 + 1, post_id, text FROM Profile_comment"
+    )
+
+
+def index_posts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS Profile_post_search")
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE Profile_post_search "
+        "USING fts5(description, comments, tokenize='porter unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        "INSERT INTO Profile_post_search (rowid, description, comments) "
+        "SELECT p.id, p.description, COALESCE((SELECT group_concat(c.text, char(10)) "
+        "FROM Profile_comment c WHERE c.post_id = p.id), '') FROM Profile_post p"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Profile', '0015_friend_request'),
+    ]
+
+    operations = [
+        migrations.RunPython(index_rows, index_posts),
+    ]
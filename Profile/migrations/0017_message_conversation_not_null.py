@@ -0,0 +1,18 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """Make Message.conversation required, in its own transaction after the 0006 backfill."""
+
+    dependencies = [
+        ('Profile', '0016_post_search_rows'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='message',
+            name='conversation',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='Profile.conversation'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-17 05:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Profile', '0017_message_conversation_not_null'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='actor_ids',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
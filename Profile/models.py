@@ -1,18 +1,40 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.functions import Lower
 from django.contrib.auth.hashers import make_password, check_password
 
+from .identity import invalidate_user
+
 
 class User(models.Model):
     username = models.CharField(max_length=150, unique=True)
     name = models.CharField(max_length=255, blank=True)
     bio = models.TextField(blank=True)
     photo = models.ImageField(upload_to='profile/', blank=True, null=True)
+    photo_variants = models.JSONField(default=dict, blank=True)
     email = models.EmailField(unique=True)
     password = models.CharField(max_length=255)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     friends = models.ManyToManyField("self", symmetrical=True, blank=True)
     saved_posts = models.ManyToManyField('Post', related_name='saved_by', blank=True)
+    friend_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(Lower('username'), name='user_username_lower_idx'),
+            models.Index(Lower('name'), name='user_name_lower_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        invalidate_user(self.id)
+
+    def delete(self, *args, **kwargs):
+        user_id = self.id
+        result = super().delete(*args, **kwargs)
+        invalidate_user(user_id)
+        return result
 
     def set_password(self, raw_password):
         self.password = make_password(raw_password)
@@ -21,11 +43,26 @@ class User(models.Model):
         return check_password(raw_password, self.password)
 
     def add_friend(self, user):
-        if user != self:
+        if user == self:
+            return False
+        with transaction.atomic():
+            if self.is_friend(user):
+                return False
             self.friends.add(user)
+            User.objects.filter(id__in=[self.id, user.id]).update(friend_count=F('friend_count') + 1)
+        invalidate_user(self.id, user.id)
+        self.refresh_from_db(fields=['friend_count'])
+        return True
 
     def remove_friend(self, user):
-        self.friends.remove(user)
+        with transaction.atomic():
+            if not self.is_friend(user):
+                return False
+            self.friends.remove(user)
+            User.objects.filter(id__in=[self.id, user.id]).update(friend_count=F('friend_count') - 1)
+        invalidate_user(self.id, user.id)
+        self.refresh_from_db(fields=['friend_count'])
+        return True
 
     def is_friend(self, user):
         return self.friends.filter(id=user.id).exists()
@@ -37,27 +74,69 @@ class User(models.Model):
 class Post(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="posts")
     image = models.ImageField(upload_to='posts/')
+    image_width = models.PositiveIntegerField(null=True, blank=True)
+    image_height = models.PositiveIntegerField(null=True, blank=True)
+    image_variants = models.JSONField(default=dict, blank=True)
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     likes = models.ManyToManyField(User, related_name='liked_posts', blank=True)
+    like_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+    # Bumped by every change that alters the rendered post card; see Profile.fragments.
+    version = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='post_feed_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='post_author_feed_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        existing = self.pk is not None
+        if existing:
+            # Bumped in SQL, like _bump, so concurrent saves never reuse a version.
+            self.version = F('version') + 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+        super().save(*args, **kwargs)
+        if existing:
+            self.refresh_from_db(fields=['version'])
+
+    def _bump(self, field, delta):
+        Post.objects.filter(pk=self.pk).update(**{field: F(field) + delta, 'version': F('version') + 1})
+        self.refresh_from_db(fields=[field, 'version'])
 
     def add_like(self, user):
-        self.likes.add(user)
+        with transaction.atomic():
+            if self.is_liked(user):
+                return False
+            self.likes.add(user)
+            self._bump('like_count', 1)
+        return True
 
     def remove_like(self, user):
-        self.likes.remove(user)
+        with transaction.atomic():
+            if not self.is_liked(user):
+                return False
+            self.likes.remove(user)
+            self._bump('like_count', -1)
+        return True
 
     def is_liked(self, user):
         return self.likes.filter(id=user.id).exists()
 
     def add_comment(self, user, text):
-        return Comment.objects.create(post=self, user=user, text=text)
+        with transaction.atomic():
+            comment = Comment.objects.create(post=self, user=user, text=text)
+            self._bump('comment_count', 1)
+        return comment
 
     def remove_comment(self, comment_id):
-        Comment.objects.filter(id=comment_id, post=self).delete()
-
-    def comment_count(self):
-        return self.comments.count()
+        with transaction.atomic():
+            deleted, _ = Comment.objects.filter(id=comment_id, post=self).delete()
+            if deleted:
+                self._bump('comment_count', -deleted)
+        return deleted
 
     def get_comments(self):
         return self.comments.all()
@@ -66,6 +145,55 @@ class Post(models.Model):
         return f"{self.user.username}'s Post"
 
 
+class TimelineEntry(models.Model):
+    """A post materialized into one user's home timeline (fan-out on write)."""
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="timeline_entries")
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="timeline_entries")
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'post'], name='unique_timeline_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['owner', '-created_at', '-post'], name='timeline_range_idx'),
+            models.Index(fields=['owner', 'author'], name='timeline_author_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.owner.username} ← post {self.post_id}"
+
+
+class FriendRequest(models.Model):
+    """One user's request to befriend another; at most one row per direction, see ``Profile.friend_requests``."""
+    PENDING = 'pending'
+    ACCEPTED = 'accepted'
+    DECLINED = 'declined'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (ACCEPTED, 'Accepted'), (DECLINED, 'Declined')]
+
+    from_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="sent_friend_requests")
+    to_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="received_friend_requests")
+    status = models.CharField(max_length=8, choices=STATUS_CHOICES, default=PENDING)
+    created_at = models.DateTimeField(auto_now_add=True)
+    responded_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['from_user', 'to_user'], name='unique_friend_request'),
+            models.CheckConstraint(check=~models.Q(from_user=models.F('to_user')), name='friend_request_not_self'),
+        ]
+        indexes = [
+            models.Index(
+                fields=['to_user', '-created_at'], condition=models.Q(status='pending'),
+                name='friend_request_inbox_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.from_user_id} → {self.to_user_id} ({self.status})"
+
+
 class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="comments")
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -81,14 +209,58 @@ class Notification(models.Model):
     receiver = models.ForeignKey(User, on_delete=models.CASCADE, related_name="received_notifications")
     message = models.TextField()
     link = models.CharField(max_length=255, blank=True, null=True)
+    verb = models.CharField(max_length=100, blank=True)
+    actor_count = models.PositiveIntegerField(default=1)
+    # Everyone counted in actor_count; empty on rows written before it existed.
+    actor_ids = models.JSONField(default=list, blank=True)
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['receiver', 'is_read'], condition=models.Q(is_read=False),
+                name='notification_unread_idx',
+            ),
+            models.Index(fields=['receiver', '-created_at', '-id'], name='notification_inbox_idx'),
+            models.Index(fields=['created_at', 'id'], condition=models.Q(is_read=True), name='notification_read_age_idx'),
+        ]
+
     def __str__(self):
         return f"{self.sender.username} → {self.receiver.username}: {self.message}"
 
 
+class Conversation(models.Model):
+    """A direct-message thread, keyed by the pair of user ids in ascending order."""
+    low_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    high_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['low_user', 'high_user'], name='unique_conversation_pair'),
+            models.CheckConstraint(check=models.Q(low_user__lte=models.F('high_user')), name='conversation_pair_ordered'),
+        ]
+
+    @staticmethod
+    def key_for(user_a, user_b):
+        a, b = getattr(user_a, 'id', user_a), getattr(user_b, 'id', user_b)
+        return (a, b) if a <= b else (b, a)
+
+    @classmethod
+    def between(cls, user_a, user_b, create=True):
+        low, high = cls.key_for(user_a, user_b)
+        if not create:
+            return cls.objects.filter(low_user_id=low, high_user_id=high).first()
+        conversation, _ = cls.objects.get_or_create(low_user_id=low, high_user_id=high)
+        return conversation
+
+    def __str__(self):
+        return f"Conversation {self.low_user_id} ↔ {self.high_user_id}"
+
+
 class Message(models.Model):
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name="messages")
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name="sent_messages")
     receiver = models.ForeignKey(User, on_delete=models.CASCADE, related_name="received_messages")
 
@@ -98,5 +270,29 @@ class Message(models.Model):
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['sender', 'receiver', '-created_at'], name='message_pair_idx'),
+            models.Index(fields=['conversation', '-created_at', '-id'], name='message_history_idx'),
+            models.Index(fields=['receiver', 'is_read'], name='message_unread_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.conversation_id is None:
+            self.conversation = Conversation.between(self.sender_id, self.receiver_id)
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.sender.username} → {self.receiver.username}"
+
+
+class StoredFile(models.Model):
+    """A file in content-addressed media storage and how many field values point at it."""
+    name = models.CharField(max_length=255, unique=True)
+    digest = models.CharField(max_length=64)
+    size = models.PositiveBigIntegerField()
+    refcount = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
+
     def __str__(self):
-        return f"{self.sender.username} → {self.receiver.username}"
\ No newline at end of file
+        return f"{self.name} ({self.refcount} refs)"
@@ -0,0 +1,214 @@
+"""
+Batched, coalescing notification writes.
+
+``create_notification`` only queues an event. Queued events are flushed
+when ``BATCH_SIZE`` of them are pending or ``FLUSH_INTERVAL`` seconds after
+the first one, whichever comes first. A flush collapses every event for the
+same ``(receiver, link, verb)`` into one row, merging into an existing
+unread row where there is one, so a like storm on one post yields a single
+"alice and 12 others liked your post" notification.
+
+Set ``NOTIFICATION_PIPELINE["SYNC"]`` to flush on every event instead;
+the test suite runs that way.
+
+The navbar badge reads a per-user unread counter from the cache. A flush
+increments it for every new row, marking notifications read resets it once
+the UPDATE commits, and a cold counter is rebuilt with one COUNT over the
+partial unread index. Those updates reach only the cache of the process
+that made them, so with a per-process cache (the LocMem default) other
+workers can show a stale count; the counter therefore expires after
+``UNREAD_TIMEOUT`` seconds. A shared cache keeps it exact.
+"""
+import atexit
+import threading
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import cache, realtime
+from .feed import after_position, decode_cursor, encode_cursor
+from .models import Notification
+
+DEFAULTS = {"SYNC": False, "BATCH_SIZE": 100, "FLUSH_INTERVAL": 2.0, "UNREAD_TIMEOUT": 30}
+NOTIFICATIONS_PAGE_SIZE = 20
+UNREAD_NOTIFICATIONS = "unread-notifications"
+
+
+def pipeline_setting(name):
+    return getattr(settings, "NOTIFICATION_PIPELINE", {}).get(name, DEFAULTS[name])
+
+
+@dataclass
+class Burst:
+    """Events for one ``(receiver, link, verb)`` key, newest actor last."""
+    receiver_id: int
+    link: str
+    verb: str
+    actors: dict = field(default_factory=dict)  # sender id -> username, in arrival order
+
+    def add(self, sender_id, username):
+        self.actors.pop(sender_id, None)
+        self.actors[sender_id] = username
+
+
+def describe(username, actor_count, verb):
+    if actor_count <= 1:
+        return f"{username} {verb}"
+    others = actor_count - 1
+    return f"{username} and {others} other{'s' if others > 1 else ''} {verb}"
+
+
+class NotificationPipeline:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._size = 0
+        self._timer = None
+
+    def enqueue(self, sender, receiver, verb, link=None):
+        key = (receiver.id, link or "", verb)
+        with self._lock:
+            burst = self._pending.get(key)
+            if burst is None:
+                burst = self._pending[key] = Burst(receiver.id, link or "", verb)
+            burst.add(sender.id, sender.username)
+            self._size += 1
+            full = self._size >= pipeline_setting("BATCH_SIZE")
+            if not full and self._timer is None and not pipeline_setting("SYNC"):
+                self._timer = threading.Timer(pipeline_setting("FLUSH_INTERVAL"), self._flush_in_background)
+                self._timer.daemon = True
+                self._timer.start()
+        if full or pipeline_setting("SYNC"):
+            self.flush()
+
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        finally:
+            # Each flush runs on a fresh Timer thread; close its connection
+            # outright, since close_old_connections keeps it for CONN_MAX_AGE.
+            connection.close()
+
+    def flush(self):
+        """Write every pending burst; returns the number of notification rows created or updated."""
+        with self._lock:
+            bursts = list(self._pending.values())
+            self._pending = {}
+            self._size = 0
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not bursts:
+            return 0
+
+        with transaction.atomic():
+            written = self._write(bursts)
+        receiver_ids = {burst.receiver_id for burst in bursts}
+        transaction.on_commit(lambda: publish_unread_counts(receiver_ids))
+        return written
+
+    def _write(self, bursts):
+        match = Q()
+        for burst in bursts:
+            match |= Q(receiver_id=burst.receiver_id, link=burst.link, verb=burst.verb)
+        existing = {
+            (n.receiver_id, n.link, n.verb): n
+            for n in Notification.objects.filter(match, is_read=False).order_by("created_at")
+        }
+
+        now = timezone.now()
+        to_create, to_update = [], []
+        for burst in bursts:
+            sender_id, username = list(burst.actors.items())[-1]
+            current = existing.get((burst.receiver_id, burst.link, burst.verb))
+            if current is None:
+                actor_count = len(burst.actors)
+                to_create.append(Notification(
+                    sender_id=sender_id, receiver_id=burst.receiver_id, link=burst.link, verb=burst.verb,
+                    actor_count=actor_count, actor_ids=list(burst.actors),
+                    message=describe(username, actor_count, burst.verb),
+                ))
+                continue
+            counted = set(current.actor_ids or [current.sender_id])
+            new_actors = [actor_id for actor_id in burst.actors if actor_id not in counted]
+            current.actor_ids = [*(current.actor_ids or [current.sender_id]), *new_actors]
+            current.actor_count += len(new_actors)
+            current.sender_id = sender_id
+            current.message = describe(username, current.actor_count, burst.verb)
+            current.created_at = now
+            to_update.append(current)
+
+        Notification.objects.bulk_create(to_create)
+        Notification.objects.bulk_update(to_update, ["sender", "actor_count", "actor_ids", "message", "created_at"])
+        created = {}
+        for note in to_create:
+            created[note.receiver_id] = created.get(note.receiver_id, 0) + 1
+        transaction.on_commit(lambda: _increment_unread(created))
+        return len(to_create) + len(to_update)
+
+
+def unread_count(user_id):
+    """Return ``user_id``'s unread notification count, from the cache when it is warm."""
+    return cache.cached(
+        UNREAD_NOTIFICATIONS, user_id,
+        lambda: Notification.objects.filter(receiver_id=user_id, is_read=False).count(),
+        timeout=pipeline_setting("UNREAD_TIMEOUT"),
+    )
+
+
+def _increment_unread(counts):
+    backend = cache.get_cache()
+    for user_id, amount in counts.items():
+        try:
+            backend.incr(cache.make_key(UNREAD_NOTIFICATIONS, user_id), amount)
+        except ValueError:
+            pass  # not cached yet; the next read counts from the table
+
+
+def notification_page(user, before=None, page_size=NOTIFICATIONS_PAGE_SIZE):
+    """Return ``(notifications, older_cursor)``: one newest-first keyset page of ``user``'s notifications."""
+    notes = Notification.objects.filter(receiver=user).select_related("sender").order_by("-created_at", "-id")
+    position = decode_cursor(before) if before else None
+    if position:
+        notes = after_position(notes, position)
+    notes = list(notes[:page_size + 1])
+
+    older_cursor = None
+    if len(notes) > page_size:
+        notes = notes[:page_size]
+        older_cursor = encode_cursor(notes[-1])
+    return notes, older_cursor
+
+
+def mark_read(user, notification_ids):
+    """Mark the given notifications read in one UPDATE; the badge is recounted on its next read."""
+    updated = Notification.objects.filter(receiver=user, id__in=notification_ids, is_read=False).update(is_read=True)
+    if updated:
+        cache.invalidate(UNREAD_NOTIFICATIONS, user.id)
+        transaction.on_commit(lambda: publish_unread_counts([user.id]))
+    return updated
+
+
+def mark_all_read(user):
+    """Mark every unread notification for ``user`` read in one UPDATE and reset the badge."""
+    updated = Notification.objects.filter(receiver=user, is_read=False).update(is_read=True)
+
+    def reset():
+        key = cache.make_key(UNREAD_NOTIFICATIONS, user.id)
+        cache.get_cache().set(key, 0, pipeline_setting("UNREAD_TIMEOUT"))
+        realtime.publish_notification_count(user.id, 0)
+
+    transaction.on_commit(reset)
+    return updated
+
+
+def publish_unread_counts(receiver_ids):
+    for receiver_id in receiver_ids:
+        realtime.publish_notification_count(receiver_id, unread_count(receiver_id))
+
+
+pipeline = NotificationPipeline()
+atexit.register(pipeline.flush)
@@ -0,0 +1,127 @@
+"""
+Pub/sub for pushing new messages and notification counts to open WebSockets.
+
+Views and signal handlers call :func:`publish`; the WebSocket endpoint in
+``Profile.websocket`` subscribes to one channel per logged-in user. The
+broker is chosen by ``settings.REALTIME_BROKER`` so the in-process default
+can be swapped for one backed by Redis or another message bus once the app
+runs in more than one process.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+SUBSCRIPTION_QUEUE_SIZE = 100
+
+
+def user_channel(user_id):
+    return f"user:{user_id}"
+
+
+class Subscription:
+    """An async iterator over payloads published to one channel."""
+
+    def __init__(self, broker, channel):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=SUBSCRIPTION_QUEUE_SIZE)
+
+    def deliver(self, payload):
+        """Hand ``payload`` to the subscriber from any thread; slow subscribers drop messages."""
+        def put():
+            try:
+                self.queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                pass
+        self.loop.call_soon_threadsafe(put)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.queue.get()
+
+
+class Broker:
+    """Interface for pub/sub backends."""
+
+    def publish(self, channel, payload):
+        raise NotImplementedError
+
+    def subscribe(self, channel):
+        """Return a :class:`Subscription`; must be called from a running event loop."""
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription):
+        raise NotImplementedError
+
+
+class InProcessBroker(Broker):
+    """Delivers to subscribers in the current process only."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def publish(self, channel, payload):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription.deliver(payload)
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel)
+        with self._lock:
+            self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                path = getattr(settings, "REALTIME_BROKER", "Profile.realtime.InProcessBroker")
+                _broker = import_string(path)()
+    return _broker
+
+
+def publish(user_id, event, **data):
+    get_broker().publish(user_channel(user_id), {"type": event, **data})
+
+
+def publish_message(message):
+    payload = {
+        "id": message.id,
+        "sender_id": message.sender_id,
+        "receiver_id": message.receiver_id,
+        "sender_username": message.sender.username,
+        "text": message.text or "",
+        "attachment": message.attachment.url if message.attachment else None,
+        "created_at": message.created_at.isoformat(),
+    }
+    for user_id in {message.sender_id, message.receiver_id}:
+        publish(user_id, "message", message=payload)
+
+
+def publish_notification_count(user_id, count):
+    publish(user_id, "notifications", unread=count)
@@ -0,0 +1,110 @@
+"""
+Primary/replica database routing.
+
+Writes always go to the primary (``default``). Reads go to one of
+``settings.READ_REPLICAS`` only while a view marked ``@read_only`` handles
+a GET or HEAD request, and ``ReplicaRoutingMiddleware`` keeps them on the
+primary:
+
+* for the rest of a request once it has written anything;
+* for ``REPLICA_STICKY_SECONDS`` after the session last wrote, so people
+  see their own posts, likes and messages while replicas catch up.
+
+Values loaded into a cache are read inside ``primary_reads()``: a lagging
+replica's row would otherwise outlive the invalidation that just dropped it.
+
+With no replicas configured every query goes to the primary.
+"""
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from django.conf import settings
+
+PRIMARY = "default"
+STICKY_SESSION_KEY = "_read_primary_until"
+
+
+@dataclass
+class RoutingState:
+    replica: str = None
+    wrote: bool = False
+
+
+_state = ContextVar("database_routing", default=None)
+
+
+def read_only(view):
+    """Let ``view`` read from a replica; it may still write, which moves its later reads to the primary."""
+    view.reads_from_replica = True
+    return view
+
+
+@contextmanager
+def primary_reads():
+    """Send the reads made inside the block to the primary."""
+    state = _state.get()
+    replica = state.replica if state is not None else None
+    if replica is None:
+        yield
+        return
+    state.replica = None
+    try:
+        yield
+    finally:
+        state.replica = replica
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is not None and state.replica and not state.wrote:
+            return state.replica
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary.
+        return db == PRIMARY
+
+
+class ReplicaRoutingMiddleware:
+    """Route reads of ``@read_only`` views to a replica; must come after ``SessionMiddleware``."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = RoutingState()
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state.wrote:
+            request.session[STICKY_SESSION_KEY] = time.time() + getattr(settings, "REPLICA_STICKY_SECONDS", 5)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.reads_from_replica = False
+        replicas = getattr(settings, "READ_REPLICAS", ())
+        if not replicas or not getattr(view_func, "reads_from_replica", False):
+            return None
+        if request.method not in ("GET", "HEAD"):
+            return None
+        # Reading the session here loads it from the primary, before reads switch over.
+        if request.session.get(STICKY_SESSION_KEY, 0) > time.time():
+            return None
+        _state.get().replica = random.choice(replicas)
+        request.reads_from_replica = True
+        return None
@@ -0,0 +1,323 @@
+"""
+User search over ``username`` and ``name``, and post search over
+descriptions and comments.
+
+On SQLite the index is an FTS5 table with the trigram tokenizer, so any
+substring of three or more characters is an index lookup rather than a
+``LIKE '%q%'`` scan of ``Profile_user``. Other databases fall back to a
+ranked ORM query. Either way results are ordered exact match, then prefix,
+then substring, and pages are fetched with ``LIMIT page_size + 1`` instead
+of a ``COUNT(*)``.
+
+Posts are indexed one FTS5 row per description and one per comment, so
+writing a comment indexes only that comment's text. A post matches when
+every word of the query appears in its description or any of its
+comments; results are newest first.
+
+Backends are picked by ``settings.USER_SEARCH_BACKEND`` and
+``settings.POST_SEARCH_BACKEND`` (dotted paths); ``Profile.signals`` keeps
+the indexes in step with ``User``, ``Post`` and ``Comment`` writes.
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.utils.module_loading import import_string
+
+from .models import Comment, Post, User
+
+SEARCH_PAGE_SIZE = 5
+POST_SEARCH_PAGE_SIZE = 12
+FTS_TABLE = "Profile_user_search"
+POST_FTS_TABLE = "Profile_post_search"
+
+CREATE_FTS_TABLE = f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(username, name, tokenize='trigram')"
+CREATE_POST_FTS_TABLE = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {POST_FTS_TABLE} "
+    "USING fts5(post_id UNINDEXED, body, tokenize='porter unicode61 remove_diacritics 2')"
+)
+
+# Trigrams need at least three characters to match anything.
+MIN_FTS_QUERY_LENGTH = 3
+
+
+def fts_phrase(value):
+    return '"' + value.replace('"', '""') + '"'
+
+
+def _prefix_range(query):
+    """``(low, high)`` such that ``low <= s < high`` holds exactly for strings ``s`` starting with ``query``."""
+    return query, query[:-1] + chr(ord(query[-1]) + 1)
+
+
+class SearchBackend:
+    """
+    Ranks matches in tiers, each read with its own ``LIMIT``: exact and
+    prefix matches come from range scans on the ``lower(username)`` and
+    ``lower(name)`` indexes, then substring matches fill the rest of the
+    page. No query ever has to rank or count the full match set.
+    """
+
+    def index_user(self, user):
+        pass
+
+    def remove_user(self, user_id):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def prefix_matches(self, query, limit):
+        low, high = _prefix_range(query.lower())
+        rows = {}
+        for field in ("username", "name"):
+            matches = (
+                User.objects.annotate(key=Lower(field))
+                .filter(key__gte=low, key__lt=high)
+                .order_by("key")
+                .values_list("id", "username", "key")[:limit]
+            )
+            for user_id, username, key in matches:
+                exact = key == low
+                rank = (not exact, username.lower())
+                rows[user_id] = min(rows.get(user_id, rank), rank)
+        return [user_id for user_id, _ in sorted(rows.items(), key=lambda item: item[1])][:limit]
+
+    def substring_matches(self, query, exclude, limit):
+        matches = User.objects.filter(Q(username__icontains=query) | Q(name__icontains=query))
+        return list(matches.exclude(id__in=exclude).values_list("id", flat=True)[:limit])
+
+    def search_ids(self, query, offset, limit):
+        """Return up to ``limit`` matching user ids after skipping ``offset``, best match first."""
+        wanted = offset + limit
+        ids = self.prefix_matches(query, wanted)
+        if len(ids) < wanted:
+            ids += self.substring_matches(query, ids, wanted - len(ids))
+        return ids[offset:wanted]
+
+
+class ORMSearchBackend(SearchBackend):
+    """Portable backend: substring matches are a ``LIKE`` scan that stops at the page limit."""
+
+
+class SQLiteFTSSearchBackend(SearchBackend):
+    """Substring matches come from an FTS5 trigram index; shorter queries fall back to ``LIKE``."""
+
+    def index_user(self, user):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [user.id])
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, username, name) VALUES (%s, %s, %s)",
+                [user.id, user.username, user.name or ""],
+            )
+
+    def remove_user(self, user_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [user_id])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor.execute(f"INSERT INTO {FTS_TABLE} (rowid, username, name) SELECT id, username, name FROM Profile_user")
+
+    def substring_matches(self, query, exclude, limit):
+        if len(query) < MIN_FTS_QUERY_LENGTH:
+            return super().substring_matches(query, exclude, limit)
+        exclude = set(exclude)
+        ids = []
+        with connection.cursor() as cursor:
+            # Rowid order lets FTS5 stream matches and stop early; the LIMIT covers excluded rows too.
+            cursor.execute(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s LIMIT %s",
+                [fts_phrase(query), limit + len(exclude)],
+            )
+            for (user_id,) in cursor.fetchall():
+                if user_id not in exclude:
+                    ids.append(user_id)
+        return ids[:limit]
+
+
+class PostSearchBackend:
+    """Finds posts whose description or comments contain every word of the query, newest first."""
+
+    def index_post(self, post_id):
+        pass
+
+    def remove_post(self, post_id):
+        pass
+
+    def index_comment(self, comment):
+        pass
+
+    def remove_comment(self, comment_id):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def search_ids(self, query, before_id, limit):
+        words = query.split()
+        matches = Post.objects.all()
+        for word in words:
+            matches = matches.filter(Q(description__icontains=word) | Q(comments__text__icontains=word))
+        if before_id:
+            matches = matches.filter(id__lt=before_id)
+        return list(matches.order_by("-id").values_list("id", flat=True).distinct()[:limit])
+
+
+class ORMPostSearchBackend(PostSearchBackend):
+    """Portable backend: ``LIKE`` scans, fine for small tables."""
+
+
+def post_rowid(post_id):
+    return post_id * 2
+
+
+def comment_rowid(comment_id):
+    return comment_id * 2 + 1
+
+
+class SQLiteFTSPostSearchBackend(PostSearchBackend):
+    """
+    Descriptions and comments are separate FTS5 rows keyed by computed
+    rowids (``post_rowid``/``comment_rowid``), so every write touches one
+    row by rowid and never rereads a post's other comments.
+    """
+
+    def index_post(self, post_id):
+        description = Post.objects.filter(id=post_id).values_list("description", flat=True).first()
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {POST_FTS_TABLE} WHERE rowid = %s", [post_rowid(post_id)])
+            if description is not None:
+                cursor.execute(
+                    f"INSERT INTO {POST_FTS_TABLE} (rowid, post_id, body) VALUES (%s, %s, %s)",
+                    [post_rowid(post_id), post_id, description],
+                )
+
+    def remove_post(self, post_id):
+        """Drop the post's description row and its comments' rows; call before the comments are deleted."""
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {POST_FTS_TABLE} WHERE rowid = %s", [post_rowid(post_id)])
+            cursor.execute(
+                f"DELETE FROM {POST_FTS_TABLE} WHERE rowid IN (SELECT id * 2 + 1 FROM Profile_comment WHERE post_id = %s)",
+                [post_id],
+            )
+
+    def index_comment(self, comment):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {POST_FTS_TABLE} WHERE rowid = %s", [comment_rowid(comment.id)])
+            cursor.execute(
+                f"INSERT INTO {POST_FTS_TABLE} (rowid, post_id, body) VALUES (%s, %s, %s)",
+                [comment_rowid(comment.id), comment.post_id, comment.text],
+            )
+
+    def remove_comment(self, comment_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {POST_FTS_TABLE} WHERE rowid = %s", [comment_rowid(comment_id)])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {POST_FTS_TABLE}")
+            cursor.execute(
+                f"INSERT INTO {POST_FTS_TABLE} (rowid, post_id, body) "
+                "SELECT id * 2, id, description FROM Profile_post"
+            )
+            cursor.execute(
+                f"INSERT INTO {POST_FTS_TABLE} (rowid, post_id, body) "
+                "SELECT id * 2 + 1, post_id, text FROM Profile_comment"
+            )
+
+    def search_ids(self, query, before_id, limit):
+        # One match per word, intersected by post, so words may come from different rows of a post.
+        words = query.split()
+        matches = " INTERSECT ".join(
+            [f"SELECT post_id FROM {POST_FTS_TABLE} WHERE {POST_FTS_TABLE} MATCH %s"] * len(words)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT DISTINCT post_id FROM ({matches}) WHERE post_id < %s ORDER BY post_id DESC LIMIT %s",
+                [*(fts_phrase(word) for word in words), before_id or 2 ** 63 - 1, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+_backends = {}
+
+
+def _load_backend(setting, sqlite_default, portable_default):
+    if setting not in _backends:
+        default = sqlite_default if connection.vendor == "sqlite" else portable_default
+        _backends[setting] = import_string(getattr(settings, setting, default))()
+    return _backends[setting]
+
+
+def get_backend():
+    return _load_backend(
+        "USER_SEARCH_BACKEND", "Profile.search.SQLiteFTSSearchBackend", "Profile.search.ORMSearchBackend",
+    )
+
+
+def get_post_backend():
+    return _load_backend(
+        "POST_SEARCH_BACKEND", "Profile.search.SQLiteFTSPostSearchBackend", "Profile.search.ORMPostSearchBackend",
+    )
+
+
+class SearchPage:
+    """The subset of ``django.core.paginator.Page`` the search template uses, without a total count."""
+
+    def __init__(self, object_list, number, has_next):
+        self.object_list = object_list
+        self.number = number
+        self._has_next = has_next
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self.number > 1
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+
+def search_users(query, page=1, page_size=SEARCH_PAGE_SIZE):
+    query = query.strip()
+    try:
+        page = max(int(page), 1)
+    except (TypeError, ValueError):
+        page = 1
+    if not query:
+        return SearchPage([], page, False)
+
+    ids = get_backend().search_ids(query, (page - 1) * page_size, page_size + 1)
+    has_next = len(ids) > page_size
+    ids = ids[:page_size]
+    users = User.objects.in_bulk(ids)
+    return SearchPage([users[i] for i in ids if i in users], page, has_next)
+
+
+def search_posts(query, before=None, page_size=POST_SEARCH_PAGE_SIZE):
+    """Return ``(posts, older_cursor)``: up to ``page_size`` matching posts, newest first, with authors loaded."""
+    query = query.strip()
+    if not query:
+        return [], None
+    try:
+        before_id = int(before) if before else None
+    except ValueError:
+        before_id = None
+
+    ids = get_post_backend().search_ids(query, before_id, page_size + 1)
+    older_cursor = ids[page_size - 1] if len(ids) > page_size else None
+    ids = ids[:page_size]
+    posts = Post.objects.select_related("user").in_bulk(ids)
+    return [posts[i] for i in ids if i in posts], older_cursor
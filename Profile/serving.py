@@ -0,0 +1,90 @@
+"""
+Static and media file serving with HTTP caching.
+
+``serve_media`` and ``serve_static`` replace ``django.views.static.serve``:
+
+* ``ETag`` and ``Last-Modified`` on every response, answering
+  ``If-None-Match`` / ``If-Modified-Since`` with 304;
+* ``Cache-Control: public, max-age=31536000, immutable`` for names that
+  change whenever the content does (content-addressed media, hashed
+  static files) and a short ``max-age`` for everything else;
+* a ``.br`` or ``.gz`` sibling written by ``collectstatic`` is sent when
+  the client accepts that encoding;
+* with ``SENDFILE_BACKEND`` set to ``"nginx"`` (``X-Accel-Redirect`` to
+  ``SENDFILE_URL``) or ``"apache"`` (``X-Sendfile``) Django only sets the
+  headers and the front-end server streams the bytes.
+"""
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+SHORT_LIVED = "public, max-age=3600"
+
+CONTENT_ADDRESSED_MEDIA = re.compile(r"(^|/)[0-9a-f]{64}\.[^/]+$")  # Profile.storage names
+HASHED_STATIC = re.compile(r"\.[0-9a-f]{12}\.[^/.]+$")  # ManifestStaticFilesStorage names
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def _accepted(request, encoding):
+    return encoding in {
+        part.split(";")[0].strip() for part in request.META.get("HTTP_ACCEPT_ENCODING", "").split(",")
+    }
+
+
+def serve_file(request, path, document_root, kind, immutable):
+    try:
+        full_path = safe_join(document_root, path)
+    except Exception:
+        raise Http404()
+    if not os.path.isfile(full_path):
+        raise Http404()
+
+    served, content_encoding = full_path, None
+    for encoding, suffix in ENCODINGS:
+        if _accepted(request, encoding) and os.path.isfile(full_path + suffix):
+            served, content_encoding = full_path + suffix, encoding
+            break
+
+    stat = os.stat(served)
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        content_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+        backend = getattr(settings, "SENDFILE_BACKEND", None)
+        if backend == "nginx":
+            response = HttpResponse(content_type=content_type)
+            response["X-Accel-Redirect"] = f"{settings.SENDFILE_URL}{kind}/{path}" + (
+                dict(ENCODINGS)[content_encoding] if content_encoding else ""
+            )
+        elif backend == "apache":
+            response = HttpResponse(content_type=content_type)
+            response["X-Sendfile"] = served
+        else:
+            response = FileResponse(open(served, "rb"), content_type=content_type)
+        if content_encoding:
+            response["Content-Encoding"] = content_encoding
+
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(stat.st_mtime)
+    response["Cache-Control"] = IMMUTABLE if immutable else SHORT_LIVED
+    patch_vary_headers(response, ["Accept-Encoding"])
+    return response
+
+
+def serve_media(request, path):
+    return serve_file(
+        request, path, settings.MEDIA_ROOT, "media", bool(CONTENT_ADDRESSED_MEDIA.search(path)),
+    )
+
+
+def serve_static(request, path):
+    return serve_file(
+        request, path, settings.STATIC_ROOT, "static", bool(HASHED_STATIC.search(path)),
+    )
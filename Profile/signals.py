@@ -0,0 +1,193 @@
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import cache, realtime, search, timeline
+from .identity import invalidate_user
+from .models import Comment, Message, Post, User
+
+
+@receiver([post_save, post_delete], sender=Post)
+def post_changed(sender, instance, signal, update_fields=None, **kwargs):
+    cache.invalidate(cache.POST_CARD, instance.id)
+    cache.invalidate(cache.PROFILE_STATS, instance.user_id)
+    if signal is post_save and (update_fields is None or "description" in update_fields):
+        search.get_post_backend().index_post(instance.id)
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs):
+    # Runs while the comments still exist, so their index rows go in the same pass.
+    search.get_post_backend().remove_post(instance.id)
+
+
+def _deleted_with_post(origin):
+    model = getattr(origin, "model", type(origin))
+    return model is Post
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, **kwargs):
+    cache.invalidate(cache.POST_CARD, instance.post_id)
+    search.get_post_backend().index_comment(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, origin=None, **kwargs):
+    if _deleted_with_post(origin):
+        # post_deleting already dropped the post's card and index rows.
+        return
+    cache.invalidate(cache.POST_CARD, instance.post_id)
+    search.get_post_backend().remove_comment(instance.id)
+
+
+@receiver(pre_save, sender=User)
+def remember_username(sender, instance, update_fields=None, **kwargs):
+    if instance.pk and (update_fields is None or "username" in update_fields):
+        instance._previous_username = User.objects.filter(pk=instance.pk).values_list("username", flat=True).first()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, update_fields=None, **kwargs):
+    cache.invalidate(cache.PROFILE_STATS, instance.id)
+    if update_fields is None or {"username", "name"} & set(update_fields):
+        search.get_backend().index_user(instance)
+    previous = instance.__dict__.pop("_previous_username", None)
+    if previous is not None and previous != instance.username:
+        # Cards show commenters' usernames; the author's is covered by updated_at.
+        commented = Post.objects.filter(id__in=Comment.objects.filter(user=instance).values("post_id"))
+        post_ids = list(commented.values_list("id", flat=True))
+        Post.objects.filter(id__in=post_ids).update(version=F("version") + 1)
+        cache.invalidate(cache.POST_CARD, *post_ids)
+
+
+@receiver(pre_delete, sender=User)
+def user_deleting(sender, instance, **kwargs):
+    # The cascade removes the user's friendships, likes and comments without going
+    # through add_friend/add_like/add_comment or sending m2m_changed, so the
+    # counters on the rows that survive are settled here, in the delete's transaction.
+    friend_ids = list(instance.friends.values_list("id", flat=True))
+    User.objects.filter(id__in=friend_ids).update(friend_count=F("friend_count") - 1)
+    timeline.resume_fan_out(*friend_ids)
+
+    others = Post.objects.exclude(user=instance)
+    liked = others.filter(likes=instance)
+    liked_ids = list(liked.values_list("id", flat=True))
+    liked.update(like_count=F("like_count") - 1, version=F("version") + 1)
+
+    mine = Comment.objects.filter(post=OuterRef("pk"), user=instance).order_by().values("post")
+    commented = others.filter(id__in=Comment.objects.filter(user=instance).values("post_id"))
+    commented_ids = list(commented.values_list("id", flat=True))
+    commented.update(
+        comment_count=F("comment_count") - Subquery(mine.annotate(total=Count("*")).values("total")),
+        version=F("version") + 1,
+    )
+
+    savers = User.saved_posts.through.objects.filter(post__user=instance).values_list("user_id", flat=True)
+    invalidate_user(*friend_ids)
+    cache.invalidate(cache.FRIEND_IDS, *friend_ids)
+    cache.invalidate(cache.PROFILE_STATS, *friend_ids, *set(savers))
+    cache.invalidate(cache.POST_CARD, *liked_ids, *commented_ids)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    cache.invalidate(cache.PROFILE_STATS, instance.id)
+    cache.invalidate(cache.FRIEND_IDS, instance.id)
+    search.get_backend().remove_user(instance.id)
+
+
+def _is_change(action):
+    # pre_clear is the last point at which the soon-to-be-removed rows are visible.
+    return action.startswith("post_") or action == "pre_clear"
+
+
+def _other_side(action, pk_set, current_ids):
+    return set(current_ids()) if action == "pre_clear" else set(pk_set or ())
+
+
+@receiver(m2m_changed, sender=Post.likes.through)
+def likes_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not _is_change(action):
+        return
+    if reverse:
+        # user.liked_posts.add(...): instance is a User and pk_set holds post ids.
+        post_ids = _other_side(action, pk_set, lambda: instance.liked_posts.values_list("id", flat=True))
+    else:
+        post_ids = {instance.id}
+    cache.invalidate(cache.POST_CARD, *post_ids)
+
+
+@receiver(m2m_changed, sender=User.saved_posts.through)
+def saved_posts_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not _is_change(action):
+        return
+    if reverse:
+        user_ids = _other_side(action, pk_set, lambda: instance.saved_by.values_list("id", flat=True))
+    else:
+        user_ids = {instance.id}
+    cache.invalidate(cache.PROFILE_STATS, *user_ids)
+
+
+@receiver(m2m_changed, sender=User.friends.through)
+def friends_changed(sender, instance, action, pk_set, **kwargs):
+    if not _is_change(action):
+        return
+    user_ids = {instance.id} | _other_side(action, pk_set, lambda: instance.friends.values_list("id", flat=True))
+    cache.invalidate(cache.FRIEND_IDS, *user_ids)
+    cache.invalidate(cache.PROFILE_STATS, *user_ids)
+
+
+@receiver(post_save, sender=Message)
+def message_created(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: realtime.publish_message(instance))
+
+
+# File field and variants field of each model that owns media.
+MEDIA_FIELDS = {Post: ("image", "image_variants"), User: ("photo", "photo_variants"), Message: ("attachment", None)}
+
+
+@receiver(pre_save, sender=Post)
+@receiver(pre_save, sender=User)
+@receiver(pre_save, sender=Message)
+def remember_replaced_media(sender, instance, **kwargs):
+    field, _ = MEDIA_FIELDS[sender]
+    current = getattr(instance, field)
+    # Only a new, not yet stored upload can replace a file; skip the lookup otherwise.
+    if instance.pk and current and not current._committed:
+        replaced = sender.objects.filter(pk=instance.pk).values_list(field, flat=True).first()
+        stored_name = getattr(current.storage, "stored_name", None)
+        if replaced and stored_name and replaced == stored_name(
+            current.field.generate_filename(instance, current.name), current.file,
+        ):
+            # The same bytes again: keep the row's file and its one reference.
+            setattr(instance, field, replaced)
+            return
+        instance._replaced_media = replaced
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Message)
+def release_replaced_media(sender, instance, **kwargs):
+    field, _ = MEDIA_FIELDS[sender]
+    replaced = instance.__dict__.pop("_replaced_media", None)
+    if replaced and replaced != getattr(instance, field).name:
+        getattr(instance, field).storage.delete(replaced)
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Message)
+def release_media(sender, instance, **kwargs):
+    field, variants_field = MEDIA_FIELDS[sender]
+    file = getattr(instance, field)
+    if not file:
+        return
+    names = [file.name]
+    if variants_field:
+        names += [name for group in getattr(instance, variants_field).values() for name in group.values()]
+    for name in names:
+        file.storage.delete(name)
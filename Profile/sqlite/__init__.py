@@ -0,0 +1,45 @@
+"""
+SQLite tuned for a multi-threaded web server.
+
+Use ``'ENGINE': 'Profile.sqlite'``. Every new connection gets the pragmas
+in ``settings.SQLITE_PRAGMAS`` (merged over ``DEFAULT_PRAGMAS``) from a
+``connection_created`` hook:
+
+* ``journal_mode=WAL`` lets readers run alongside the single writer;
+* ``synchronous=NORMAL`` syncs at checkpoints rather than every commit,
+  which is durable against application crashes and safe in WAL mode;
+* ``busy_timeout`` makes a blocked writer wait for the lock instead of
+  failing at once with "database is locked";
+* ``mmap_size``, ``cache_size`` and ``temp_store`` keep hot pages in memory.
+
+The backend also opens transactions with ``BEGIN IMMEDIATE``. A deferred
+transaction that reads before it writes has to upgrade its lock, and SQLite
+fails such an upgrade immediately, ignoring ``busy_timeout``, whenever
+another writer is active. Taking the write lock up front turns that into an
+ordinary wait.
+"""
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,  # milliseconds
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64000,  # negative: KiB, so 64 MB per connection
+    "temp_store": "MEMORY",
+}
+
+
+def pragmas():
+    return {**DEFAULT_PRAGMAS, **getattr(settings, "SQLITE_PRAGMAS", {})}
+
+
+@receiver(connection_created)
+def configure_connection(sender, connection, **kwargs):
+    if connection.vendor != "sqlite" or not connection.settings_dict["ENGINE"].startswith("Profile.sqlite"):
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas().items():
+            cursor.execute(f"PRAGMA {name} = {value}")
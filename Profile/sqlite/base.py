@@ -0,0 +1,9 @@
+from django.db.backends.sqlite3 import base
+
+from . import configure_connection  # noqa: F401  registers the connection_created hook
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def _start_transaction_under_autocommit(self):
+        # Take the write lock when the transaction starts so busy_timeout applies; see Profile.sqlite.
+        self.cursor().execute("BEGIN IMMEDIATE")
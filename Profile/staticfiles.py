@@ -0,0 +1,49 @@
+"""
+``ManifestStaticFilesStorage`` that also precompresses text assets.
+
+After ``collectstatic`` hashes the files, every CSS/JS/SVG/JSON asset gets
+a ``.gz`` sibling, and a ``.br`` one when the optional ``brotli`` package
+is installed, so ``Profile.serving`` or the front-end server can send
+compressed bytes without compressing per request. A compressed copy is
+only kept when it is actually smaller.
+"""
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+COMPRESSIBLE = (".css", ".js", ".mjs", ".svg", ".json", ".map", ".txt")
+
+
+def compressors():
+    yield ".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0)
+    if brotli is not None:
+        yield ".br", lambda data: brotli.compress(data, quality=11)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def post_process(self, paths, dry_run=False, **options):
+        hashed = []
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if hashed_name and not isinstance(processed, Exception):
+                hashed.append(hashed_name)
+            yield name, hashed_name, processed
+        if dry_run:
+            return
+
+        for name in set(hashed):
+            if not name.endswith(COMPRESSIBLE):
+                continue
+            with self.open(name) as handle:
+                data = handle.read()
+            for suffix, compress in compressors():
+                compressed = compress(data)
+                if len(compressed) < len(data):
+                    if self.exists(name + suffix):
+                        self.delete(name + suffix)
+                    self._save(name + suffix, ContentFile(compressed))
@@ -0,0 +1,103 @@
+"""
+Content-addressed media storage.
+
+``ContentAddressedStorage`` stores every file under the SHA-256 of its
+bytes, ``<upload dir>/<first two hex digits>/<digest><ext>``, so uploading
+the same image twice writes it once. Each ``save()`` takes a reference on
+the file and each ``delete()`` drops one; the bytes are removed after the
+transaction that drops the last reference commits. References live in
+``StoredFile`` rows.
+
+The row is also the file's lock: saving, releasing and removing a file all
+lock its row first, and a row whose last reference is dropped stays (with
+a count of 0) until the file is gone. So an upload of the same content can
+never take a reference on a file that is being removed.
+
+Files written before this backend (no ``StoredFile`` row) are never
+deleted here; ``manage.py gc_media`` sweeps them, recounts references from
+the tables that point at media and reports the space deduplication saves.
+"""
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F, Sum
+
+from .models import StoredFile
+
+
+def content_digest(content):
+    digest = getattr(content, "content_hash", None)  # computed while streaming by Profile.uploads
+    if digest:
+        return digest
+    sha256 = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        sha256.update(chunk if isinstance(chunk, bytes) else chunk.encode())
+    content.seek(0)
+    return sha256.hexdigest()
+
+
+def content_name(name, digest):
+    directory, filename = os.path.split(name)
+    extension = os.path.splitext(filename)[1].lower()
+    return f"{directory}/{digest[:2]}/{digest}{extension}"
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def stored_name(self, name, content):
+        """The name ``content`` would be saved under, without saving it."""
+        return content_name(name, content_digest(content))
+
+    def _save(self, name, content):
+        digest = content_digest(content)
+        name = content_name(name, digest)
+        with transaction.atomic():
+            stored, _ = StoredFile.objects.select_for_update().get_or_create(
+                name=name, defaults={"digest": digest, "size": 0, "refcount": 0},
+            )
+            size = stored.size
+            if not stored.refcount:
+                # A new row, or one whose file is awaiting removal: nothing else
+                # can touch the file while we hold the lock.
+                if not self.exists(name):
+                    written = super()._save(name, content)
+                    if written != name:
+                        # Lost a race with an identical upload; keep the canonical copy.
+                        super().delete(written)
+                size = self.size(name)
+            StoredFile.objects.filter(pk=stored.pk).update(refcount=F("refcount") + 1, size=size)
+        return name
+
+    def delete(self, name):
+        if not name:
+            return
+        with transaction.atomic():
+            stored = StoredFile.objects.select_for_update().filter(name=name).first()
+            if stored is None or not stored.refcount:
+                return  # not written by this storage (left for gc_media), or already released
+            StoredFile.objects.filter(pk=stored.pk).update(refcount=F("refcount") - 1)
+            if stored.refcount > 1:
+                return
+        transaction.on_commit(lambda: self._remove_unreferenced(name))
+
+    def _remove_unreferenced(self, name):
+        with transaction.atomic():
+            stored = StoredFile.objects.select_for_update().filter(name=name).first()
+            if stored is None or stored.refcount:
+                return  # re-referenced by an upload since the release
+            super().delete(name)
+            stored.delete()
+
+    def usage(self):
+        """Return file count, bytes on disk, bytes referenced and bytes saved by deduplication."""
+        files = StoredFile.objects.filter(refcount__gt=0)
+        totals = files.aggregate(stored=Sum("size"), referenced=Sum(F("size") * F("refcount")))
+        stored, referenced = totals["stored"] or 0, totals["referenced"] or 0
+        return {
+            "files": files.count(),
+            "stored_bytes": stored,
+            "referenced_bytes": referenced,
+            "saved_bytes": referenced - stored,
+        }
@@ -0,0 +1,65 @@
+"""
+Responsive ``<img>`` tags for uploads processed by ``Profile.images``.
+
+    {% load images %}
+    {% post_image post sizes="(max-width: 768px) 100vw, 720px" class="img-fluid w-100" %}
+    {% avatar post.user 45 class="rounded-circle" %}
+
+Both render a ``<picture>`` with a WebP ``srcset`` and a JPEG fallback,
+``loading="lazy"`` (pass ``lazy=False`` for above-the-fold images) and
+explicit dimensions. Until the variants exist they render the original.
+"""
+from django import template
+from django.utils.html import format_html, format_html_join
+
+register = template.Library()
+
+
+def _srcset(storage, names):
+    return ", ".join(f"{storage.url(name)} {width}w" for width, name in sorted(names.items(), key=lambda item: int(item[0])))
+
+
+def _attributes(attrs):
+    return format_html_join("", ' {}="{}"', sorted(attrs.items()))
+
+
+def _picture(field_file, variants, sizes, fallback_width, attrs):
+    if not field_file:
+        return ""
+    webp, jpeg = variants.get("webp"), variants.get("jpeg")
+    if not jpeg:
+        return format_html("<img src=\"{}\"{}>", field_file.url, _attributes(attrs))
+    storage = field_file.storage
+    widths = sorted(jpeg, key=int)
+    src = next((w for w in widths if int(w) >= fallback_width), widths[-1])
+    source = format_html('<source type="image/webp" srcset="{}" sizes="{}">', _srcset(storage, webp), sizes) if webp else ""
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}"{}></picture>',
+        source, storage.url(jpeg[src]), _srcset(storage, jpeg), sizes, _attributes(attrs),
+    )
+
+
+def _base_attrs(lazy, extra):
+    attrs = {"decoding": "async"}
+    if lazy:
+        attrs["loading"] = "lazy"
+    attrs.update({key.replace("_", "-"): value for key, value in extra.items()})
+    return attrs
+
+
+@register.simple_tag
+def post_image(post, sizes="100vw", lazy=True, **extra):
+    attrs = _base_attrs(lazy, extra)
+    attrs.setdefault("alt", post.description[:100] if post.description else "")
+    if post.image_width and post.image_height:
+        attrs["width"], attrs["height"] = post.image_width, post.image_height
+    return _picture(post.image, post.image_variants or {}, sizes, 640, attrs)
+
+
+@register.simple_tag
+def avatar(user, size, lazy=True, **extra):
+    attrs = _base_attrs(lazy, extra)
+    attrs.setdefault("alt", user.username)
+    attrs["width"] = attrs["height"] = size
+    attrs.setdefault("style", f"width:{size}px;height:{size}px;object-fit:cover;")
+    return _picture(user.photo, user.photo_variants or {}, f"{size}px", int(size) * 2, attrs)
@@ -1,3 +1,1210 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import hashlib
+import io
+import json
+import re
+import sqlite3
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from PIL import Image
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import CommandError, call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.connection import ConnectionDoesNotExist
+
+from .feed import FEED_PAGE_SIZE
+from .inbox import conversation_list, message_history
+from .management.commands.gc_media import referenced_names
+from .models import (
+    Comment, Conversation, FriendRequest, Message, Notification, Post, StoredFile, TimelineEntry, User,
+)
+from .notifications import mark_all_read, pipeline, unread_count
+from .search import search_posts, search_users
+from .uploads import upload_errors
+from .utils import create_notification
+from . import (
+    cache, friend_requests, fragments, graph, identity, images, instrumentation, realtime, routers, serving, timeline,
+)
+from .identity import load_user
+from .websocket import websocket_application
+
+
+# Notifications and image variants are written inline so assertions see
+# them immediately, whichever runner collects this module.
+sync_pipelines = override_settings(
+    NOTIFICATION_PIPELINE={**settings.NOTIFICATION_PIPELINE, "SYNC": True},
+    IMAGE_PIPELINE={**settings.IMAGE_PIPELINE, "SYNC": True},
+)
+
+
+def setUpModule():
+    sync_pipelines.enable()
+
+
+def tearDownModule():
+    sync_pipelines.disable()
+
+
+def make_user(username, **extra):
+    return User.objects.create(
+        username=username, email=f"{username}@example.com", password="pw",
+        photo="profile/avatar.jpg", **extra
+    )
+
+
+def make_posts(user, count):
+    return [Post.objects.create(user=user, image="posts/p.jpg", description=f"post {i}") for i in range(count)]
+
+
+class HomeFeedTests(TestCase):
+    def setUp(self):
+        self.viewer = make_user("viewer")
+        self.author = make_user("author")
+        self.viewer.add_friend(self.author)
+        session = self.client.session
+        session["user_id"] = self.viewer.id
+        session.save()
+
+    def populate(self, count):
+        for post in make_posts(self.author, count):
+            timeline.fan_out_post(post)
+            post.add_like(self.viewer)
+            post.add_like(self.author)
+            post.add_comment(self.author, "nice")
+            self.viewer.saved_posts.add(post)
+
+    def test_query_count_does_not_grow_with_posts(self):
+        self.populate(3)
+        self.client.get("/")  # warm the session, user and post card caches
+        with self.assertNumQueries(5):
+            self.client.get("/")
+
+        self.populate(FEED_PAGE_SIZE * 3)
+        with self.assertNumQueries(6):  # uncached cards add one query for their comments
+            response = self.client.get("/")
+        self.assertEqual(len(response.context["cards"]), FEED_PAGE_SIZE)
+        with self.assertNumQueries(5):
+            self.client.get("/")
+
+    def test_keyset_pages_cover_every_post_once(self):
+        posts = make_posts(self.author, FEED_PAGE_SIZE * 2 + 3)
+        for post in posts:
+            timeline.fan_out_post(post)
+        seen, cursor = [], None
+        while True:
+            response = self.client.get("/", {"cursor": cursor} if cursor else {})
+            seen.extend(int(re.search(r'id="comments-(\d+)"', card).group(1)) for card in response.context["cards"])
+            cursor = response.context["next_cursor"]
+            if not cursor:
+                break
+        self.assertEqual(seen, sorted((p.id for p in posts), reverse=True))
+
+    def test_cards_show_counts_and_viewer_state(self):
+        self.populate(1)
+        card = self.client.get("/").context["cards"][0]
+        self.assertIn('<small class="ms-1">2</small>', card)  # likes
+        self.assertIn('<small class="ms-1">1</small>', card)  # comments
+        self.assertIn("fa-solid fa-heart", card)
+        self.assertIn("fa-solid fa-bookmark", card)
+
+
+class CounterTests(TestCase):
+    def setUp(self):
+        self.alice = make_user("alice")
+        self.bob = make_user("bob")
+        self.post = make_posts(self.alice, 1)[0]
+
+    def test_methods_keep_counters_in_step(self):
+        self.assertTrue(self.post.add_like(self.bob))
+        self.assertFalse(self.post.add_like(self.bob))
+        comment = self.post.add_comment(self.bob, "hi")
+        self.post.add_comment(self.alice, "thanks")
+        self.post.remove_comment(comment.id)
+        self.assertTrue(self.alice.add_friend(self.bob))
+        self.assertFalse(self.alice.add_friend(self.bob))
+
+        self.post.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count), (1, 1))
+        self.assertEqual((self.alice.friend_count, self.bob.friend_count), (1, 1))
+
+        self.post.remove_like(self.bob)
+        self.alice.remove_friend(self.bob)
+        self.post.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+        self.assertEqual((self.alice.friend_count, self.bob.friend_count), (0, 0))
+
+    def test_deleting_a_user_settles_the_counters_it_touched(self):
+        carol = make_user("carol")
+        self.post.add_like(self.bob)
+        self.post.add_like(carol)
+        self.post.add_comment(self.bob, "one")
+        self.post.add_comment(self.bob, "two")
+        self.post.add_comment(carol, "three")
+        self.alice.add_friend(self.bob)
+        carol.add_friend(self.bob)
+        self.bob.posts.create(image="posts/p.jpg").add_like(self.alice)
+
+        self.bob.delete()
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count), (1, 1))
+        self.assertEqual(User.objects.get(id=self.alice.id).friend_count, 0)
+        self.assertEqual(User.objects.get(id=carol.id).friend_count, 0)
+        call_command("rebuild_counters", "--check", stdout=StringIO())
+
+    def test_rebuild_counters_repairs_drift(self):
+        self.post.likes.add(self.bob)
+        Comment.objects.create(post=self.post, user=self.bob, text="raw")
+        self.alice.friends.add(self.bob)
+
+        with self.assertRaises(CommandError):
+            call_command("rebuild_counters", "--check", stdout=StringIO())
+        call_command("rebuild_counters", stdout=StringIO())
+        call_command("rebuild_counters", "--check", stdout=StringIO())
+
+        self.post.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count), (1, 1))
+        self.assertEqual(self.bob.friend_count, 1)
+
+
+class TimelineTests(TestCase):
+    def setUp(self):
+        self.alice = make_user("alice")
+        self.bob = make_user("bob")
+        self.carol = make_user("carol")
+        self.alice.add_friend(self.bob)
+
+    def publish(self, user, count=1):
+        posts = make_posts(user, count)
+        for post in posts:
+            timeline.fan_out_post(post)
+        return posts
+
+    def timeline_ids(self, user):
+        return [post.id for post in timeline.get_timeline_page(user, page_size=50).posts]
+
+    def test_fan_out_reaches_author_and_friends_only(self):
+        post = self.publish(self.bob)[0]
+        self.assertEqual(self.timeline_ids(self.alice), [post.id])
+        self.assertEqual(self.timeline_ids(self.bob), [post.id])
+        self.assertEqual(self.timeline_ids(self.carol), [])
+
+    def test_friend_and_unfriend_backfill_and_trim(self):
+        older = self.publish(self.carol, 2)
+        self.alice.add_friend(self.carol)
+        timeline.on_friend_added(self.alice, self.carol)
+        self.assertEqual(self.timeline_ids(self.alice), [p.id for p in reversed(older)])
+
+        self.alice.remove_friend(self.carol)
+        timeline.on_friend_removed(self.alice, self.carol)
+        self.assertEqual(self.timeline_ids(self.alice), [])
+        self.assertFalse(TimelineEntry.objects.filter(owner=self.carol, author=self.alice).exists())
+
+    def test_celebrity_posts_are_pulled_at_read_time(self):
+        self.bob.refresh_from_db()
+        with mock.patch.object(timeline, "TIMELINE_FANOUT_LIMIT", 0):
+            post = self.publish(self.bob)[0]
+            self.assertFalse(TimelineEntry.objects.filter(owner=self.alice).exists())
+            self.assertEqual(self.timeline_ids(self.alice), [post.id])
+
+    def test_posts_from_a_celebrity_stay_visible_after_they_drop_back(self):
+        self.publish(self.bob)
+        with mock.patch.object(timeline, "TIMELINE_FANOUT_LIMIT", 1):
+            self.bob.add_friend(self.carol)  # bob crosses over the limit
+            post = self.publish(self.bob)[0]
+            self.assertFalse(TimelineEntry.objects.filter(post=post).exclude(owner=self.bob).exists())
+            self.assertEqual(self.timeline_ids(self.alice)[0], post.id)
+
+            self.bob.remove_friend(self.carol)  # and back under it
+            timeline.on_friend_removed(self.bob, self.carol)
+            self.assertTrue(TimelineEntry.objects.filter(owner=self.alice, post=post).exists())
+            self.assertEqual(self.timeline_ids(self.alice), [p.id for p in self.bob.posts.order_by("-id")])
+
+            dave = make_user("dave")
+            dave.add_friend(self.bob)
+            self.bob.refresh_from_db()
+            post = self.publish(self.bob)[0]
+            dave.delete()  # a deleted friend takes bob back under too
+            self.assertTrue(TimelineEntry.objects.filter(owner=self.alice, post=post).exists())
+
+
+class CurrentUserTests(TestCase):
+    def setUp(self):
+        self.user = make_user("alice")
+        session = self.client.session
+        session["user_id"] = self.user.id
+        session.save()
+
+    def test_authenticated_views_reuse_the_cached_user(self):
+        self.client.get("/saved_posts/")
+        with self.assertNumQueries(1):  # only the saved posts themselves
+            response = self.client.get("/saved_posts/")
+        self.assertEqual(response.context["user"], self.user)
+
+    def test_save_and_friend_changes_invalidate_the_cache(self):
+        load_user(self.user.id)
+        self.user.bio = "updated"
+        self.user.save()
+        self.assertEqual(load_user(self.user.id).bio, "updated")
+
+        self.user.add_friend(make_user("bob"))
+        self.assertEqual(load_user(self.user.id).friend_count, 1)
+
+    def test_row_cached_before_commit_is_orphaned_on_commit(self):
+        stale = load_user(self.user.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.bio = "updated"
+            self.user.save()
+            # A concurrent request that read the row before this commit caches it under the new version.
+            version = identity.cache.get(identity._version_key(self.user.id))
+            identity.cache.set(identity._user_key(self.user.id, version), stale)
+        self.assertEqual(load_user(self.user.id).bio, "updated")
+
+    def test_evicted_version_does_not_revive_an_old_copy(self):
+        stale = load_user(self.user.id)
+        identity.cache.set(identity._user_key(self.user.id, 0), stale)
+        identity.cache.set(identity._user_key(self.user.id, 1), stale)
+        identity.cache.delete(identity._version_key(self.user.id))
+        User.objects.filter(id=self.user.id).update(bio="updated")
+        self.assertEqual(load_user(self.user.id).bio, "updated")
+
+        identity.cache.delete(identity._version_key(self.user.id))
+        User.objects.filter(id=self.user.id).update(bio="again")
+        identity.invalidate_user(self.user.id)
+        self.assertEqual(load_user(self.user.id).bio, "again")
+
+    def test_stale_session_user_is_not_found(self):
+        self.client.get("/")
+        self.user.delete()
+        self.assertEqual(self.client.get("/").status_code, 404)
+
+
+class ProfileCacheTests(TestCase):
+    def setUp(self):
+        cache.get_cache().clear()
+        cache.reset_metrics()
+        self.alice = make_user("alice")
+        self.bob = make_user("bob")
+        self.post = make_posts(self.alice, 1)[0]
+
+    def test_lookups_are_counted(self):
+        cache.get_post_card(self.post.id)
+        cache.get_post_card(self.post.id)
+        self.assertEqual(cache.metrics()[cache.POST_CARD]["hits"], 1)
+        self.assertEqual(cache.metrics()[cache.POST_CARD]["misses"], 1)
+
+    def test_writes_invalidate_cached_entries(self):
+        cache.get_post_card(self.post.id)
+        self.post.add_like(self.bob)
+        self.post.add_comment(self.bob, "hi")
+        card = cache.get_post_card(self.post.id)
+        self.assertEqual((card.like_count, card.comment_count), (1, 1))
+
+        self.assertEqual(list(graph.friend_ids(self.alice.id)), [])
+        self.alice.add_friend(self.bob)
+        self.assertEqual(list(graph.friend_ids(self.bob.id)), [self.alice.id])
+
+        self.assertEqual(cache.get_profile_stats(self.bob.id)["saved_count"], 0)
+        self.bob.saved_posts.add(self.post)
+        self.assertEqual(cache.get_profile_stats(self.bob.id)["saved_count"], 1)
+        self.post.saved_by.clear()
+        self.assertEqual(cache.get_profile_stats(self.bob.id)["saved_count"], 0)
+
+    def test_metrics_endpoint_exposes_counters(self):
+        cache.get_post_card(self.post.id)
+        response = self.client.get("/metrics/cache/", REMOTE_ADDR="127.0.0.1")
+        self.assertContains(response, 'socialhub_cache_misses_total{namespace="post-card"} 1')
+
+
+class InboxTests(TestCase):
+    def setUp(self):
+        self.user = make_user("me")
+        self.friends = [make_user(f"friend{i}") for i in range(3)]
+        for friend in self.friends:
+            self.user.add_friend(friend)
+        session = self.client.session
+        session["user_id"] = self.user.id
+        session.save()
+
+    def test_conversations_sorted_by_recency_with_unread_counts(self):
+        Message.objects.create(sender=self.friends[0], receiver=self.user, text="old")
+        Message.objects.create(sender=self.friends[2], receiver=self.user, text="one")
+        Message.objects.create(sender=self.friends[2], receiver=self.user, text="two")
+        Message.objects.create(sender=self.user, receiver=self.friends[0], text="newest")
+
+        conversations = list(conversation_list(self.user))
+        self.assertEqual([f.id for f in conversations], [self.friends[0].id, self.friends[2].id, self.friends[1].id])
+        self.assertEqual([f.unread for f in conversations], [1, 2, 0])
+        self.assertEqual(conversations[0].last_text, "newest")
+
+    def test_history_pages_back_through_the_conversation(self):
+        friend = self.friends[0]
+        sent = [
+            Message.objects.create(sender=self.user if i % 2 else friend, receiver=friend if i % 2 else self.user, text=str(i))
+            for i in range(7)
+        ]
+        self.assertEqual(Conversation.objects.count(), 1)
+
+        seen, before = [], None
+        while True:
+            page, before = message_history(self.user, friend, before=before, page_size=3)
+            seen = page + seen
+            if not before:
+                break
+        self.assertEqual([m.id for m in seen], [m.id for m in sent])
+        self.assertEqual(message_history(self.user, self.friends[1]), ([], None))
+
+    def test_inbox_query_count_is_independent_of_friend_count(self):
+        self.client.get("/messages/")
+        with self.assertNumQueries(1):
+            self.client.get("/messages/")
+        for i in range(5):
+            friend = make_user(f"extra{i}")
+            self.user.add_friend(friend)
+            Message.objects.create(sender=friend, receiver=self.user, text="hi")
+        with self.assertNumQueries(2):  # friend_count changed, so the user row is reloaded once
+            self.client.get("/messages/")
+        with self.assertNumQueries(1):
+            self.client.get("/messages/")
+
+
+class RealtimeTests(TestCase):
+    def setUp(self):
+        self.alice = make_user("alice")
+        self.bob = make_user("bob")
+        session = self.client.session
+        session["user_id"] = self.bob.id
+        session.save()
+        self.cookie = f"{settings.SESSION_COOKIE_NAME}={session.session_key}".encode()
+        self.origin = (b"origin", b"http://testserver")
+
+    async def connect(self, headers):
+        inbox, outbox = asyncio.Queue(), asyncio.Queue()
+        await inbox.put({"type": "websocket.connect"})
+        scope = {"type": "websocket", "path": "/ws/", "headers": headers}
+        task = asyncio.ensure_future(websocket_application(scope, inbox.get, outbox.put))
+        return task, inbox, outbox
+
+    async def test_anonymous_sockets_are_rejected(self):
+        task, _, outbox = await self.connect([self.origin])
+        await task
+        self.assertEqual((await outbox.get())["code"], 4401)
+
+    async def test_foreign_origins_are_rejected(self):
+        for headers in ([(b"origin", b"https://evil.example")], []):
+            task, _, outbox = await self.connect([(b"cookie", self.cookie), *headers])
+            await task
+            self.assertEqual((await outbox.get())["code"], 4403)
+
+    async def test_new_messages_are_pushed_to_the_receiver(self):
+        task, inbox, outbox = await self.connect([(b"cookie", self.cookie), self.origin])
+        self.assertEqual((await outbox.get())["type"], "websocket.accept")
+        await asyncio.sleep(0)  # let the endpoint subscribe
+
+        message = await sync_to_async(Message.objects.create)(sender=self.alice, receiver=self.bob, text="hey")
+        await sync_to_async(realtime.publish_message)(message)
+        frame = await asyncio.wait_for(outbox.get(), 1)
+        self.assertEqual(json.loads(frame["text"])["message"]["text"], "hey")
+
+        await inbox.put({"type": "websocket.disconnect"})
+        await asyncio.wait_for(task, 1)
+        self.assertFalse(realtime.get_broker()._subscribers)
+
+
+class NotificationPipelineTests(TestCase):
+    def setUp(self):
+        self.owner = make_user("owner")
+        self.fans = [make_user(f"fan{i}") for i in range(5)]
+
+    def test_sync_mode_writes_immediately_and_coalesces(self):
+        for fan in self.fans:
+            create_notification(fan, self.owner, "liked your post", "/post/1/")
+        note = Notification.objects.get(receiver=self.owner)
+        self.assertEqual(note.actor_count, 5)
+        self.assertEqual(note.message, "fan4 and 4 others liked your post")
+
+    def test_repeat_actors_across_flushes_are_counted_once(self):
+        for fan in (self.fans[0], self.fans[1], self.fans[0], self.fans[1], self.fans[0]):
+            create_notification(fan, self.owner, "liked your post", "/post/1/")
+        note = Notification.objects.get(receiver=self.owner)
+        self.assertEqual(note.actor_count, 2)
+        self.assertEqual(note.message, "fan0 and 1 other liked your post")
+
+    def test_batched_flush_collapses_a_burst_into_one_row(self):
+        with self.settings(NOTIFICATION_PIPELINE={"SYNC": False, "BATCH_SIZE": 1000, "FLUSH_INTERVAL": 60}):
+            for fan in self.fans:
+                create_notification(fan, self.owner, "liked your post", "/post/1/")
+                create_notification(fan, self.owner, "commented on your post", "/post/1/")
+            self.assertFalse(Notification.objects.exists())
+            with self.assertNumQueries(4):  # savepoint, unread rows to merge into, one bulk INSERT, release
+                self.assertEqual(pipeline.flush(), 2)
+        self.assertEqual(
+            sorted(Notification.objects.values_list("verb", "actor_count")),
+            [("commented on your post", 5), ("liked your post", 5)],
+        )
+
+    def test_background_flush_closes_its_connection(self):
+        # Timer threads never run again, so a connection kept for CONN_MAX_AGE would leak.
+        with mock.patch.object(pipeline, "flush"), mock.patch("Profile.notifications.connection") as connection_:
+            pipeline._flush_in_background()
+        connection_.close.assert_called_once_with()
+
+    def test_read_notifications_are_not_merged_into(self):
+        create_notification(self.fans[0], self.owner, "liked your post", "/post/1/")
+        Notification.objects.update(is_read=True)
+        create_notification(self.fans[1], self.owner, "liked your post", "/post/1/")
+        self.assertEqual(Notification.objects.filter(is_read=False).get().message, "fan1 liked your post")
+
+
+class NotificationBadgeTests(TestCase):
+    def setUp(self):
+        cache.get_cache().clear()
+        self.owner = make_user("owner")
+        self.fan = make_user("fan")
+        session = self.client.session
+        session["user_id"] = self.owner.id
+        session.save()
+
+    def test_badge_counter_is_incremented_and_reset(self):
+        self.assertEqual(unread_count(self.owner.id), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            create_notification(self.fan, self.owner, "liked your post", "/post/1/")
+            create_notification(self.fan, self.owner, "added you as a friend", "/profile/2/friends/")
+        with self.assertNumQueries(0):
+            self.assertEqual(unread_count(self.owner.id), 2)
+
+        response = self.client.get("/saved_posts/")
+        self.assertContains(response, 'id="notification-badge" class="badge bg-danger">2</span>', html=False)
+
+        self.client.get("/notifications/")
+        self.assertEqual(unread_count(self.owner.id), 0)
+        self.assertFalse(Notification.objects.filter(is_read=False).exists())
+
+    def test_reset_waits_for_commit_and_counts_expire(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            create_notification(self.fan, self.owner, "liked your post", "/post/1/")
+        self.assertEqual(unread_count(self.owner.id), 1)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            mark_all_read(self.owner)
+            self.assertEqual(unread_count(self.owner.id), 1)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(unread_count(self.owner.id), 0)
+
+        # A row added by another process, whose cache increments never reach this one.
+        Notification.objects.create(sender=self.fan, receiver=self.owner, message="hi")
+        self.assertEqual(unread_count(self.owner.id), 0)
+        with mock.patch("time.time", return_value=time.time() + settings.NOTIFICATION_PIPELINE["UNREAD_TIMEOUT"] + 1):
+            self.assertEqual(unread_count(self.owner.id), 1)
+
+
+class NotificationPageTests(TestCase):
+    def setUp(self):
+        self.owner = make_user("owner")
+        self.fan = make_user("fan")
+        session = self.client.session
+        session["user_id"] = self.owner.id
+        session.save()
+        self.notes = [
+            Notification.objects.create(sender=self.fan, receiver=self.owner, message=f"n{i}", link=f"/post/{i}/")
+            for i in range(25)
+        ]
+
+    def test_pages_are_marked_read_as_they_are_viewed(self):
+        first = self.client.get("/notifications/")
+        self.assertEqual(len(first.context["notifications"]), 20)
+        self.assertEqual(Notification.objects.filter(is_read=False).count(), 5)
+
+        older = self.client.get("/notifications/", {"before": first.context["older_cursor"]})
+        self.assertEqual(len(older.context["notifications"]), 5)
+        self.assertIsNone(older.context["older_cursor"])
+        self.assertFalse(Notification.objects.filter(is_read=False).exists())
+
+    def test_prune_removes_only_old_read_rows_in_batches(self):
+        old = timezone.now() - timedelta(days=90)
+        Notification.objects.filter(id__in=[n.id for n in self.notes[:10]]).update(is_read=True, created_at=old)
+        Notification.objects.filter(id=self.notes[10].id).update(created_at=old)  # old but unread
+
+        with tempfile.NamedTemporaryFile("r", suffix=".jsonl") as archive:
+            call_command("prune_notifications", "--batch-size=3", "--pause=0", f"--archive={archive.name}", stdout=StringIO())
+            self.assertEqual(len(archive.readlines()), 10)
+        self.assertEqual(Notification.objects.count(), 15)
+
+
+class UserSearchTests(TestCase):
+    def setUp(self):
+        self.exact = make_user("marco", name="Marco Polo")
+        self.prefix = make_user("marcopolo", name="")
+        self.substring = make_user("el_marco", name="")
+        self.by_name = make_user("zed", name="Marcolina Z")
+        make_user("unrelated", name="Nobody")
+
+    def usernames(self, query, page=1, page_size=10):
+        return [u.username for u in search_users(query, page, page_size)]
+
+    def test_exact_then_prefix_then_substring(self):
+        self.assertEqual(self.usernames("marco"), ["marco", "marcopolo", "zed", "el_marco"])
+        self.assertEqual(self.usernames("MARCO")[0], "marco")
+
+    def test_index_follows_user_changes(self):
+        self.by_name.name = "Renamed"
+        self.by_name.save()
+        self.substring.delete()
+        self.assertEqual(self.usernames("marco"), ["marco", "marcopolo"])
+
+    def test_pages_without_counting(self):
+        first = search_users("marco", page=1, page_size=3)
+        self.assertTrue(first.has_next())
+        second = search_users("marco", page=2, page_size=3)
+        self.assertFalse(second.has_next())
+        self.assertEqual([u.username for u in second], ["el_marco"])
+
+
+class PostSearchTests(TestCase):
+    def setUp(self):
+        self.author = make_user("author")
+        self.reader = make_user("reader")
+        self.sunset, self.beach, self.city = (
+            Post.objects.create(user=self.author, image="posts/p.jpg", description=text)
+            for text in ("Sunset over the hills", "Walking on the beach", "City lights at night")
+        )
+
+    def ids(self, query, **kwargs):
+        return [post.id for post in search_posts(query, **kwargs)[0]]
+
+    def test_matches_descriptions_and_comments_newest_first(self):
+        self.city.add_comment(self.reader, "Loved the sunsets here too")
+        self.assertEqual(self.ids("sunset"), [self.city.id, self.sunset.id])
+        self.assertEqual(self.ids("sunset hills"), [self.sunset.id])
+
+    def test_index_follows_edits_and_deletes(self):
+        comment = self.beach.add_comment(self.reader, "great waves")
+        self.assertEqual(self.ids("waves"), [self.beach.id])
+        self.beach.remove_comment(comment.id)
+        self.assertEqual(self.ids("waves"), [])
+
+        self.city.description = "Mountain hike"
+        self.city.save()
+        self.assertEqual(self.ids("mountain"), [self.city.id])
+        self.city.delete()
+        self.assertEqual(self.ids("mountain"), [])
+
+    def test_comment_writes_touch_only_their_own_index_row(self):
+        self.sunset.add_comment(self.reader, "sunset again")
+        self.assertEqual(self.ids("sunset"), [self.sunset.id])
+        for i in range(5):
+            self.beach.add_comment(self.reader, f"comment {i}")
+        with CaptureQueriesContext(connection) as queries:
+            self.beach.add_comment(self.reader, "one more wave")
+        # A delete and an insert for the new comment, nothing for the earlier ones.
+        self.assertEqual(sum("Profile_post_search" in q["sql"] for q in queries.captured_queries), 2)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.beach.delete()
+        self.assertEqual(sum("Profile_post_search" in q["sql"] for q in queries.captured_queries), 2)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM Profile_post_search WHERE post_id = %s", [self.beach.id])
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+    def test_keyset_pages(self):
+        first, cursor = search_posts("the", page_size=1)
+        self.assertEqual([p.id for p in first], [self.beach.id])
+        second, cursor = search_posts("the", before=cursor, page_size=1)
+        self.assertEqual(([p.id for p in second], cursor), ([self.sunset.id], None))
+
+
+def jpeg_with_exif(size=(1200, 800)):
+    exif = Image.Exif()
+    exif[0x0110] = "Test Camera"  # Model
+    exif[0x0112] = 6  # Orientation: rotate 90 degrees clockwise for display
+    buffer = io.BytesIO()
+    Image.new("RGB", size, "red").save(buffer, "JPEG", exif=exif)
+    return buffer.getvalue()
+
+
+class ImagePipelineTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = override_settings(MEDIA_ROOT=media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = make_user("painter")
+        session = self.client.session
+        session["user_id"] = self.user.id
+        session.save()
+
+    def upload(self):
+        upload = SimpleUploadedFile("photo.jpg", jpeg_with_exif(), content_type="image/jpeg")
+        self.client.post("/create/post/", {"image": upload, "description": "red"})
+        return Post.objects.filter(user=self.user).latest("id")
+
+    def test_upload_builds_variants_without_metadata(self):
+        post = self.upload()
+        # Orientation 6 is applied, so the stored dimensions are portrait.
+        self.assertEqual((post.image_width, post.image_height), (800, 1200))
+        self.assertEqual(sorted(post.image_variants["jpeg"], key=int), ["320", "640"])
+        for names in post.image_variants.values():
+            for width, name in names.items():
+                with post.image.storage.open(name) as handle:
+                    variant = Image.open(handle)
+                    self.assertEqual(variant.width, int(width))
+                    self.assertFalse(variant.getexif())
+        with post.image.open("rb") as handle:
+            original = Image.open(handle)
+            self.assertFalse(original.getexif())
+            self.assertEqual(original.size, (800, 1200))
+
+    def test_replacing_the_image_removes_old_variants(self):
+        post = self.upload()
+        old = post.image_variants["webp"]["320"]
+        upload = SimpleUploadedFile("next.jpg", jpeg_with_exif((400, 300)), content_type="image/jpeg")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"/edit/{post.id}/", {"image": upload, "description": "again"})
+        post.refresh_from_db()
+        self.assertEqual(list(post.image_variants["webp"]), ["320"])
+        self.assertFalse(post.image.storage.exists(old))
+
+    def test_template_falls_back_to_the_original(self):
+        post = make_posts(self.user, 1)[0]
+        template = Template('{% load images %}{% post_image post sizes="100vw" class="w-100" %}')
+        html = template.render(Context({"post": post}))
+        self.assertIn('src="/media/posts/p.jpg"', html)
+        self.assertIn('loading="lazy"', html)
+        self.assertNotIn("srcset", html)
+
+        post = self.upload()
+        html = template.render(Context({"post": post}))
+        self.assertIn('<source type="image/webp" srcset="', html)
+        self.assertIn(" 640w", html)
+        self.assertIn('height="1200" loading="lazy" width="800"', html)
+
+
+@override_settings(UPLOAD_RULES={
+    "image": {"max_size": 64 * 1024, "types": ("jpeg", "png")},
+    "attachment": {"max_size": 64 * 1024, "types": ("pdf",)},
+})
+class UploadTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = override_settings(MEDIA_ROOT=media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = make_user("uploader")
+        session = self.client.session
+        session["user_id"] = self.user.id
+        session.save()
+
+    def post_image(self, content, name="photo.jpg"):
+        upload = SimpleUploadedFile(name, content, content_type="image/jpeg")
+        return self.client.post("/create/post/", {"image": upload, "description": "x"}, follow=True)
+
+    def test_accepts_a_valid_image(self):
+        self.post_image(jpeg_with_exif((200, 100)))
+        self.assertEqual(Post.objects.filter(user=self.user).count(), 1)
+
+    def test_rejects_content_that_is_not_the_claimed_type(self):
+        response = self.post_image(b"#!/bin/sh\necho pwned\n" * 10)
+        self.assertFalse(Post.objects.exists())
+        self.assertContains(response, "photo.jpg is not an allowed file type (jpeg, png).")
+
+    def test_rejects_a_file_over_the_field_limit(self):
+        response = self.post_image(b"\xff\xd8\xff" + b"\0" * (128 * 1024))
+        self.assertFalse(Post.objects.exists())
+        self.assertContains(response, "photo.jpg is larger than 0.0625 MB.")
+
+    @override_settings(UPLOAD_MAX_REQUEST_SIZE=1024)
+    def test_rejects_an_oversized_request_before_reading_it(self):
+        with mock.patch("Profile.uploads.StreamingUploadHandler.new_file") as new_file:
+            response = self.post_image(jpeg_with_exif((200, 100)))
+        new_file.assert_not_called()
+        self.assertFalse(Post.objects.exists())
+        self.assertContains(response, "Uploads are limited to")
+
+    def test_hashes_attachments_while_streaming(self):
+        content = b"%PDF-1.4\n" + b"a" * 5000
+        request = RequestFactory().post(
+            "/messages/send/1/", {"attachment": SimpleUploadedFile("doc.pdf", content), "text": "hi"},
+        )
+        attachment = request.FILES["attachment"]
+        self.assertEqual(upload_errors(request), [])
+        self.assertEqual(attachment.content_hash, hashlib.sha256(content).hexdigest())
+        self.assertEqual((attachment.size, attachment.content_type), (len(content), "application/pdf"))
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = override_settings(MEDIA_ROOT=media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = make_user("hoarder")
+        self.content = jpeg_with_exif((64, 64))
+
+    def create_post(self, content=None, name="same.jpg"):
+        return Post.objects.create(user=self.user, image=SimpleUploadedFile(name, content or self.content))
+
+    def test_identical_uploads_share_one_file_until_the_last_reference_goes(self):
+        first, second = self.create_post(), self.create_post(name="copy.JPG")
+        digest = hashlib.sha256(self.content).hexdigest()
+        self.assertEqual(first.image.name, f"posts/{digest[:2]}/{digest}.jpg")
+        self.assertEqual(second.image.name, first.image.name)
+        self.assertEqual(StoredFile.objects.get().refcount, 2)
+        self.assertEqual(first.image.storage.usage()["saved_bytes"], len(self.content))
+
+        storage, name = first.image.storage, first.image.name
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(storage.exists(name))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(storage.exists(name))
+        self.assertFalse(StoredFile.objects.exists())
+
+    def test_replacing_an_upload_releases_the_old_file(self):
+        post = self.create_post()
+        old = post.image.name
+        with self.captureOnCommitCallbacks(execute=True):
+            post.image = SimpleUploadedFile("new.jpg", jpeg_with_exif((32, 32)))
+            post.save()
+        self.assertFalse(post.image.storage.exists(old))
+        self.assertEqual(list(StoredFile.objects.values_list("name", flat=True)), [post.image.name])
+
+    def test_reuploading_the_same_file_keeps_one_reference(self):
+        post = self.create_post()
+        name = post.image.name
+        for _ in range(2):
+            with self.captureOnCommitCallbacks(execute=True):
+                post.image = SimpleUploadedFile("again.jpg", self.content)
+                post.save()
+        self.assertEqual(post.image.name, name)
+        self.assertEqual(StoredFile.objects.get().refcount, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            post.delete()
+        self.assertFalse(post.image.storage.exists(name))
+
+    def test_gc_removes_orphans_and_reports_savings(self):
+        kept = self.create_post()
+        self.create_post()
+        storage = kept.image.storage
+        orphan = storage.save("profile/legacy.jpg", SimpleUploadedFile("legacy.jpg", b"old bytes"))
+        StoredFile.objects.filter(name=orphan).delete()  # as if written before this storage existed
+        StoredFile.objects.filter(name=kept.image.name).update(refcount=7)
+
+        out = StringIO()
+        call_command("gc_media", grace=0, stdout=out)
+        self.assertFalse(storage.exists(orphan))
+        self.assertTrue(storage.exists(kept.image.name))
+        self.assertEqual(StoredFile.objects.get().refcount, 2)
+        self.assertIn("Removed 1 unreferenced files", out.getvalue())
+        self.assertIn("corrected 1 reference counts", out.getvalue())
+
+    def test_gc_keeps_a_file_reused_by_an_upload_during_the_walk(self):
+        post = self.create_post()
+        name = post.image.name
+        Post.objects.filter(pk=post.pk).update(image="")  # dropped without releasing the reference
+
+        def count_then_upload():
+            refs = referenced_names()
+            self.create_post()  # same content: takes a reference without rewriting the file
+            return refs
+
+        with mock.patch("Profile.management.commands.gc_media.referenced_names", count_then_upload):
+            call_command("gc_media", grace=0, stdout=StringIO())
+        self.assertTrue(post.image.storage.exists(name))
+        self.assertEqual(StoredFile.objects.get().refcount, 2)
+
+    def test_released_file_reused_before_removal_is_kept(self):
+        first = self.create_post()
+        storage, name = first.image.storage, first.image.name
+        with self.captureOnCommitCallbacks() as callbacks:
+            first.delete()
+        self.assertEqual(StoredFile.objects.get().refcount, 0)
+        second = self.create_post()
+        for callback in callbacks:
+            callback()
+        self.assertTrue(storage.exists(name))
+        self.assertEqual(second.image.name, name)
+        self.assertEqual(StoredFile.objects.get().refcount, 1)
+
+
+class StaticAndMediaServingTests(TestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.root = root.name
+        override = override_settings(MEDIA_ROOT=f"{self.root}/media", STATIC_ROOT=f"{self.root}/static")
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = make_user("server")
+
+    def test_content_addressed_media_is_immutable_and_revalidates(self):
+        post = Post.objects.create(user=self.user, image=SimpleUploadedFile("a.jpg", jpeg_with_exif((16, 16))))
+        response = self.client.get(post.image.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Cache-Control"], serving.IMMUTABLE)
+        self.assertEqual(b"".join(response.streaming_content), post.image.read())
+
+        etag, modified = response["ETag"], response["Last-Modified"]
+        self.assertEqual(self.client.get(post.image.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(post.image.url, HTTP_IF_MODIFIED_SINCE=modified).status_code, 304)
+        self.assertEqual(self.client.get("/media/posts/../../secret").status_code, 404)
+
+    @override_settings(STORAGES={
+        **settings.STORAGES,
+        "staticfiles": {"BACKEND": "Profile.staticfiles.CompressedManifestStaticFilesStorage"},
+    })
+    def test_collectstatic_precompresses_hashed_assets(self):
+        call_command("collectstatic", interactive=False, verbosity=0)
+        with open(f"{self.root}/static/staticfiles.json") as handle:
+            manifest = json.load(handle)["paths"]
+        hashed = manifest["js/socialhub.js"]
+
+        request = RequestFactory().get(f"/static/{hashed}", HTTP_ACCEPT_ENCODING="gzip, deflate")
+        response = serving.serve_static(request, hashed)
+        self.assertEqual((response["Content-Encoding"], response["Cache-Control"]), ("gzip", serving.IMMUTABLE))
+        self.assertIn(b"copyPostLink", gzip.decompress(b"".join(response.streaming_content)))
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+
+        plain = serving.serve_static(RequestFactory().get("/"), "js/socialhub.js")
+        self.assertFalse(plain.has_header("Content-Encoding"))
+        self.assertEqual(plain["Cache-Control"], serving.SHORT_LIVED)
+
+    @override_settings(SENDFILE_BACKEND="nginx")
+    def test_sendfile_offload(self):
+        post = Post.objects.create(user=self.user, image=SimpleUploadedFile("b.jpg", jpeg_with_exif((8, 8))))
+        response = self.client.get(post.image.url)
+        self.assertEqual(response["X-Accel-Redirect"], f"/internal/media/{post.image.name}")
+        self.assertEqual(response.content, b"")
+
+
+class PostFragmentTests(TestCase):
+    def setUp(self):
+        cache.get_cache().clear()
+        self.author = make_user("artist")
+        self.viewer = make_user("fan")
+        self.post = make_posts(self.author, 1)[0]
+        self.comment = self.post.add_comment(self.viewer, "lovely")
+        self.request = RequestFactory().get("/")
+
+    def card(self, viewer, kind="feed", **kwargs):
+        post = Post.objects.select_related("user").get(id=self.post.id)
+        return fragments.render_cards(self.request, viewer, [post], kind, **kwargs)[0]
+
+    def test_viewer_specific_parts_are_layered_on_a_shared_fragment(self):
+        own = self.card(self.author)
+        cache.reset_metrics()
+        theirs = self.card(self.viewer, liked_ids={self.post.id}, saved_ids={self.post.id})
+        self.assertEqual(cache.metrics()[fragments.POST_FRAGMENT], {"hits": 1, "misses": 0, "invalidations": 0})
+
+        self.assertIn(f"/edit/{self.post.id}/", own)
+        self.assertNotIn(f"/edit/{self.post.id}/", theirs)
+        self.assertIn(f"/comment/{self.comment.id}/delete/", theirs)
+        self.assertNotIn(f"/comment/{self.comment.id}/delete/", own)
+        self.assertIn("fa-solid fa-heart", theirs)
+        self.assertNotIn("fa-solid fa-heart", own)
+        self.assertIn("fa-solid fa-bookmark", theirs)
+        self.assertIn('name="csrfmiddlewaretoken"', own)
+        self.assertNotIn("<!--", theirs.replace("<!-- ", ""))
+
+    def test_changes_render_under_a_new_version(self):
+        self.card(self.viewer)
+        self.post.add_like(self.viewer)
+        self.post.add_comment(self.author, "thanks!")
+        self.post.refresh_from_db()
+        self.post.description = "Edited caption"
+        self.post.save()
+        cache.reset_metrics()
+        html = self.card(self.viewer)
+        self.assertEqual(cache.metrics()[fragments.POST_FRAGMENT]["misses"], 1)
+        self.assertIn("thanks!", html)
+        self.assertIn("Edited caption", html)
+        self.assertEqual(self.post.version, 4)
+
+    def test_commenter_rename_renders_under_a_new_version(self):
+        self.assertIn("@fan", self.card(self.author))
+        self.viewer.username = "renamed"
+        self.viewer.save()
+        html = self.card(self.author)
+        self.assertIn("@renamed", html)
+        self.assertNotIn("@fan", html)
+
+    def test_editing_a_stale_post_keeps_concurrent_likes(self):
+        session = self.client.session
+        session["user_id"] = self.author.id
+        session.save()
+        stale = Post.objects.get(id=self.post.id)
+        start = stale.version
+        self.post.add_like(self.viewer)
+        stale.description = "Edited caption"
+        stale.save(update_fields=["description"])
+        self.client.post(f"/edit/{self.post.id}/", {"description": "Edited again"})
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.version), (1, start + 3))
+        self.assertEqual(stale.version, start + 2)
+
+    def test_user_text_cannot_forge_markers(self):
+        self.post.description = f"<!--only:user:{self.viewer.id}-->x<!--/only-->"
+        self.post.save()
+        self.assertIn("&lt;!--only", self.card(self.viewer))
+
+    def test_profile_pages_use_the_grid_cards(self):
+        session = self.client.session
+        session["user_id"] = self.author.id
+        session.save()
+        response = self.client.get("/profile/")
+        self.assertEqual(len(response.context["cards"]), 1)
+        self.assertContains(response, f"/edit/{self.post.id}/")
+        response = self.client.get(f"/profile/{self.author.id}/")
+        self.assertContains(response, f"/post/{self.post.id}/")
+
+
+class SQLiteProfileTests(TestCase):
+    def connect(self):
+        from .sqlite.base import DatabaseWrapper
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_dict = {**connection.settings_dict, "NAME": f"{directory.name}/tuned.sqlite3"}
+        wrapper = DatabaseWrapper(settings_dict, alias="sqlite-profile-test")
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def test_new_connections_get_the_pragmas(self):
+        wrapper = self.connect()
+        with wrapper.cursor() as cursor:
+            values = {}
+            for name in ("journal_mode", "synchronous", "busy_timeout", "temp_store"):
+                cursor.execute(f"PRAGMA {name}")
+                values[name] = cursor.fetchone()[0]
+        self.assertEqual(values, {"journal_mode": "wal", "synchronous": 1, "busy_timeout": 5000, "temp_store": 2})
+
+    def test_transactions_take_the_write_lock_up_front(self):
+        wrapper = self.connect()
+        with wrapper.cursor() as cursor:
+            cursor.execute("CREATE TABLE t (x)")
+        wrapper._start_transaction_under_autocommit()
+        self.addCleanup(wrapper.rollback)
+        # Nothing has been written yet, but a second writer is already shut out.
+        other = sqlite3.connect(wrapper.settings_dict["NAME"], timeout=0)
+        self.addCleanup(other.close)
+        with self.assertRaisesMessage(sqlite3.OperationalError, "database is locked"):
+            other.execute("INSERT INTO t VALUES (1)")
+
+
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        self.user = make_user("reader")
+        self.other = make_user("other")
+        session = self.client.session
+        session["user_id"] = self.user.id
+        session.save()
+
+    def test_router_sends_reads_to_the_chosen_replica_until_a_write(self):
+        router = routers.ReplicaRouter()
+        self.assertEqual(router.db_for_read(User), "default")
+        token = routers._state.set(routers.RoutingState(replica="replica1"))
+        try:
+            self.assertEqual(router.db_for_read(User), "replica1")
+            self.assertEqual(router.db_for_write(User), "default")
+            self.assertEqual(router.db_for_read(User), "default")
+        finally:
+            routers._state.reset(token)
+        self.assertFalse(router.allow_migrate("replica1", "Profile"))
+
+    # "default" stands in for the replica so the queries can run.
+    @override_settings(READ_REPLICAS=["default"])
+    def test_read_only_views_use_replicas_except_after_a_write(self):
+        response = self.client.get(f"/profile/{self.other.id}/")
+        self.assertTrue(response.wsgi_request.reads_from_replica)
+        response = self.client.get("/profile/edit/")
+        self.assertFalse(response.wsgi_request.reads_from_replica)
+
+        self.client.get(f"/friend/{self.other.id}/")
+        response = self.client.get(f"/profile/{self.other.id}/")
+        self.assertFalse(response.wsgi_request.reads_from_replica)
+
+        session = self.client.session
+        session[routers.STICKY_SESSION_KEY] = 0
+        session.save()
+        response = self.client.get(f"/profile/{self.other.id}/friends/")
+        self.assertTrue(response.wsgi_request.reads_from_replica)
+
+    def test_cache_misses_read_from_the_primary(self):
+        cache.get_cache().clear()
+        # "replica1" is not a configured database, so any read sent there would fail.
+        token = routers._state.set(routers.RoutingState(replica="replica1"))
+        try:
+            self.assertEqual(load_user(self.user.id), self.user)
+            self.assertEqual(cache.get_profile_stats(self.user.id)["friend_count"], 0)
+            with self.assertRaises(ConnectionDoesNotExist):
+                User.objects.get(id=self.user.id)
+        finally:
+            routers._state.reset(token)
+
+    def test_without_replicas_everything_reads_from_the_primary(self):
+        response = self.client.get("/")
+        self.assertFalse(response.wsgi_request.reads_from_replica)
+
+
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        self.user = make_user("viewer")
+        self.other = make_user("other")
+        make_posts(self.other, 2)
+        session = self.client.session
+        session["user_id"] = self.user.id
+        session.save()
+
+    @override_settings(REQUEST_INSTRUMENTATION={"ENABLED": True, "SLOW_SAMPLE_RATE": 0})
+    def test_requests_are_logged_and_timed(self):
+        with self.assertLogs("Profile.instrumentation", "INFO") as logs:
+            response = self.client.get(f"/profile/{self.other.id}/")
+        self.assertRegex(response["Server-Timing"], r'db;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+')
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["view"], "view_profile")
+        self.assertEqual(record["status"], 200)
+        self.assertGreater(record["queries"], 0)
+        self.assertGreater(record["template_ms"], 0)
+        self.assertGreaterEqual(record["total_ms"], record["view_ms"])
+
+    def test_repeated_queries_share_a_fingerprint_and_record_their_origin(self):
+        self.assertEqual(
+            instrumentation.fingerprint("SELECT 1 FROM t WHERE id IN (%s, %s) AND name = 'x' LIMIT 21"),
+            "SELECT ? FROM t WHERE id IN (...) AND name = ? LIMIT ?",
+        )
+        metrics = instrumentation.RequestMetrics(capture_stacks=True)
+        with connection.execute_wrapper(metrics):
+            for user in (self.user, self.other, self.user):
+                list(Post.objects.filter(user=user))
+        [duplicate] = metrics.duplicates(3)
+        self.assertEqual(duplicate["count"], 3)
+        self.assertIn("Profile/tests.py", next(iter(duplicate["origins"])))
+        self.assertEqual(metrics.queries, 3)
+
+    def test_disabled_instrumentation_leaves_the_chain(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            instrumentation.InstrumentationMiddleware(lambda request: None)
+        self.assertNotIn("Server-Timing", self.client.get("/").headers)
+
+
+class FriendGraphTests(TestCase):
+    def setUp(self):
+        cache.get_cache().clear()
+        self.me, self.a, self.b, self.c, self.d = (make_user(name) for name in ("me", "a", "b", "c", "d"))
+        # me - a, me - b; a and b both know c, only a knows d.
+        for left, right in [(self.me, self.a), (self.me, self.b), (self.a, self.c), (self.b, self.c), (self.a, self.d)]:
+            left.add_friend(right)
+
+    def test_membership_and_mutual_counts_come_from_the_cache(self):
+        graph.friend_ids_many([u.id for u in (self.me, self.a, self.b, self.c, self.d)])
+        with self.assertNumQueries(0):
+            self.assertTrue(graph.is_friend(self.me.id, self.a.id))
+            self.assertFalse(graph.is_friend(self.me.id, self.c.id))
+            self.assertEqual(graph.mutual_counts(self.me.id, [self.c.id, self.d.id]), {self.c.id: 2, self.d.id: 1})
+            self.assertEqual(graph.suggestions(self.me.id), [(self.c.id, 2), (self.d.id, 1)])
+
+    def test_friendship_changes_and_deletes_invalidate_both_sides(self):
+        self.assertEqual(graph.suggestions(self.me.id, limit=1), [(self.c.id, 2)])
+        self.me.add_friend(self.c)
+        self.assertTrue(graph.is_friend(self.c.id, self.me.id))
+        self.assertEqual(graph.suggestions(self.me.id), [(self.d.id, 1)])
+        self.d.delete()
+        self.assertEqual(graph.suggestions(self.me.id), [])
+        self.assertEqual(list(graph.friend_ids(self.a.id)), sorted([self.me.id, self.c.id]))
+
+    def test_view_profile_shows_mutual_friends_and_suggestions(self):
+        session = self.client.session
+        session["user_id"] = self.me.id
+        session.save()
+        response = self.client.get(f"/profile/{self.c.id}/")
+        self.assertEqual(response.context["mutual_count"], 2)
+        self.assertContains(response, "2 mutual friends")
+        self.assertContains(response, "People you may know")
+        self.assertEqual([(u.id, u.mutual_count) for u in response.context["suggestions"]], [(self.c.id, 2), (self.d.id, 1)])
+
+
+class FriendRequestTests(TestCase):
+    def setUp(self):
+        cache.get_cache().clear()
+        self.me, self.a, self.b, self.c = (make_user(name) for name in ("me", "a", "b", "c"))
+
+    def login(self, user):
+        session = self.client.session
+        session["user_id"] = user.id
+        session.save()
+
+    def test_repeated_sends_write_and_notify_once(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(friend_requests.send(self.a, self.me), friend_requests.SENT)
+            self.assertEqual(friend_requests.send(self.a, self.me), friend_requests.ALREADY_SENT)
+            self.assertEqual(friend_requests.send(self.a, self.a), friend_requests.SELF)
+        self.assertEqual(FriendRequest.objects.count(), 1)
+        self.assertEqual(Notification.objects.filter(receiver=self.me).count(), 1)
+
+        self.login(self.a)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(f"/friend/{self.me.id}/")
+            self.client.get(f"/friend/{self.me.id}/")
+        self.assertEqual(FriendRequest.objects.count(), 1)
+        self.assertEqual(Notification.objects.get(receiver=self.me).actor_count, 1)
+
+    def test_every_outcome_is_explained(self):
+        self.me.add_friend(self.b)
+        self.login(self.me)
+        self.client.get(f"/friend/{self.b.id}/")
+        response = self.client.get(f"/friend/{self.me.id}/")
+        self.assertEqual(
+            [str(m) for m in get_messages(response.wsgi_request)],
+            ["You and @b are already friends.", "You cannot send yourself a friend request."],
+        )
+
+    def test_bulk_accept_and_decline(self):
+        for sender in (self.a, self.b, self.c):
+            friend_requests.send(sender, self.me)
+        a_request, b_request, c_request = (FriendRequest.objects.get(from_user=u) for u in (self.a, self.b, self.c))
+        self.login(self.me)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/friend-requests/accept/", {"request_id": [a_request.id, b_request.id, b_request.id]})
+            self.client.post("/friend-requests/accept/", {"request_id": [a_request.id]})
+            self.client.post("/friend-requests/decline/", {"request_id": [c_request.id]})
+
+        self.me.refresh_from_db()
+        self.assertEqual(self.me.friend_count, 2)
+        self.assertEqual(list(graph.friend_ids(self.me.id)), sorted([self.a.id, self.b.id]))
+        self.assertTrue(graph.is_friend(self.a.id, self.me.id))
+        self.assertEqual(FriendRequest.objects.get(id=c_request.id).status, FriendRequest.DECLINED)
+        self.assertEqual(Notification.objects.filter(receiver=self.a, verb="accepted your friend request").count(), 1)
+        self.assertEqual(friend_requests.send(self.a, self.me), friend_requests.ALREADY_FRIENDS)
+
+        # A declined request can be sent again; asking someone who asked you accepts theirs.
+        self.assertEqual(friend_requests.send(self.c, self.me), friend_requests.SENT)
+        self.assertEqual(friend_requests.send(self.me, self.c), friend_requests.ACCEPTED)
+        self.assertTrue(graph.is_friend(self.c.id, self.me.id))
+
+    def test_profile_offers_to_answer_a_pending_request(self):
+        friend_requests.send(self.a, self.me)
+        self.login(self.me)
+        self.assertContains(self.client.get(f"/profile/{self.a.id}/"), "Accept Request")
+        self.assertContains(self.client.get("/friend-requests/"), "@a")
+        self.login(self.a)
+        self.assertContains(self.client.get(f"/profile/{self.me.id}/"), "Request Sent")
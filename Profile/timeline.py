@@ -0,0 +1,135 @@
+"""
+Per-user home timelines.
+
+Posts are pushed into the timelines of the author and their friends when
+they are created (fan-out on write), so reading a timeline is one range
+scan over ``TimelineEntry``. Authors with more than ``TIMELINE_FANOUT_LIMIT``
+friends are not fanned out; their posts are pulled in at read time instead,
+which keeps the cost of a single post bounded. An author who drops back to
+the limit has their recent posts copied to their friends, since those posts
+are no longer pulled.
+"""
+from django.conf import settings
+
+from .feed import FEED_PAGE_SIZE, after_position, build_page, decode_cursor, feed_queryset
+from .models import Post, TimelineEntry, User
+
+TIMELINE_FANOUT_LIMIT = getattr(settings, "TIMELINE_FANOUT_LIMIT", 1000)
+TIMELINE_BACKFILL_SIZE = getattr(settings, "TIMELINE_BACKFILL_SIZE", 100)
+BATCH_SIZE = 1000
+
+
+def is_celebrity(user):
+    return user.friend_count > TIMELINE_FANOUT_LIMIT
+
+
+def _entries(owner_ids, post):
+    return [
+        TimelineEntry(owner_id=owner_id, post_id=post.id, author_id=post.user_id, created_at=post.created_at)
+        for owner_id in owner_ids
+    ]
+
+
+def _push_to_friends(author, posts):
+    def push(owner_ids):
+        entries = [entry for post in posts for entry in _entries(owner_ids, post)]
+        TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+
+    friend_ids = author.friends.values_list("id", flat=True).iterator(chunk_size=BATCH_SIZE)
+    batch = []
+    for friend_id in friend_ids:
+        batch.append(friend_id)
+        if len(batch) == BATCH_SIZE:
+            push(batch)
+            batch = []
+    if batch:
+        push(batch)
+
+
+def fan_out_post(post):
+    """Push a new post into its author's timeline and, unless the author is a celebrity, their friends'."""
+    author = post.user
+    TimelineEntry.objects.bulk_create(_entries([author.id], post), ignore_conflicts=True)
+    if not is_celebrity(author):
+        _push_to_friends(author, [post])
+
+
+def _recent_posts(author_id):
+    return list(
+        Post.objects.filter(user_id=author_id)
+        .order_by("-created_at", "-id")
+        .only("id", "user_id", "created_at")[:TIMELINE_BACKFILL_SIZE]
+    )
+
+
+def _copy_recent_posts(owner_id, author_id):
+    entries = [entry for post in _recent_posts(author_id) for entry in _entries([owner_id], post)]
+    TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+
+
+def backfill(owner, friend):
+    """Copy ``friend``'s most recent posts into ``owner``'s timeline."""
+    if not is_celebrity(friend):
+        _copy_recent_posts(owner.id, friend.id)
+
+
+def on_friend_added(user, other):
+    backfill(user, other)
+    backfill(other, user)
+
+
+def on_friend_removed(user, other):
+    TimelineEntry.objects.filter(owner=user, author=other).delete()
+    TimelineEntry.objects.filter(owner=other, author=user).delete()
+    resume_fan_out(user.id, other.id)
+
+
+def resume_fan_out(*user_ids):
+    """
+    Copy the recent posts of those of ``user_ids`` who have just dropped back
+    to ``TIMELINE_FANOUT_LIMIT`` friends into their friends' timelines.
+
+    Their posts from while they were over the limit were never fanned out,
+    and ``get_timeline_page`` stops pulling them in once they are not.
+    """
+    for author in User.objects.filter(id__in=user_ids, friend_count=TIMELINE_FANOUT_LIMIT):
+        _push_to_friends(author, _recent_posts(author.id))
+
+
+def rebuild_timeline(user):
+    """Drop and rebuild ``user``'s timeline from their own and their friends' recent posts."""
+    TimelineEntry.objects.filter(owner=user).delete()
+    _copy_recent_posts(user.id, user.id)
+    for friend in user.friends.only("id", "friend_count"):
+        backfill(user, friend)
+
+
+def get_timeline_page(viewer, cursor=None, page_size=FEED_PAGE_SIZE):
+    """
+    Return one keyset page of ``viewer``'s timeline as a ``FeedPage``.
+
+    Materialized entries are read with a single range scan on
+    ``(owner, created_at, post)``; posts from celebrity friends are merged
+    in from ``Post`` using the same cursor.
+    """
+    position = decode_cursor(cursor) if cursor else None
+
+    entries = TimelineEntry.objects.filter(owner=viewer)
+    if position:
+        entries = after_position(entries, position, id_field="post_id")
+    keys = list(entries.order_by("-created_at", "-post_id").values_list("created_at", "post_id")[:page_size + 1])
+
+    celebrity_ids = list(
+        viewer.friends.filter(friend_count__gt=TIMELINE_FANOUT_LIMIT).values_list("id", flat=True)
+    )
+    if celebrity_ids:
+        pulled = Post.objects.filter(user_id__in=celebrity_ids)
+        if position:
+            pulled = after_position(pulled, position)
+        keys.extend(pulled.order_by("-created_at", "-id").values_list("created_at", "id")[:page_size + 1])
+        keys = sorted(set(keys), reverse=True)[:page_size + 1]
+
+    if not keys:
+        return build_page(viewer, [], page_size)
+    posts = feed_queryset().filter(id__in=[post_id for _, post_id in keys])
+    return build_page(viewer, list(posts), page_size)
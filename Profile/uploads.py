@@ -0,0 +1,177 @@
+"""
+Streaming validation for file uploads.
+
+``StreamingUploadHandler`` replaces Django's default upload handlers. It
+streams each file part to a temporary file in ``FILE_UPLOAD_TEMP_DIR``
+(on the same filesystem as ``MEDIA_ROOT``, saving it into storage is a
+rename rather than a copy) and never holds a whole upload in memory. While the chunks arrive it
+
+* checks the leading bytes against the types allowed for the form field,
+* stops reading a file as soon as it passes the field's size limit, and
+* feeds every chunk to SHA-256, exposed as ``upload.content_hash``.
+
+Rules are looked up by form field name in ``settings.UPLOAD_RULES``; file
+fields without a rule are refused. A rejected file is dropped from
+``request.FILES`` and the reason is recorded for ``upload_errors(request)``.
+``UploadLimitMiddleware`` refuses a request whose ``Content-Length`` exceeds
+``UPLOAD_MAX_REQUEST_SIZE`` before any of the body is read.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from django.shortcuts import redirect
+from django.utils.http import url_has_allowed_host_and_scheme
+
+MB = 1024 * 1024
+
+# (name, offset, signature, content type)
+SIGNATURES = (
+    ("jpeg", 0, b"\xff\xd8\xff", "image/jpeg"),
+    ("png", 0, b"\x89PNG\r\n\x1a\n", "image/png"),
+    ("gif", 0, b"GIF87a", "image/gif"),
+    ("gif", 0, b"GIF89a", "image/gif"),
+    ("webp", 8, b"WEBP", "image/webp"),  # after "RIFF" and a 4-byte size
+    ("pdf", 0, b"%PDF-", "application/pdf"),
+    ("zip", 0, b"PK\x03\x04", "application/zip"),
+    ("mp4", 4, b"ftyp", "video/mp4"),
+    ("webm", 0, b"\x1a\x45\xdf\xa3", "video/webm"),
+)
+HEADER_SIZE = 16
+
+IMAGE_TYPES = ("jpeg", "png", "gif", "webp")
+DEFAULT_RULES = {
+    "image": {"max_size": 10 * MB, "types": IMAGE_TYPES},
+    "photo": {"max_size": 5 * MB, "types": IMAGE_TYPES},
+    "attachment": {"max_size": 25 * MB, "types": IMAGE_TYPES + ("pdf", "zip", "mp4", "webm")},
+}
+DEFAULT_MAX_REQUEST_SIZE = 30 * MB
+
+
+def upload_rules():
+    return getattr(settings, "UPLOAD_RULES", DEFAULT_RULES)
+
+
+def max_request_size():
+    return getattr(settings, "UPLOAD_MAX_REQUEST_SIZE", DEFAULT_MAX_REQUEST_SIZE)
+
+
+def sniff(header):
+    """Return ``(type name, content type)`` for the leading bytes of a file, or ``None``."""
+    for name, offset, signature, content_type in SIGNATURES:
+        if header[offset:offset + len(signature)] == signature:
+            if name == "webp" and not header.startswith(b"RIFF"):
+                continue
+            return name, content_type
+    return None
+
+
+def _size(limit):
+    return f"{limit / MB:g} MB"
+
+
+def upload_errors(request):
+    """Reasons any file in this request was rejected, one message per file."""
+    request.FILES  # make sure the body has been parsed
+    return list(getattr(request, "upload_errors", []))
+
+
+def reject_upload(request, to, *args, **kwargs):
+    """Flash the upload errors and ``redirect(to, ...)``; returns ``None`` if there were none."""
+    errors = upload_errors(request)
+    if not errors:
+        return None
+    for error in errors:
+        messages.error(request, error)
+    return redirect(to, *args, **kwargs)
+
+
+class StreamingUploadHandler(FileUploadHandler):
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        # The previous file now belongs to request.FILES; the parser closes ``self.file`` on SkipFile.
+        self.__dict__.pop("file", None)
+        self.rule = upload_rules().get(field_name)
+        self.header = b""
+        self.hash = hashlib.sha256()
+        if self.rule is None:
+            self.reject(f"{file_name}: file uploads are not accepted here.")
+        if content_length and content_length > self.rule["max_size"]:
+            self.reject(self.too_large())
+
+        self.file = TemporaryUploadedFile(file_name, content_type, 0, charset, content_type_extra)
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > self.rule["max_size"]:
+            self.reject(self.too_large())
+        if len(self.header) < HEADER_SIZE:
+            self.header += raw_data[:HEADER_SIZE - len(self.header)]
+            if len(self.header) == HEADER_SIZE and not self.check_type():
+                self.reject(self.wrong_type())
+        self.hash.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        # Files shorter than the header are only checked here, where raising SkipFile is not allowed.
+        if not file_size or (len(self.header) < HEADER_SIZE and not self.check_type()):
+            if file_size:
+                self.record(self.wrong_type())
+            self.discard()
+            return None
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.content_hash = self.hash.hexdigest()
+        return self.file
+
+    def upload_interrupted(self):
+        self.discard()
+
+    def check_type(self):
+        detected = sniff(self.header)
+        if detected is None or detected[0] not in self.rule["types"]:
+            return False
+        self.content_type = self.file.content_type = detected[1]
+        return True
+
+    def too_large(self):
+        return f"{self.file_name} is larger than {_size(self.rule['max_size'])}."
+
+    def wrong_type(self):
+        return f"{self.file_name} is not an allowed file type ({', '.join(sorted(set(self.rule['types'])))})."
+
+    def record(self, reason):
+        if not hasattr(self.request, "upload_errors"):
+            self.request.upload_errors = []
+        self.request.upload_errors.append(reason)
+
+    def reject(self, reason):
+        self.discard()
+        self.record(reason)
+        raise SkipFile(reason)
+
+    def discard(self):
+        if hasattr(self, "file"):
+            self.file.close()  # deletes the temporary file
+            del self.file
+
+
+class UploadLimitMiddleware:
+    """Refuse a multipart request that declares a body over ``UPLOAD_MAX_REQUEST_SIZE``, without reading it."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.content_type == "multipart/form-data":
+            try:
+                length = int(request.META.get("CONTENT_LENGTH") or 0)
+            except ValueError:
+                length = 0
+            if length > max_request_size():
+                messages.error(request, f"Uploads are limited to {_size(max_request_size())} per request.")
+                referer = request.META.get("HTTP_REFERER")
+                safe = referer and url_has_allowed_host_and_scheme(referer, {request.get_host()}, request.is_secure())
+                return redirect(referer if safe else "home")
+        return self.get_response(request)
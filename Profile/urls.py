@@ -21,8 +21,14 @@ urlpatterns = [
     path('profile/edit/', views.edit_profile, name='edit_profile'),
     path('friend/<int:user_id>/', views.friend, name='friend'),
     path('unfriend/<int:user_id>/', views.unfriend, name='unfriend'),
+    path('friend-requests/', views.friend_requests_page, name='friend_requests'),
+    path('friend-requests/accept/', views.respond_to_friend_requests, {'accept': True}, name='accept_friend_requests'),
+    path('friend-requests/decline/', views.respond_to_friend_requests, {'accept': False}, name='decline_friend_requests'),
     path('search/', views.search_user, name='search_user'),
+    path('search/posts/', views.search_posts, name='search_posts'),
     path('notifications/', views.notifications, name='notifications'),
+    path('notifications/read/', views.read_all_notifications, name='read_all_notifications'),
     path('messages/', views.messages_page, name='messages_page'),
     path('messages/send/<int:receiver_id>/', views.send_message, name='send_message'),
+    path('metrics/cache/', views.cache_metrics, name='cache_metrics'),
 ]
\ No newline at end of file
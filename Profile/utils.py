@@ -1,26 +1,18 @@
-from .models import Notification, User
+from .models import User
 from django.http import HttpRequest
+from .identity import get_session_user
+from .notifications import pipeline, unread_count
 
-def create_notification(sender: User, receiver: User, message: str, link: str = None):
+def create_notification(sender: User, receiver: User, verb: str, link: str = None):
+    """Queue a "<sender> <verb>" notification; see ``Profile.notifications`` for batching."""
     if not isinstance(sender, User) or not isinstance(receiver, User):
         raise ValueError("sender and receiver must be User instances")
-    Notification.objects.create(
-        sender=sender,
-        receiver=receiver,
-        message=message,
-        link=link
-    )
+    pipeline.enqueue(sender, receiver, verb, link)
 
 
 def notification_count(request: HttpRequest):
-    user_id = request.session.get("user_id")
-    if not user_id:
+    user = get_session_user(request)
+    if user is None:
         return {'notification_count': 0}
 
-    try:
-        user = User.objects.get(id=user_id)
-    except User.DoesNotExist:
-        return {'notification_count': 0}
-
-    unread = Notification.objects.filter(receiver=user, is_read=False).count()
-    return {'notification_count': unread}
\ No newline at end of file
+    return {'notification_count': unread_count(user.id)}
\ No newline at end of file
@@ -1,23 +1,48 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.utils.http import url_has_allowed_host_and_scheme
 from django.contrib import messages as django_messages
-from .models import User, Post, Comment, Notification, Message
-from django.core.paginator import Paginator
+from .models import User, Post, Comment, Message
 from .utils import create_notification
+from .notifications import mark_all_read, mark_read, notification_page
+from .identity import get_session_user
+from . import cache, friend_requests, graph, images
+from .fragments import render_cards
+from .inbox import conversation_list, message_history
+from .search import search_posts as find_posts, search_users
+from .routers import read_only
+from .uploads import reject_upload
+from .timeline import fan_out_post, get_timeline_page, on_friend_removed
 from django.contrib import messages
 
+FRIEND_REQUEST_MESSAGES = {
+    friend_requests.SENT: "Friend request sent to @{username}.",
+    friend_requests.ALREADY_SENT: "You have already sent @{username} a friend request.",
+    friend_requests.ACCEPTED: "You and @{username} are now friends.",
+    friend_requests.ALREADY_FRIENDS: "You and @{username} are already friends.",
+    friend_requests.SELF: "You cannot send yourself a friend request.",
+}
+
+
 def get_current_user(request):
     user_id = request.session.get("user_id")
     if not user_id:
         return None
-    return get_object_or_404(User, id=user_id)
+    user = get_session_user(request)
+    if user is None:
+        raise Http404("No User matches the given query.")
+    return user
 
 
+@read_only
 def home(request):
     user = get_current_user(request)
     if not user:
         return redirect("login")
-    posts = Post.objects.all().order_by("-created_at")
-    return render(request, "Home/index.html", {"user": user, "posts": posts})
+    page = get_timeline_page(user, cursor=request.GET.get("cursor"))
+    cards = render_cards(request, user, page.posts, "feed", page.liked_ids, page.saved_ids, eager=1)
+    return render(request, "Home/index.html", {"user": user, "cards": cards, "next_cursor": page.next_cursor})
 
 
 def login(request):
@@ -37,6 +62,9 @@ def login(request):
 
 def register(request):
     if request.method == "POST":
+        rejected = reject_upload(request, "register")
+        if rejected:
+            return rejected
         username = request.POST.get("username")
         name = request.POST.get("name")
         photo = request.FILES.get("photo")
@@ -51,6 +79,7 @@ def register(request):
             return redirect("register")
 
         user = User.objects.create(username=username, name=name, photo=photo, email=email, password=password)
+        images.schedule_user_photo(user)
         django_messages.success(request, "Account created successfully.")
         return redirect("login")
     return render(request, "Home/register.html")
@@ -62,24 +91,36 @@ def logout(request):
     return redirect("login")
 
 
+@read_only
 def search_user(request):
     query = request.GET.get('q', '')
-    user_list = User.objects.filter(username__icontains=query).order_by('username') if query else User.objects.none()
-    paginator = Paginator(user_list, 5)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = search_users(query, request.GET.get('page'))
     return render(request, 'Profile/search_user.html', {'query': query, 'page_obj': page_obj})
         
 
+def search_posts(request):
+    user = get_current_user(request)
+    if not user:
+        return redirect("login")
+    query = request.GET.get("q", "")
+    posts, older_cursor = find_posts(query, before=request.GET.get("before"))
+    return render(request, "Post/search_posts.html", {"user": user, "query": query, "posts": posts, "older_cursor": older_cursor})
+
+
 def create_post(request):
     user = get_current_user(request)
     if not user:
         return redirect("login")
 
     if request.method == "POST":
+        rejected = reject_upload(request, "create_post")
+        if rejected:
+            return rejected
         image = request.FILES.get("image")
         description = request.POST.get("description")
-        Post.objects.create(user=user, image=image, description=description)
+        post = Post.objects.create(user=user, image=image, description=description)
+        fan_out_post(post)
+        images.schedule_post_image(post)
         django_messages.success(request, "Post created successfully.")
         return redirect("home")
     return render(request, "Post/create_post.html")
@@ -100,11 +141,10 @@ def save_post(request, post_id):
 
 
 def saved_posts(request):
-    user_id = request.session.get("user_id")
-    if not user_id:
+    user = get_current_user(request)
+    if not user:
         return redirect("login")
 
-    user = get_object_or_404(User, id=user_id)
     posts = user.saved_posts.all().order_by("-created_at")  # latest first
 
     return render(request, "Post/saved_posts.html", {
@@ -117,15 +157,17 @@ def view_post(request, post_id):
     user = get_current_user(request)
     if not user:
         return redirect("login")
-    post = get_object_or_404(Post, id=post_id)
-    comments = post.get_comments().order_by("created_at")
+    post = cache.get_post_card(post_id)
+    if post is None:
+        raise Http404("No Post matches the given query.")
+    comments = post.get_comments().select_related("user").order_by("created_at")
 
     if request.method == "POST":
         text = request.POST.get("comment")
         if text:
             post.add_comment(user, text)
             if post.user != user:
-                create_notification(sender=user, receiver=post.user, message=f"{user.username} commented on your post", link=f"/post/{post.id}/")
+                create_notification(sender=user, receiver=post.user, verb="commented on your post", link=f"/post/{post.id}/")
             return redirect("view_post", post_id=post_id)
 
     return render(request, "Post/view_post.html", {"user": user, "post": post, "comments": comments})
@@ -141,11 +183,21 @@ def edit_post(request, post_id):
         return redirect("home")
 
     if request.method == "POST":
+        rejected = reject_upload(request, "edit_post", post_id=post.id)
+        if rejected:
+            return rejected
         description = request.POST.get("description")
-        if "image" in request.FILES:
-            post.image = request.FILES["image"]
+        new_image = "image" in request.FILES
+        if new_image:
+            images.replace_post_image(post, request.FILES["image"])
         post.description = description
-        post.save()
+        # Only the edited fields: like/comment counts may have moved since the post was loaded.
+        fields = ["description"]
+        if new_image:
+            fields += ["image", "image_variants", "image_width", "image_height"]
+        post.save(update_fields=fields)
+        if new_image:
+            images.schedule_post_image(post)
         django_messages.success(request, "Post updated successfully.")
         return redirect("home")
     return render(request, "Post/edit_post.html", {"post": post, "user": user})
@@ -176,7 +228,7 @@ def like_post(request, post_id):
         post.add_like(user)
         
         if post.user != user:
-            create_notification(sender=user, receiver=post.user, message=f"{user.username} liked your post", link=f"/post/{post.id}/")
+            create_notification(sender=user, receiver=post.user, verb="liked your post", link=f"/post/{post.id}/")
     return redirect("home")
 
 
@@ -189,7 +241,7 @@ def add_comment(request, post_id):
     if text:
         post.add_comment(user, text)
         if post.user != user:
-            create_notification(sender=user, receiver=post.user, message=f"{user.username} commented on your post", link=f"/post/{post.id}/")
+            create_notification(sender=user, receiver=post.user, verb="commented on your post", link=f"/post/{post.id}/")
     return redirect("view_post", post_id=post_id)
 
 
@@ -207,9 +259,13 @@ def profile(request):
     user = get_current_user(request)
     if not user:
         return redirect("login")
-    posts = Post.objects.filter(user=user).order_by("-created_at")
+    posts = list(Post.objects.filter(user=user).select_related("user").order_by("-created_at"))
+    liked_ids = set(
+        Post.likes.through.objects.filter(user_id=user.id, post_id__in=[p.id for p in posts]).values_list("post_id", flat=True)
+    )
+    cards = render_cards(request, user, posts, "own-grid", liked_ids=liked_ids, eager=3)
     saved_posts = user.saved_posts.all()
-    return render(request, "Profile/profile.html", {"user": user, "posts": posts, "saved_posts": saved_posts})
+    return render(request, "Profile/profile.html", {"user": user, "cards": cards, "saved_posts": saved_posts})
 
 
 def edit_profile(request):
@@ -218,6 +274,9 @@ def edit_profile(request):
         return redirect('login')
 
     if request.method == 'POST':
+        rejected = reject_upload(request, 'edit_profile')
+        if rejected:
+            return rejected
         username = request.POST.get('username')
         name = request.POST.get('name')
         email = request.POST.get('email')
@@ -236,8 +295,10 @@ def edit_profile(request):
         user.email = email
         user.bio = bio
         if photo:
-            user.photo = photo
+            images.replace_user_photo(user, photo)
         user.save()
+        if photo:
+            images.schedule_user_photo(user)
 
         messages.success(request, 'Profile updated successfully.')
         return redirect('profile')
@@ -245,12 +306,29 @@ def edit_profile(request):
     return render(request, 'Profile/edit_profile.html', {'user': user})
         
         
+@read_only
 def view_profile(request, user_id):
     current_user = get_current_user(request)
     profile_user = get_object_or_404(User, id=user_id)
-    posts = Post.objects.filter(user=profile_user).order_by("-created_at")
-    is_friend = current_user.is_friend(profile_user) if current_user else False
-    return render(request, "Profile/view_profile.html", {"user": current_user, "profile_user": profile_user, "posts": posts, "is_friend": is_friend})
+    posts = list(Post.objects.filter(user=profile_user).select_related("user").order_by("-created_at"))
+    cards = render_cards(request, current_user, posts, "grid", eager=3)
+    stats = cache.get_profile_stats(profile_user.id)
+    is_friend = False
+    mutual_count = 0
+    pending_request = None
+    suggestions = []
+    if current_user:
+        if current_user.id != profile_user.id:
+            is_friend = graph.is_friend(current_user.id, profile_user.id)
+            mutual_count = graph.mutual_count(current_user.id, profile_user.id)
+            if not is_friend:
+                pending_request = friend_requests.pending_between(current_user, profile_user)
+        suggestions = graph.suggested_users(current_user.id)
+    return render(request, "Profile/view_profile.html", {
+        "user": current_user, "profile_user": profile_user, "cards": cards, "stats": stats,
+        "is_friend": is_friend, "mutual_count": mutual_count, "pending_request": pending_request,
+        "suggestions": suggestions,
+    })
 
 
 def friend(request, user_id):
@@ -259,30 +337,65 @@ def friend(request, user_id):
         return redirect("login")
         
     profile_user = get_object_or_404(User, id=user_id)
-    user.friends.add(profile_user)
-    create_notification(sender=user, receiver=profile_user, message=f"{user.username} added you as a friend", link=f"/profile/{user.id}/friends/")
+    outcome = friend_requests.send(user, profile_user)
+    messages.info(request, FRIEND_REQUEST_MESSAGES[outcome].format(username=profile_user.username))
     return redirect("view_profile", user_id=profile_user.id)
 
 
+def friend_requests_page(request):
+    user = get_current_user(request)
+    if not user:
+        return redirect("login")
+    incoming = list(friend_requests.incoming(user))
+    mutual = graph.mutual_counts(user.id, [r.from_user_id for r in incoming])
+    for r in incoming:
+        r.mutual_count = mutual[r.from_user_id]
+    return render(request, "Profile/friend_requests.html", {
+        "user": user, "incoming": incoming, "outgoing": friend_requests.outgoing(user),
+    })
+
+
+def respond_to_friend_requests(request, accept):
+    """Accept or decline every ``request_id`` posted; ``all`` answers every pending request."""
+    user = get_current_user(request)
+    if not user:
+        return redirect("login")
+    if request.method != "POST":
+        return redirect("friend_requests")
+    if request.POST.get("all"):
+        request_ids = list(friend_requests.incoming(user).values_list("id", flat=True))
+    else:
+        request_ids = [int(value) for value in request.POST.getlist("request_id") if value.isdigit()]
+    answered = friend_requests.respond(user, request_ids, accept=accept)
+    if answered:
+        verb = "Accepted" if accept else "Declined"
+        messages.success(request, f"{verb} {len(answered)} friend request{'s' if len(answered) != 1 else ''}.")
+    next_url = request.POST.get("next")
+    if next_url and url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        return redirect(next_url)
+    return redirect("friend_requests")
+
+
 def unfriend(request, user_id):
     user = get_current_user(request)
     if not user:
         return redirect("login")
         
     other_user = get_object_or_404(User, id=user_id)
-    user.remove_friend(other_user)
+    if user.remove_friend(other_user):
+        on_friend_removed(user, other_user)
     return redirect("view_profile", user_id=user_id)
 
 
+@read_only
 def view_friends(request, user_id):
     profile_user = get_object_or_404(User, id=user_id)
     friends = profile_user.friends.all()
-    current_user = None
+    current_user = get_current_user(request)
     friend_ids = []
 
-    if 'user_id' in request.session:
-        current_user = get_object_or_404(User, id=request.session['user_id'])
-        friend_ids = [f.id for f in current_user.friends.all()]
+    if current_user:
+        friend_ids = set(graph.friend_ids(current_user.id))
 
     context = {
         "profile_user": profile_user,
@@ -295,40 +408,46 @@ def view_friends(request, user_id):
 
 def notifications(request):
     user = get_current_user(request)
-    notes = Notification.objects.filter(receiver=user).order_by("-created_at") if user else []
-    return render(request, "Profile/notifications.html", {"notifications": notes})
+    if not user:
+        return render(request, "Profile/notifications.html", {"notifications": []})
+    notes, older_cursor = notification_page(user, before=request.GET.get("before"))
+    # Shown as unread this time, read from now on.
+    mark_read(user, [n.id for n in notes if not n.is_read])
+    return render(request, "Profile/notifications.html", {"notifications": notes, "older_cursor": older_cursor})
 
 
-def messages_page(request):
+def read_all_notifications(request):
     user = get_current_user(request)
     if not user:
         return redirect("login")
+    if request.method == "POST":
+        mark_all_read(user)
+    return redirect("notifications")
 
-    # FRIEND LIST
-    friends = user.friends.all()
+
+def messages_page(request):
+    user = get_current_user(request)
+    if not user:
+        return redirect("login")
 
     # SEARCH FRIENDS
     query = request.GET.get("q", "")
-    if query:
-        friends = friends.filter(username__icontains=query)
 
     # CURRENT CHAT USER
     chat_with_id = request.GET.get("chat")
     chat_with = None
     messages_list = []
+    older_cursor = None
 
     if chat_with_id:
         chat_with = get_object_or_404(User, id=chat_with_id)
 
         # Make sure chat target is actually a friend
-        if chat_with not in friends:
+        if not graph.is_friend(user.id, chat_with.id):
             chat_with = None  
         else:
-            # Load chat messages
-            messages_list = Message.objects.filter(
-                sender__in=[user, chat_with],
-                receiver__in=[user, chat_with]
-            ).order_by("created_at")
+            # Load the latest page of chat messages, or an older page
+            messages_list, older_cursor = message_history(user, chat_with, before=request.GET.get("before"))
 
             # Mark messages as read
             Message.objects.filter(
@@ -337,21 +456,15 @@ def messages_page(request):
                 is_read=False
             ).update(is_read=True)
 
-    # UNREAD COUNTS
-    friends_unread = []
-    for friend in friends:
-        unread = Message.objects.filter(
-            sender=friend,
-            receiver=user,
-            is_read=False
-        ).count()
-        friends_unread.append((friend, unread))
+    # FRIENDS WITH UNREAD COUNTS AND LAST MESSAGE, MOST RECENT FIRST
+    conversations = conversation_list(user, query)
 
     return render(request, "Profile/messages.html", {
         "user": user,
-        "friends_unread": friends_unread,
+        "conversations": conversations,
         "chat_with": chat_with,
         "messages_list": messages_list,
+        "older_cursor": older_cursor,
         "query": query,
     })
 
@@ -364,6 +477,9 @@ def send_message(request, receiver_id):
     receiver = get_object_or_404(User, id=receiver_id)
 
     if request.method == "POST":
+        rejected = reject_upload(request, f"/messages/?chat={receiver.id}")
+        if rejected:
+            return rejected
         text = request.POST.get("text", "").strip()
         attachment = request.FILES.get("attachment")
 
@@ -379,17 +495,24 @@ def send_message(request, receiver_id):
             attachment=attachment
         )
 
-        # Create notification safely
-        try:
-            create_notification(
-                sender=user,
-                receiver=receiver,
-                message=f"{user.username} sent you a message",
-                link=f"/messages/?chat={receiver.id}"
-            )
-        except Exception as e:
-            print("Notification Error:", e)
+        create_notification(
+            sender=user,
+            receiver=receiver,
+            verb="sent you a message",
+            link=f"/messages/?chat={user.id}"
+        )
 
         return redirect(f"/messages/?chat={receiver.id}")
 
-    return redirect(f"/messages/?chat={receiver.id}")
\ No newline at end of file
+    return redirect(f"/messages/?chat={receiver.id}")
+
+
+def cache_metrics(request):
+    if not settings.DEBUG and request.META.get("REMOTE_ADDR") not in settings.INTERNAL_IPS:
+        raise Http404()
+    lines = []
+    for event in ("hits", "misses", "invalidations"):
+        lines.append(f"# TYPE socialhub_cache_{event}_total counter")
+        for namespace, counts in sorted(cache.metrics().items()):
+            lines.append(f'socialhub_cache_{event}_total{{namespace="{namespace}"}} {counts[event]}')
+    return HttpResponse("\n".join(lines) + "\n", content_type="text/plain; version=0.0.4")
\ No newline at end of file
@@ -0,0 +1,96 @@
+"""
+ASGI WebSocket endpoint at ``/ws/`` that streams realtime events to the logged-in user.
+
+The connection is authenticated with the normal session cookie, and only
+accepted from pages served by one of ``ALLOWED_HOSTS`` (the ``Origin``
+header is checked, since browsers send cookies with cross-site WebSocket
+handshakes too). Each frame
+sent to the browser is a JSON object with a ``type`` of ``"message"`` or
+``"notifications"``; the client never needs to send anything.
+"""
+import asyncio
+import json
+from http.cookies import SimpleCookie
+from importlib import import_module
+from urllib.parse import urlsplit
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http.request import split_domain_port, validate_host
+
+from .realtime import get_broker, user_channel
+
+WEBSOCKET_PATH = "/ws/"
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_FORBIDDEN = 4403
+
+
+def _header(scope, name):
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _origin_allowed(scope):
+    """Whether the handshake came from a page on one of ``ALLOWED_HOSTS``, as ``HttpRequest.get_host`` checks."""
+    origin = _header(scope, b"origin")
+    if not origin:
+        return False
+    domain, _ = split_domain_port(urlsplit(origin).netloc)
+    allowed_hosts = settings.ALLOWED_HOSTS
+    if settings.DEBUG and not allowed_hosts:
+        allowed_hosts = [".localhost", "127.0.0.1", "[::1]"]
+    return bool(domain) and validate_host(domain, allowed_hosts)
+
+
+def _session_user_id(scope):
+    cookies = SimpleCookie()
+    for name, value in scope.get("headers", []):
+        if name == b"cookie":
+            cookies.load(value.decode("latin-1"))
+    morsel = cookies.get(settings.SESSION_COOKIE_NAME)
+    if morsel is None:
+        return None
+    store = import_module(settings.SESSION_ENGINE).SessionStore(morsel.value)
+    return store.get("user_id")
+
+
+async def _forward(subscription, send):
+    async for payload in subscription:
+        await send({"type": "websocket.send", "text": json.dumps(payload)})
+
+
+async def websocket_application(scope, receive, send):
+    if (await receive())["type"] != "websocket.connect":
+        return
+
+    if not _origin_allowed(scope):
+        await send({"type": "websocket.close", "code": CLOSE_FORBIDDEN})
+        return
+    user_id = await sync_to_async(_session_user_id)(scope)
+    if not user_id:
+        await send({"type": "websocket.close", "code": CLOSE_UNAUTHORIZED})
+        return
+
+    await send({"type": "websocket.accept"})
+    subscription = get_broker().subscribe(user_channel(user_id))
+    forwarder = asyncio.ensure_future(_forward(subscription, send))
+    try:
+        while (await receive())["type"] != "websocket.disconnect":
+            pass
+    finally:
+        subscription.close()
+        forwarder.cancel()
+
+
+def with_websockets(http_application):
+    """Route ``/ws/`` WebSocket connections to the realtime endpoint and everything else to Django."""
+    async def application(scope, receive, send):
+        if scope["type"] == "websocket":
+            if scope["path"] == WEBSOCKET_PATH:
+                return await websocket_application(scope, receive, send)
+            await receive()
+            return await send({"type": "websocket.close"})
+        return await http_application(scope, receive, send)
+    return application
@@ -13,4 +13,8 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'SocialHub.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from Profile.websocket import with_websockets  # noqa: E402  (needs the app registry loaded above)
+
+application = with_websockets(django_application)
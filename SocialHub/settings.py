@@ -1,10 +1,8 @@
+import os
 from pathlib import Path
-from django.core.files import locks
+from dotenv import load_dotenv
 from django.contrib.messages import constants as messages
 
-locks.lock = lambda *args, **kwargs: None
-locks.unlock = lambda *args, **kwargs: None
-
 MESSAGE_TAGS = {
     messages.DEBUG: 'secondary',
     messages.INFO: 'info',
@@ -16,11 +14,19 @@ MESSAGE_TAGS = {
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
-SECRET_KEY = 'django-insecure-tnhc1h08#8=s1_jxh!&0&bwzr+6_zhmgb96t7!3$m7f_^lhv+v'
+# Deployment settings come from the environment; a .env file next to
+# manage.py fills in whatever is not already set. See .env.example.
+load_dotenv(BASE_DIR / '.env')
+
+SECRET_KEY = os.environ.get(
+    'DJANGO_SECRET_KEY', 'django-insecure-tnhc1h08#8=s1_jxh!&0&bwzr+6_zhmgb96t7!3$m7f_^lhv+v'
+)
+
+DEBUG = os.environ.get('DJANGO_DEBUG', 'true').lower() in ('1', 'true', 'yes')
 
-DEBUG = True
+ALLOWED_HOSTS = [host for host in os.environ.get('DJANGO_ALLOWED_HOSTS', '').split(',') if host]
 
-ALLOWED_HOSTS = []
+INTERNAL_IPS = ['127.0.0.1']
 
 
 INSTALLED_APPS = [
@@ -36,16 +42,82 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'Profile.instrumentation.InstrumentationMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'Profile.middleware.CurrentUserMiddleware',
+    'Profile.routers.ReplicaRoutingMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'Profile.uploads.UploadLimitMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'SocialHub.urls'
 
+# Any Django cache backend can be dropped in here (Redis, Memcached, ...).
+# The default is an in-process LRU: with CULL_FREQUENCY equal to
+# MAX_ENTRIES, LocMemCache evicts exactly one least-recently-used entry
+# whenever it is full.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'socialhub',
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+            'CULL_FREQUENCY': 20000,
+        },
+    },
+}
+
+PROFILE_CACHE_ALIAS = 'default'
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# Notifications are queued and written in coalesced batches; SYNC flushes
+# on every event (Profile.tests turns it on so assertions see the rows).
+# The cached unread badge count expires after UNREAD_TIMEOUT seconds, which
+# bounds how stale it gets in other processes while the cache is LocMem.
+NOTIFICATION_PIPELINE = {
+    'SYNC': False,
+    'BATCH_SIZE': 100,
+    'FLUSH_INTERVAL': 2.0,
+    'UNREAD_TIMEOUT': 30,
+}
+
+# Read notifications older than this are removed by `manage.py prune_notifications`.
+NOTIFICATION_RETENTION_DAYS = 30
+
+# Thumbnails and WebP/JPEG variants of uploads are built by this many
+# background threads after the upload commits; SYNC builds them inline.
+IMAGE_PIPELINE = {
+    'SYNC': False,
+    'WORKERS': 2,
+}
+
+# Profile.instrumentation times each request's queries, templates and view,
+# logs it as JSON and adds a Server-Timing header. Disabled, it removes
+# itself from the middleware chain. A SLOW_SAMPLE_RATE share of requests
+# also logs where repeated queries come from when slow or repetitive.
+REQUEST_INSTRUMENTATION = {
+    'ENABLED': os.environ.get('DJANGO_INSTRUMENTATION', 'false').lower() in ('1', 'true', 'yes'),
+    'SERVER_TIMING': True,
+    'SLOW_REQUEST_MS': 500,
+    'SLOW_SAMPLE_RATE': 0.1,
+    'DUPLICATE_THRESHOLD': 3,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {'json': {'format': '%(message)s'}},
+    'handlers': {'instrumentation': {'class': 'logging.StreamHandler', 'formatter': 'json'}},
+    'loggers': {
+        'Profile.instrumentation': {'handlers': ['instrumentation'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -56,6 +128,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'Profile.utils.notification_count',
             ],
         },
     },
@@ -64,13 +137,46 @@ TEMPLATES = [
 WSGI_APPLICATION = 'SocialHub.wsgi.application'
 
 
+# Profile.sqlite is the stock backend plus WAL, busy_timeout and other
+# pragmas, and BEGIN IMMEDIATE transactions, so concurrent writers wait for
+# the lock instead of failing. Connections are kept for CONN_MAX_AGE seconds.
+# Any other backend can be selected with DATABASE_ENGINE.
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'ENGINE': os.environ.get('DATABASE_ENGINE') or 'Profile.sqlite',
+        'NAME': os.environ.get('DATABASE_NAME') or BASE_DIR / 'db.sqlite3',
+        'USER': os.environ.get('DATABASE_USER', ''),
+        'PASSWORD': os.environ.get('DATABASE_PASSWORD', ''),
+        'HOST': os.environ.get('DATABASE_HOST', ''),
+        'PORT': os.environ.get('DATABASE_PORT', ''),
+        'CONN_MAX_AGE': int(os.environ.get('DATABASE_CONN_MAX_AGE') or 600),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# DATABASE_REPLICAS is a comma-separated list of read replicas that share
+# the primary's settings: file paths for SQLite, host[:port] otherwise.
+# Profile.routers sends the reads of read-only views to them, and keeps a
+# session on the primary for REPLICA_STICKY_SECONDS after it writes.
+# Locally, two SQLite files and `manage.py sync_sqlite_replica` stand in
+# for a primary and its replica.
+READ_REPLICAS = []
+for number, replica in enumerate(filter(None, os.environ.get('DATABASE_REPLICAS', '').split(',')), 1):
+    replica_settings = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+    if 'sqlite' in replica_settings['ENGINE']:
+        replica_settings['NAME'] = replica.strip()
+    else:
+        host, _, port = replica.strip().partition(':')
+        replica_settings.update(HOST=host, PORT=port or replica_settings['PORT'])
+    DATABASES[f'replica{number}'] = replica_settings
+    READ_REPLICAS.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['Profile.routers.ReplicaRouter']
+REPLICA_STICKY_SECONDS = int(os.environ.get('DATABASE_REPLICA_STICKY_SECONDS') or 5)
+
+# Overrides for Profile.sqlite.DEFAULT_PRAGMAS.
+SQLITE_PRAGMAS = {}
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -99,9 +205,35 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
+STATIC_ROOT = BASE_DIR / 'staticfiles'
 
 MEDIA_URL = 'media/'
-MEDIA_ROOT = BASE_DIR / 'media'
+MEDIA_ROOT = Path(os.environ.get('DJANGO_MEDIA_ROOT') or BASE_DIR / 'media')
+
+# Media is stored by content hash, so identical uploads share one file.
+STORAGES = {
+    'default': {'BACKEND': 'Profile.storage.ContentAddressedStorage'},
+    # Outside DEBUG, collectstatic writes hashed names plus .gz/.br copies.
+    'staticfiles': {'BACKEND': (
+        'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+        else 'Profile.staticfiles.CompressedManifestStaticFilesStorage'
+    )},
+}
+
+# Profile.serving answers media (and, with SERVE_STATIC, collected static)
+# requests with ETags and long-lived Cache-Control. Set SENDFILE_BACKEND to
+# 'nginx' (X-Accel-Redirect to SENDFILE_URL + 'media/...' or 'static/...')
+# or 'apache' (X-Sendfile) to let the front-end server send the bytes.
+SERVE_MEDIA = True
+SERVE_STATIC = os.environ.get('DJANGO_SERVE_STATIC', 'false').lower() in ('1', 'true', 'yes')
+SENDFILE_BACKEND = os.environ.get('SENDFILE_BACKEND') or None
+SENDFILE_URL = '/internal/'
+
+# Uploads stream to disk through Profile.uploads, which checks each file's
+# type and size per form field while reading. Point FILE_UPLOAD_TEMP_DIR at
+# the same filesystem as MEDIA_ROOT so saving an upload is a rename.
+FILE_UPLOAD_HANDLERS = ['Profile.uploads.StreamingUploadHandler']
+UPLOAD_MAX_REQUEST_SIZE = 30 * 1024 * 1024
 
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
\ No newline at end of file
@@ -1,12 +1,15 @@
 from django.contrib import admin
-from django.urls import path,  include
+from django.urls import path,  include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
+
+from Profile import serving
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('Profile.urls')),
 ]
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+if settings.SERVE_MEDIA:
+    urlpatterns += [re_path(rf"^{settings.MEDIA_URL.strip('/')}/(?P<path>.+)$", serving.serve_media)]
+if settings.SERVE_STATIC:
+    urlpatterns += [re_path(rf"^{settings.STATIC_URL.strip('/')}/(?P<path>.+)$", serving.serve_static)]
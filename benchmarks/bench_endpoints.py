@@ -0,0 +1,453 @@
+#!/usr/bin/env python3
+"""
+Benchmark the main SocialHub endpoints and fail on regressions.
+
+For each ``--size`` a deterministic dataset is generated once with
+``dummy_data.py`` (cached under ``--data-dir`` per size and seed) and copied
+to a scratch database for every run, so runs start from identical data.
+Each endpoint is then measured three ways:
+
+* profile: ``--profile-requests`` requests through the Django test client
+  with every query captured, giving queries per request, rows scanned per
+  request (rows of the tables SQLite reads in full, per EXPLAIN QUERY
+  PLAN) and SQLite VM steps per request;
+* latency: ``--rounds`` rounds of ``--requests`` sequential test-client
+  requests, reported as p50/p95/p99 (each the best of the rounds);
+* load: ``--threads`` concurrent HTTP clients against the WSGI application
+  served in this process for ``--seconds``, reported as requests/s and
+  p50/p95/p99.
+
+Results are compared with ``benchmarks/baselines/<size>.json``. A
+rows-scanned or VM-steps figure more than ``--threshold`` above the
+baseline, any rise in queries per request, or any failed request fails the
+run (exit status 1). These figures depend only on the code and the data,
+so a baseline recorded on one machine holds on another. Latency and
+throughput depend on the machine; they are printed (and written by
+``--output``) but neither gated nor saved. ``--save-baseline`` records a
+new baseline.
+
+Run:
+    python benchmarks/bench_endpoints.py [--size small] [--size medium] [--save-baseline]
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import re
+import socketserver
+import sqlite3
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlencode
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "SocialHub.settings")
+
+SIZES = {"small": 1_000, "medium": 10_000, "large": 100_000}
+BASELINE_DIR = os.path.join(ROOT, "benchmarks", "baselines")
+ENDPOINTS = (
+    "home", "view_post", "view_profile", "view_friends", "messages_page", "search_user", "like_post", "send_message",
+)
+VIEWERS = 50
+PROGRESS_STEP = 100  # SQLite calls the progress handler every this many VM instructions
+
+# Figures where higher is worse, compared against the baseline with --threshold.
+RELATIVE = ("rows_scanned", "vm_steps")
+GATED = ("queries", *RELATIVE)  # the only figures saved in a baseline
+QUERY_SLACK = 0.5  # per request; a cache hit or miss may shift the mean slightly
+
+
+# --- dataset ---
+
+def dataset(args, size):
+    """Return ``(database path, media root)`` of the pristine dataset, generating it if needed."""
+    directory = os.path.join(args.data_dir, f"{size}-seed{args.seed}")
+    database = os.path.join(directory, "db.sqlite3")
+    media = os.path.join(directory, "media")
+    if os.path.exists(database) and not args.reseed:
+        return database, media
+
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        if name.startswith("db.sqlite3"):
+            os.remove(os.path.join(directory, name))
+    env = {
+        **os.environ, "DATABASE_NAME": database, "DATABASE_REPLICAS": "", "DJANGO_MEDIA_ROOT": media,
+        "DATABASE_ENGINE": "Profile.sqlite",
+    }
+    print(f"Generating the {size} dataset ({SIZES[size]:,} users) in {directory}...")
+    subprocess.run([sys.executable, os.path.join(ROOT, "manage.py"), "migrate", "-v0"], env=env, cwd=directory, check=True)
+    subprocess.run([
+        sys.executable, os.path.join(ROOT, "dummy_data.py"), "--users", str(SIZES[size]), "--seed", str(args.seed),
+        "--post-images", "8", "--avatars", "4",
+    ], env=env, cwd=directory, check=True)
+    return database, media
+
+
+def working_copy(database):
+    """Copy the pristine database next to it and return the copy's path."""
+    copy = database.replace("db.sqlite3", "run.sqlite3")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(copy + suffix):
+            os.remove(copy + suffix)
+    source, target = sqlite3.connect(database), sqlite3.connect(copy)
+    with target:
+        source.backup(target)
+    source.close()
+    target.close()
+    return copy
+
+
+def setup_django(database, media):
+    os.environ.update(DATABASE_NAME=database, DATABASE_ENGINE="Profile.sqlite", DATABASE_REPLICAS="", DJANGO_MEDIA_ROOT=media)
+    os.environ["DJANGO_DEBUG"] = "false"
+    import django
+    from django.conf import settings
+
+    # No collectstatic here; templates only need static URLs.
+    settings.STORAGES["staticfiles"] = {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"}
+    settings.ALLOWED_HOSTS = ["testserver", "127.0.0.1"]
+    django.setup()
+
+
+# --- workload ---
+
+class Workload:
+    """Seeded request targets: viewers with a conversation partner (always a friend), posts and search terms."""
+
+    def __init__(self, seed):
+        from django.contrib.sessions.backends.db import SessionStore
+        from django.utils.crypto import get_random_string
+        from Profile.models import Conversation, Post, User
+
+        rng = random.Random(seed)
+        pairs = list(Conversation.objects.order_by("id").values_list("low_user_id", "high_user_id"))
+        self.pairs = rng.sample(pairs, min(VIEWERS, len(pairs)))
+        post_ids = list(Post.objects.order_by("id").values_list("id", flat=True))
+        self.post_ids = rng.sample(post_ids, min(500, len(post_ids)))
+        usernames = User.objects.filter(id__in=[high for _, high in self.pairs]).values_list("username", flat=True)
+        self.queries = sorted({username[:4].lower() for username in usernames})
+        self.csrf = get_random_string(32)
+        self.sessions = {}
+        for viewer, _ in self.pairs:
+            session = SessionStore()
+            session["user_id"] = viewer
+            session.create()
+            self.sessions[viewer] = session.session_key
+
+    def request(self, endpoint, i):
+        """Return ``(viewer id, method, path, form data, expected status)`` for the ``i``-th request."""
+        viewer, partner = self.pairs[i % len(self.pairs)]
+        post_id = self.post_ids[i % len(self.post_ids)]
+        if endpoint == "home":
+            return viewer, "GET", "/", None, 200
+        if endpoint == "view_post":
+            return viewer, "GET", f"/post/{post_id}/", None, 200
+        if endpoint == "view_profile":
+            return viewer, "GET", f"/profile/{partner}/", None, 200
+        if endpoint == "view_friends":
+            return viewer, "GET", f"/profile/{partner}/friends/", None, 200
+        if endpoint == "messages_page":
+            return viewer, "GET", f"/messages/?chat={partner}", None, 200
+        if endpoint == "search_user":
+            return viewer, "GET", "/search/?" + urlencode({"q": self.queries[i % len(self.queries)]}), None, 200
+        if endpoint == "like_post":
+            return viewer, "GET", f"/post/{post_id}/like/", None, 302
+        if endpoint == "send_message":
+            return viewer, "POST", f"/messages/send/{partner}/", {"text": f"benchmark message {i}"}, 302
+        raise ValueError(endpoint)
+
+    def cookies(self, viewer):
+        from django.conf import settings
+        return {settings.SESSION_COOKIE_NAME: self.sessions[viewer], settings.CSRF_COOKIE_NAME: self.csrf}
+
+
+def test_client_request(clients, workload, endpoint, i):
+    from django.test import Client
+
+    viewer, method, path, data, expected = workload.request(endpoint, i)
+    client = clients.get(viewer)
+    if client is None:
+        client = clients[viewer] = Client()
+        for name, value in workload.cookies(viewer).items():
+            client.cookies[name] = value
+    response = client.post(path, data) if method == "POST" else client.get(path)
+    if response.status_code != expected:
+        raise AssertionError(f"{endpoint}: {method} {path} returned {response.status_code}, expected {expected}")
+
+
+# --- measurements ---
+
+def percentiles(samples_ms):
+    cuts = statistics.quantiles(samples_ms, n=100, method="inclusive")
+    return {"p50_ms": round(cuts[49], 2), "p95_ms": round(cuts[94], 2), "p99_ms": round(cuts[98], 2)}
+
+
+class ScanCounter:
+    """Rows read by full table (or full index) scans, from EXPLAIN QUERY PLAN and table sizes."""
+
+    PLAN_SCAN = re.compile(r"^SCAN (\w+)(?: USING (?:COVERING )?INDEX \w+)?$")
+    ALIAS = re.compile(r'"(\w+)"\s+(?:AS\s+)?"?([A-Z]\d+)"?\b')
+    EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.plans = {}
+        self.sizes = {}
+
+    def table_size(self, table):
+        if table not in self.sizes:
+            with self.connection.cursor() as cursor:
+                cursor.execute(f'SELECT COUNT(*) FROM "{table}"')
+                self.sizes[table] = cursor.fetchone()[0]
+        return self.sizes[table]
+
+    def rows(self, sql):
+        if not sql.lstrip().upper().startswith(self.EXPLAINABLE):
+            return 0
+        if sql not in self.plans:
+            aliases = dict((alias, table) for table, alias in self.ALIAS.findall(sql))
+            with self.connection.cursor() as cursor:
+                cursor.execute("EXPLAIN QUERY PLAN " + sql)
+                details = [row[3] for row in cursor.fetchall()]
+            scanned = 0
+            for detail in details:
+                match = self.PLAN_SCAN.match(detail)
+                if match:
+                    table = aliases.get(match.group(1), match.group(1))
+                    if table.startswith("Profile_") or table.startswith("django_"):
+                        scanned += self.table_size(table)
+            self.plans[sql] = scanned
+        return self.plans[sql]
+
+
+def profile(workload, endpoint, count, scans):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    clients, queries, rows, steps = {}, 0, 0, [0]
+
+    def on_progress():
+        steps[0] += 1
+        return 0
+
+    connection.ensure_connection()
+    for i in range(count):
+        with CaptureQueriesContext(connection) as captured:
+            connection.connection.set_progress_handler(on_progress, PROGRESS_STEP)
+            try:
+                test_client_request(clients, workload, endpoint, i)
+            finally:
+                connection.connection.set_progress_handler(None, 0)
+        queries += len(captured.captured_queries)
+        rows += sum(scans.rows(query["sql"]) for query in captured.captured_queries)
+    return {
+        "queries": round(queries / count, 2),
+        "rows_scanned": round(rows / count),
+        "vm_steps": steps[0] * PROGRESS_STEP // count,
+    }
+
+
+def latency(workload, endpoint, count, rounds):
+    """Percentiles over ``count`` requests, best of ``rounds`` per percentile to damp scheduler noise."""
+    clients, best = {}, None
+    for _ in range(rounds):
+        samples = []
+        for i in range(count):
+            started = time.perf_counter()
+            test_client_request(clients, workload, endpoint, i)
+            samples.append((time.perf_counter() - started) * 1000)
+        figures = percentiles(samples)
+        best = figures if best is None else {key: min(best[key], figures[key]) for key in figures}
+    return best
+
+
+class ThreadingWSGIServer(socketserver.ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def load(server, workload, endpoint, threads, seconds):
+    host, port = server.server_address
+    deadline = time.monotonic() + seconds
+    samples, errors, lock = [], [], threading.Lock()
+    counter = iter(range(10**9))
+
+    def client():
+        own = []
+        while time.monotonic() < deadline:
+            with lock:
+                i = next(counter)
+            viewer, method, path, data, expected = workload.request(endpoint, i)
+            headers = {"Cookie": "; ".join(f"{k}={v}" for k, v in workload.cookies(viewer).items())}
+            body = None
+            if data is not None:
+                body = urlencode({**data, "csrfmiddlewaretoken": workload.csrf})
+                headers["Content-Type"] = "application/x-www-form-urlencoded"
+            started = time.perf_counter()
+            conn = http.client.HTTPConnection(host, port, timeout=30)
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+            except OSError as exc:
+                status = exc
+            finally:
+                conn.close()
+            own.append((time.perf_counter() - started) * 1000)
+            if status != expected:
+                with lock:
+                    errors.append(f"{method} {path}: {status}")
+        with lock:
+            samples.extend(own)
+
+    workers = [threading.Thread(target=client) for _ in range(threads)]
+    started = time.monotonic()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.monotonic() - started
+    return {"rps": round(len(samples) / elapsed, 1), **percentiles(samples), "errors": len(errors)}, errors[:3]
+
+
+# --- baselines ---
+
+def regressions(result, baseline, threshold):
+    found = []
+    for endpoint, current in result["endpoints"].items():
+        previous = baseline["endpoints"].get(endpoint)
+        if previous is None:
+            continue
+        for metric in RELATIVE:
+            if current[metric] > previous[metric] * (1 + threshold):
+                found.append(f"{endpoint}: {metric} {current[metric]} > baseline {previous[metric]}")
+        if current["queries"] > previous["queries"] + QUERY_SLACK:
+            found.append(f"{endpoint}: queries {current['queries']} > baseline {previous['queries']}")
+    return found
+
+
+def baseline_of(result):
+    endpoints = {
+        endpoint: {metric: figures[metric] for metric in GATED} for endpoint, figures in result["endpoints"].items()
+    }
+    return {**result, "endpoints": endpoints}
+
+
+def run(args, size):
+    database, media = dataset(args, size)
+    setup_django(working_copy(database), media)
+
+    from django.core.wsgi import get_wsgi_application
+    from django.db import connection
+
+    workload = Workload(args.seed)
+    scans = ScanCounter(connection)
+    server = make_server("127.0.0.1", 0, get_wsgi_application(), ThreadingWSGIServer, QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    result = {"size": size, "users": SIZES[size], "seed": args.seed, "endpoints": {}}
+    failures = []
+    print(f"\n{size}: {SIZES[size]:,} users, {args.threads} load threads")
+    print(f"{'endpoint':<14}{'queries':>8}{'rows scanned':>14}{'vm steps':>10}{'p50':>8}{'p95':>8}{'p99':>8}"
+          f"{'load rps':>10}{'load p95':>10}")
+    try:
+        for endpoint in args.endpoint or ENDPOINTS:
+            figures = profile(workload, endpoint, args.profile_requests, scans)
+            figures.update(latency(workload, endpoint, args.requests, args.rounds))
+            figures["load"], errors = load(server, workload, endpoint, args.threads, args.seconds)
+            failures += [f"{endpoint}: {error}" for error in errors]
+            result["endpoints"][endpoint] = figures
+            print(f"{endpoint:<14}{figures['queries']:>8}{figures['rows_scanned']:>14,}{figures['vm_steps']:>10,}"
+                  f"{figures['p50_ms']:>8}{figures['p95_ms']:>8}{figures['p99_ms']:>8}"
+                  f"{figures['load']['rps']:>10}{figures['load']['p95_ms']:>10}")
+    finally:
+        server.shutdown()
+
+    path = os.path.join(BASELINE_DIR, f"{size}.json")
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(path, "w") as handle:
+            json.dump(baseline_of(result), handle, indent=2, sort_keys=True)
+            handle.write("\n")
+        print(f"Saved baseline {os.path.relpath(path, ROOT)}")
+    elif os.path.exists(path):
+        with open(path) as handle:
+            failures += regressions(result, json.load(handle), args.threshold)
+    else:
+        print(f"No baseline at {os.path.relpath(path, ROOT)}; run with --save-baseline to record one.")
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump(result, handle, indent=2, sort_keys=True)
+    return failures
+
+
+def child_argv(args, size):
+    """Command-line arguments that repeat ``args`` for a run of ``size`` alone."""
+    argv = [
+        "--size", size, "--seed", str(args.seed), "--data-dir", args.data_dir,
+        "--profile-requests", str(args.profile_requests), "--requests", str(args.requests),
+        "--rounds", str(args.rounds), "--threads", str(args.threads), "--seconds", str(args.seconds),
+        "--threshold", str(args.threshold),
+    ]
+    for endpoint in args.endpoint or ():
+        argv += ["--endpoint", endpoint]
+    if args.reseed:
+        argv.append("--reseed")
+    if args.save_baseline:
+        argv.append("--save-baseline")
+    if args.output:
+        argv += ["--output", args.output]
+    return argv
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", action="append", choices=sorted(SIZES), help="Repeatable; default small.")
+    parser.add_argument("--endpoint", action="append", choices=ENDPOINTS, help="Repeatable; default all.")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--data-dir", default="/tmp/socialhub-bench")
+    parser.add_argument("--reseed", action="store_true", help="Regenerate the dataset even if it is cached.")
+    parser.add_argument("--profile-requests", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=3, help="Latency rounds; each percentile keeps its best.")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=3)
+    parser.add_argument("--threshold", type=float, default=0.3, help="Allowed relative regression (0.3 = 30%%).")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--output", help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+
+    sizes = args.size or ["small"]
+    if len(sizes) > 1:
+        # Django is configured once per process, so each size runs in its own.
+        failed = False
+        for size in sizes:
+            failed |= subprocess.run([sys.executable, __file__, *child_argv(args, size)]).returncode != 0
+        return 1 if failed else 0
+
+    failures = run(args, sizes[0])
+    if failures:
+        print("\nFAILED:")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+    print("\nOK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
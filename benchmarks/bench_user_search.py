@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark user search: the old ``username__icontains`` + ``Paginator`` path
+against ``Profile.search.search_users``.
+
+Points Django at a scratch SQLite database (never the project database),
+migrates it, loads synthetic users (1,000,000 by default) and times each
+query a few times, reporting the best run.
+
+Run:
+    python benchmarks/bench_user_search.py [--users 1000000] [--db /tmp/search_bench.sqlite3]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "SocialHub.settings")
+
+SYLLABLES = ["al", "be", "cor", "da", "el", "fin", "ga", "han", "is", "jo", "ka", "lu", "mar", "no", "os", "pe", "ri", "sa", "tor", "vi"]
+QUERIES = ["ma", "mar", "marlu", "sator", "kalu", "Fin Jo", "xyz"]
+PAGE_SIZE = 5
+
+
+def fake_word(rng):
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+
+def setup_django(db_path):
+    import django
+    from django.conf import settings
+
+    settings.DATABASES["default"]["NAME"] = db_path
+    django.setup()
+
+
+def load_users(count, seed):
+    from django.core.management import call_command
+    from django.db import connection, transaction
+    from Profile.search import get_backend
+
+    call_command("migrate", verbosity=0)
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    with transaction.atomic(), connection.cursor() as cursor:
+        batch = []
+        for user_id in range(1, count + 1):
+            batch.append((user_id, f"{fake_word(rng)}{user_id}", f"{fake_word(rng).title()} {fake_word(rng).title()}",
+                          "", f"user{user_id}@example.com", "x", "2024-01-01", "2024-01-01", 0, "{}"))
+            if len(batch) == 50_000:
+                cursor.executemany(
+                    "INSERT INTO Profile_user (id, username, name, bio, email, password, created_at, updated_at, friend_count, photo_variants)"
+                    " VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)", batch)
+                batch = []
+        if batch:
+            cursor.executemany(
+                "INSERT INTO Profile_user (id, username, name, bio, email, password, created_at, updated_at, friend_count, photo_variants)"
+                " VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)", batch)
+        get_backend().rebuild()
+    print(f"loaded {count:,} users and rebuilt the search index in {time.perf_counter() - started:.1f}s")
+
+
+def best_of(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Profile user search.")
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--db", default="/tmp/search_bench.sqlite3")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        os.remove(args.db)
+    setup_django(args.db)
+    load_users(args.users, args.seed)
+
+    from django.core.paginator import Paginator
+    from Profile.models import User
+    from Profile.search import search_users
+
+    def old_search(query):
+        page = Paginator(User.objects.filter(username__icontains=query).order_by("username"), PAGE_SIZE).get_page(1)
+        list(page)
+
+    print(f"{'query':<10}{'icontains + count ms':>22}{'search_users ms':>17}")
+    for query in QUERIES:
+        old_ms = best_of(lambda: old_search(query))
+        new_ms = best_of(lambda: list(search_users(query)))
+        print(f"{query:<10}{old_ms:>22.2f}{new_ms:>17.2f}")
+
+
+if __name__ == "__main__":
+    main()
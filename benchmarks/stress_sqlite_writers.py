@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Stress concurrent writers against SQLite: many threads liking, unliking
+and messaging at once, the way a busy server does.
+
+Points Django at a scratch SQLite database (never the project database),
+migrates it, creates users and posts, then runs ``--threads`` workers for
+``--seconds``. Every write either commits or is counted as an error; the
+run fails if any "database is locked" error was raised.
+
+Run with the project profile (Profile.sqlite: WAL, busy_timeout,
+BEGIN IMMEDIATE):
+    python benchmarks/stress_sqlite_writers.py [--threads 16] [--seconds 10]
+
+and against the stock backend for comparison:
+    python benchmarks/stress_sqlite_writers.py --baseline
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "SocialHub.settings")
+
+USERS = 50
+POSTS = 20
+
+
+def setup_django(db_path, baseline):
+    import django
+    from django.conf import settings
+
+    settings.DATABASES["default"]["NAME"] = db_path
+    if baseline:
+        settings.DATABASES["default"]["ENGINE"] = "django.db.backends.sqlite3"
+    # The notification pipeline's background flushes would add writers outside the measured workers.
+    settings.NOTIFICATION_PIPELINE["SYNC"] = True
+    django.setup()
+
+
+def load_fixtures():
+    from django.core.management import call_command
+    from Profile.models import Post, User
+
+    call_command("migrate", verbosity=0)
+    users = User.objects.bulk_create(
+        User(username=f"stress{i}", email=f"stress{i}@example.com", password="x") for i in range(USERS)
+    )
+    posts = Post.objects.bulk_create(Post(user=users[i % USERS], image="posts/p.jpg") for i in range(POSTS))
+    return [u.id for u in users], [p.id for p in posts]
+
+
+def worker(seed, user_ids, post_ids, deadline, results, lock):
+    from django.db import OperationalError, close_old_connections
+    from Profile.models import Message, Post, User
+
+    rng = random.Random(seed)
+    counts = Counter()
+    while time.monotonic() < deadline:
+        user = User(id=rng.choice(user_ids))
+        action = rng.choice(("like", "unlike", "message"))
+        try:
+            if action == "message":
+                receiver = rng.choice(user_ids)
+                Message.objects.create(sender_id=user.id, receiver_id=receiver, text="hi")
+            else:
+                post = Post(id=rng.choice(post_ids))
+                (post.add_like if action == "like" else post.remove_like)(user)
+            counts["ok"] += 1
+        except OperationalError as exc:
+            counts["locked" if "locked" in str(exc) else "other errors"] += 1
+    close_old_connections()
+    with lock:
+        results.update(counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--baseline", action="store_true", help="Use django.db.backends.sqlite3 with no tuning.")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        setup_django(os.path.join(scratch, "stress.sqlite3"), args.baseline)
+        user_ids, post_ids = load_fixtures()
+
+        from django.db import connection
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            journal_mode = cursor.fetchone()[0]
+        connection.close()
+
+        results, lock = Counter(), threading.Lock()
+        deadline = time.monotonic() + args.seconds
+        threads = [
+            threading.Thread(target=worker, args=(args.seed + i, user_ids, post_ids, deadline, results, lock))
+            for i in range(args.threads)
+        ]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+    engine = "django.db.backends.sqlite3" if args.baseline else "Profile.sqlite"
+    print(f"{engine} (journal_mode={journal_mode}), {args.threads} threads, {elapsed:.1f}s")
+    print(f"  committed writes:  {results['ok']:>7}  ({results['ok'] / elapsed:,.0f}/s)")
+    print(f"  'database is locked': {results['locked']:>4}")
+    print(f"  other errors:      {results['other errors']:>7}")
+    return 1 if results["locked"] or results["other errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
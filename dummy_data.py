@@ -1,271 +1,441 @@
 #!/usr/bin/env python3
 """
-Fake data generator for SocialHub.
-
-Creates:
-- Users (writes credentials to generated_users.txt)
-- Posts (images from picsum.photos)
-- Friend links (mutual)
-- Optional followers (if User has a field named 'followers' or 'followings')
-- Random likes, saved posts, comments
-- Random chat messages (Message model)
-- Notifications via Notification model
-
-Run:
-    python dummy_data.py
+Fake data generator for SocialHub, fast enough for load-testing datasets.
+
+Creates, for ``--users`` new users (existing rows are left alone):
+- Users, with avatars and one shared password (credentials go to generated_users.txt)
+- Friendships whose degrees follow a power law (a few hubs, many light users)
+- Posts with images, likes, comments and saved posts
+- Direct-message conversations between friends
+- Notifications, as the notification pipeline would have coalesced them
+- Home timeline entries, the search index and media reference counts
+
+Everything is offline and reproducible from ``--seed`` (timestamps are
+relative to the time of the run). Images are drawn
+with Pillow in a process pool and stored once each through the media
+storage (with their responsive variants); posts and users share them. Rows
+are written with ``bulk_create`` and ``executemany`` through-table inserts, one
+transaction per table, and each phase reports its rows/sec.
+
+Friend pairs are deduplicated in memory, roughly 100 bytes per friendship.
+
+Run (against the database configured in settings / .env, already migrated):
+    python dummy_data.py [--users 1000] [--seed 1]
+    python dummy_data.py --users 1000000 --batch-size 10000
 """
 
+import argparse
+import itertools
 import os
-import django
 import random
 import time
-from faker import Faker
-import urllib.request
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
 from io import BytesIO
-from django.core.files import File
-from django.contrib.auth.hashers import make_password
-
-# --- CONFIGURATION ---
-NUM_USERS = 25                 # number of users to create
-POSTS_PER_USER = 5             # posts per user
-MAX_FRIENDS_PER_USER = 8      # max friends to create per user
-MAX_LIKES_PER_POST = 10       # up to this many likes per post
-MAX_SAVED_PER_USER = 8        # how many posts a user may save
-MAX_COMMENTS_PER_POST = 6     # comments per post
-MAX_MESSAGES_PER_PAIR = 10    # messages exchanged between a friend pair
-OUTPUT_FILE = "generated_users.txt"
-IMAGE_TIMEOUT = 10            # seconds for image downloads
-# -------------------------
-
-# point to your settings module
-os.environ.setdefault("DJANGO_SETTINGS_MODULE", "SocialHub.settings")
-django.setup()
-
-from Profile.models import User, Post, Comment, Message, Notification  # import your models
-
-fake = Faker()
-
-
-def fetch_image_bytes(url):
-    """Return BytesIO or raise."""
-    try:
-        with urllib.request.urlopen(url, timeout=IMAGE_TIMEOUT) as resp:
-            data = resp.read()
-        return BytesIO(data)
-    except Exception as e:
-        print(f"⚠️  Image download failed ({url}): {e}")
-        raise
 
+import django
+from faker import Faker
+from PIL import Image, ImageDraw, ImageFilter
 
-def safe_save_image(model_field, filename, bytes_io):
-    """Save a BytesIO to a model's ImageField/FileField safely."""
-    bytes_io.seek(0)
-    django_file = File(bytes_io)
-    model_field.save(filename, django_file, save=True)
-
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "SocialHub.settings")
 
-def create_notification_safe(sender, receiver, message, link=None):
-    """Create Notification object if model exists and args valid."""
+OUTPUT_FILE = "generated_users.txt"
+PASSWORD = "password123"  # every generated user shares it, so it is hashed once
+
+POST_IMAGE_SIZE = (1200, 800)
+AVATAR_IMAGE_SIZE = (300, 300)
+PHOTO_PROBABILITY = 0.9
+POWER_LAW_EXPONENT = 2.5  # P(degree = k) ~ k^-2.5, typical of social graphs
+NAME_POOL = 5000
+SENTENCE_POOL = 5000
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--posts-per-user", type=float, default=5, help="Mean posts per user.")
+    parser.add_argument("--friends-per-user", type=float, default=10, help="Mean friend count.")
+    parser.add_argument("--max-friends", type=int, default=5000)
+    parser.add_argument("--likes-per-post", type=float, default=8, help="Mean likes per post (heavy-tailed).")
+    parser.add_argument("--comments-per-post", type=float, default=2)
+    parser.add_argument("--saved-per-user", type=float, default=3)
+    parser.add_argument("--conversations-per-user", type=float, default=1)
+    parser.add_argument("--messages-per-conversation", type=float, default=8)
+    parser.add_argument("--days", type=int, default=90, help="Spread activity over this many past days.")
+    parser.add_argument("--post-images", type=int, default=64, help="Distinct post images to draw.")
+    parser.add_argument("--avatars", type=int, default=32, help="Distinct avatars to draw.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Processes drawing images.")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    return parser.parse_args()
+
+
+# --- images (run in worker processes) ---
+
+def draw_image(size, seed):
+    """Return JPEG bytes of an abstract picture: a gradient with translucent shapes."""
+    rng = random.Random(seed)
+    width, height = size
+    top, bottom = (tuple(rng.randrange(256) for _ in range(3)) for _ in range(2))
+    mask = Image.linear_gradient("L").resize(size)
+    image = Image.composite(Image.new("RGB", size, bottom), Image.new("RGB", size, top), mask)
+    overlay = Image.new("RGBA", size)
+    draw = ImageDraw.Draw(overlay)
+    for _ in range(rng.randint(6, 18)):
+        x, y = rng.randrange(width), rng.randrange(height)
+        radius = rng.randint(min(size) // 20, min(size) // 3)
+        fill = tuple(rng.randrange(256) for _ in range(3)) + (rng.randint(80, 200),)
+        shape = draw.ellipse if rng.random() < 0.6 else draw.rectangle
+        shape((x - radius, y - radius, x + radius, y + radius), fill=fill)
+    overlay = overlay.filter(ImageFilter.GaussianBlur(2))
+    image.paste(overlay, mask=overlay)
+    buffer = BytesIO()
+    image.save(buffer, "JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def store_image(job):
+    """Draw one image, save it and its variants through the media storage; return ``(name, variants, size)``."""
+    from django.core.files.base import ContentFile
+    from django.core.files.storage import default_storage
+    from Profile import images
+    from Profile.models import Post, User
+
+    kind, seed = job
+    if kind == "post":
+        name = default_storage.save("posts/generated.jpg", ContentFile(draw_image(POST_IMAGE_SIZE, seed)))
+        variants, size = images.render_variants(Post(image=name).image, images.POST_WIDTHS)
+    else:
+        name = default_storage.save("profile/generated.jpg", ContentFile(draw_image(AVATAR_IMAGE_SIZE, seed)))
+        variants, size = images.render_variants(User(photo=name).photo, images.AVATAR_SIZES, square=True)
+    return name, variants, size
+
+
+# --- helpers ---
+
+class Throughput:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.rows = 0
+
+    @contextmanager
+    def phase(self, label):
+        counter = Counter()
+        started = time.perf_counter()
+        yield counter
+        elapsed = time.perf_counter() - started
+        rows = sum(counter.values())
+        self.rows += rows
+        detail = ", ".join(f"{count:,} {table}" for table, count in counter.items())
+        rate = f"{rows / elapsed:,.0f} rows/s" if rows else ""
+        print(f"  {label:<14} {elapsed:7.1f}s  {rate:>16}  {detail}")
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.started
+        print(f"  {'total':<14} {elapsed:7.1f}s  {self.rows / elapsed:>9,.0f} rows/s  {self.rows:,} rows")
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+def insert(model, rows, batch_size):
+    """``bulk_create`` an iterable of unsaved instances in batches; return how many were written."""
+    written = 0
+    for batch in chunks(rows, batch_size):
+        model.objects.bulk_create(batch, batch_size=batch_size)
+        written += len(batch)
+    return written
+
+
+def insert_links(through, fields, pairs, batch_size):
+    """
+    Insert ``(id, id)`` tuples into a many-to-many through table with
+    ``executemany``; return how many were written. Link rows have no logic
+    of their own, so this skips building a model instance per row, which
+    costs more than the insert itself.
+    """
+    from django.db import connection
+
+    quote = connection.ops.quote_name
+    columns = ", ".join(quote(through._meta.get_field(name).column) for name in fields)
+    sql = f"INSERT INTO {quote(through._meta.db_table)} ({columns}) VALUES (%s, %s)"
+    written = 0
+    with connection.cursor() as cursor:
+        for batch in chunks(pairs, batch_size):
+            cursor.executemany(sql, batch)
+            written += len(batch)
+    return written
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Keep the ``created_at`` values the generator sets instead of letting ``auto_now_add`` overwrite them."""
+    fields = [field for model in models for field in model._meta.concrete_fields if getattr(field, "auto_now_add", False)]
+    for field in fields:
+        field.auto_now_add = False
     try:
-        # ensure sender/receiver are model instances
-        if not (hasattr(sender, "id") and hasattr(receiver, "id")):
-            return
-        Notification.objects.create(sender=sender, receiver=receiver, message=message, link=link)
-    except Exception as e:
-        print(f"⚠️  Failed to create notification: {e}")
-
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def heavy_tailed(rng, mean, exponent=POWER_LAW_EXPONENT, maximum=None):
+    """A Pareto draw with the given mean, rounded down."""
+    shape = exponent - 1
+    value = int(mean * (shape - 1) / shape * rng.paretovariate(shape))
+    return min(value, maximum) if maximum is not None else value
+
+
+def friend_pairs(rng, count, mean_degree, max_degree):
+    """
+    Sample a Chung-Lu graph: each node draws a power-law target degree and
+    edge endpoints are picked in proportion to it, so the realized degrees
+    follow the same distribution. Returns sorted ``(low, high)`` node index
+    pairs with no self-loops or duplicates.
+    """
+    weights = [max(1, heavy_tailed(rng, mean_degree, maximum=max_degree)) for _ in range(count)]
+    cumulative = list(itertools.accumulate(weights))
+    wanted = min(cumulative[-1] // 2, count * (count - 1) // 2)
+    encoded = set()
+    while len(encoded) < wanted:
+        batch = min(1_000_000, 2 * (wanted - len(encoded)))
+        ends = rng.choices(range(count), cum_weights=cumulative, k=batch)
+        for a, b in zip(ends[::2], ends[1::2]):
+            if a != b:
+                encoded.add(a * count + b if a < b else b * count + a)
+                if len(encoded) == wanted:
+                    break
+    return [divmod(code, count) for code in sorted(encoded)]
+
+
+# --- generation ---
 
 def main():
-    print("🔁 Starting fake data generator...")
+    args = parse_args()
+    django.setup()
+
+    from django.contrib.auth.hashers import make_password
+    from django.db import connection, connections, transaction
+    from django.db.models import F, Max
+    from django.utils import timezone
+
+    from Profile.models import (
+        Comment, Conversation, Message, Notification, Post, StoredFile, TimelineEntry, User,
+    )
+    from Profile.notifications import describe
+    from Profile.search import get_backend, get_post_backend
+    from Profile.timeline import TIMELINE_FANOUT_LIMIT
+
+    rng = random.Random(args.seed)
+    Faker.seed(args.seed)
+    fake = Faker()
+    report = Throughput()
+    now = timezone.now()
+    span = args.days * 86400
+
+    print(f"Generating {args.users:,} users (seed {args.seed})...")
+
+    with report.phase("images") as rows:
+        jobs = [("post", args.seed * 1_000_003 + i) for i in range(args.post_images)]
+        jobs += [("avatar", args.seed * 1_000_033 + i) for i in range(args.avatars)]
+        connections.close_all()  # forked workers must not share the parent's connection
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=django.setup) as pool:
+            stored = list(pool.map(store_image, jobs))
+        post_images, avatars = stored[:args.post_images], stored[args.post_images:]
+        rows["images"] = len(stored)
+    media_refs = Counter()
+
+    def use_image(image):
+        name, variants, _ = image
+        media_refs[name] += 1
+        for group in variants.values():
+            media_refs.update(group.values())
+
+    with report.phase("friend graph") as rows:
+        pairs = friend_pairs(rng, args.users, args.friends_per_user, min(args.max_friends, args.users - 1))
+        degrees = [0] * args.users
+        for a, b in pairs:
+            degrees[a] += 1
+            degrees[b] += 1
+        rows["pairs"] = len(pairs)
+
+    first_user = (User.objects.aggregate(last=Max("id"))["last"] or 0) + 1
+    handles = [fake.user_name() for _ in range(NAME_POOL)]
+    names = [fake.name() for _ in range(NAME_POOL)]
+    sentences = [fake.sentence(nb_words=rng.randint(4, 16)) for _ in range(SENTENCE_POOL)]
+    password = make_password(PASSWORD)
+    usernames = [f"{rng.choice(handles)}{first_user + i}" for i in range(args.users)]
+    joined = [rng.uniform(86400, span) for _ in range(args.users)]  # seconds before now
+
+    def user_rows():
+        for i, username in enumerate(usernames):
+            photo = {}
+            if rng.random() < PHOTO_PROBABILITY:
+                avatar = rng.choice(avatars)
+                use_image(avatar)
+                photo = {"photo": avatar[0], "photo_variants": avatar[1]}
+            yield User(
+                id=first_user + i, username=username, name=rng.choice(names), bio=rng.choice(sentences),
+                email=f"{username.lower()}@example.com", password=password, friend_count=degrees[i],
+                created_at=now - timedelta(seconds=joined[i]), **photo,
+            )
+
+    with report.phase("users") as rows, transaction.atomic(), explicit_timestamps(User):
+        rows["users"] = insert(User, user_rows(), args.batch_size)
+
+    Friendship = User.friends.through
+    with report.phase("friendships") as rows, transaction.atomic():
+        rows["friend rows"] = insert_links(Friendship, ("from_user", "to_user"), (
+            (first_user + x, first_user + y) for a, b in pairs for x, y in ((a, b), (b, a))
+        ), args.batch_size)
+
+    first_post = (Post.objects.aggregate(last=Max("id"))["last"] or 0) + 1
+    post_counts = [rng.randint(0, int(2 * args.posts_per_user)) for _ in range(args.users)]
+    total_posts = sum(post_counts)
+
+    def post_rows(counts):
+        post_id = first_post
+        for author, count in enumerate(counts):
+            author_id = first_user + author
+            for _ in range(count):
+                age = rng.uniform(0, joined[author])
+                created_at = now - timedelta(seconds=age)
+                image = rng.choice(post_images)
+                use_image(image)
+                likers = rng.sample(range(args.users), heavy_tailed(rng, args.likes_per_post, maximum=args.users))
+                likers = [u for u in likers if u != author]
+                commenters = rng.choices(range(args.users), k=rng.randint(0, int(2 * args.comments_per_post)))
+                post = Post(
+                    id=post_id, user_id=author_id, image=image[0], image_variants=image[1],
+                    image_width=image[2][0], image_height=image[2][1], description=rng.choice(sentences),
+                    created_at=created_at, like_count=len(likers), comment_count=len(commenters),
+                )
+                likes = [(post_id, first_user + u) for u in likers]
+                comments = [
+                    Comment(post_id=post_id, user_id=first_user + u, text=rng.choice(sentences),
+                            created_at=created_at + timedelta(seconds=rng.uniform(0, age)))
+                    for u in commenters
+                ]
+                # One row per (post, verb), as the pipeline coalesces them; the latest actor is the sender.
+                notes = []
+                for verb, actors in (
+                    ("liked your post", likers),
+                    ("commented on your post", list(dict.fromkeys(u for u in commenters if u != author))),
+                ):
+                    if actors:
+                        notes.append(Notification(
+                            sender_id=first_user + actors[-1], receiver_id=author_id, link=f"/post/{post_id}/",
+                            verb=verb, actor_count=len(actors), message=describe(usernames[actors[-1]], len(actors), verb),
+                            is_read=rng.random() < 0.7, created_at=created_at + timedelta(seconds=rng.uniform(0, age)),
+                        ))
+                yield post, likes, comments, notes
+                post_id += 1
+
+    with report.phase("posts") as rows, transaction.atomic(), explicit_timestamps(Post, Comment, Notification):
+        for batch in chunks(post_rows(post_counts), args.batch_size):
+            posts, likes, comments, notes = zip(*batch)
+            rows["posts"] += insert(Post, posts, args.batch_size)
+            rows["likes"] += insert_links(
+                Post.likes.through, ("post", "user"), itertools.chain.from_iterable(likes), args.batch_size,
+            )
+            rows["comments"] += insert(Comment, itertools.chain.from_iterable(comments), args.batch_size)
+            rows["notifications"] += insert(Notification, itertools.chain.from_iterable(notes), args.batch_size)
+
+    Saved = User.saved_posts.through
+    with report.phase("saved posts") as rows, transaction.atomic():
+        rows["saved rows"] = insert_links(Saved, ("user", "post"), (
+            (first_user + user, first_post + post)
+            for user in range(args.users)
+            for post in rng.sample(range(total_posts), min(total_posts, rng.randint(0, int(2 * args.saved_per_user))))
+        ), args.batch_size)
+
+    first_conversation = (Conversation.objects.aggregate(last=Max("id"))["last"] or 0) + 1
+    chosen = sorted(rng.sample(range(len(pairs)), min(len(pairs), int(args.users * args.conversations_per_user))))
+
+    def conversation_rows():
+        for offset, index in enumerate(chosen):
+            low, high = pairs[index]
+            conversation_id = first_conversation + offset
+            started = rng.uniform(0, min(joined[low], joined[high]))
+            count = rng.randint(1, max(1, int(2 * args.messages_per_conversation) - 1))
+            ages = sorted((rng.uniform(0, started) for _ in range(count)), reverse=True)
+            messages = []
+            for age in ages:
+                sender, receiver = (low, high) if rng.random() < 0.5 else (high, low)
+                messages.append(Message(
+                    conversation_id=conversation_id, sender_id=first_user + sender, receiver_id=first_user + receiver,
+                    text=rng.choice(sentences), is_read=age > 3600 or rng.random() < 0.5,
+                    created_at=now - timedelta(seconds=age),
+                ))
+            last = messages[-1]
+            yield Conversation(
+                id=conversation_id, low_user_id=first_user + low, high_user_id=first_user + high,
+                created_at=messages[0].created_at,
+            ), messages, Notification(
+                sender_id=last.sender_id, receiver_id=last.receiver_id, verb="sent you a message",
+                link=f"/messages/?chat={last.sender_id}", is_read=last.is_read, created_at=last.created_at,
+                message=describe(usernames[last.sender_id - first_user], 1, "sent you a message"),
+            )
+
+    with report.phase("messages") as rows, transaction.atomic(), explicit_timestamps(Conversation, Message, Notification):
+        for batch in chunks(conversation_rows(), args.batch_size):
+            conversations, messages, notes = zip(*batch)
+            rows["conversations"] += insert(Conversation, conversations, args.batch_size)
+            rows["messages"] += insert(Message, itertools.chain.from_iterable(messages), args.batch_size)
+            rows["notifications"] += insert(Notification, notes, args.batch_size)
+
+    # Fan-out on write, done in the database: each new post goes to its
+    # author's timeline and, unless the author is over the fan-out limit,
+    # to every friend's. Set-based INSERT ... SELECT instead of per-post bulk_create.
+    quote = connection.ops.quote_name
+    timeline, post, friends, user = (
+        quote(model._meta.db_table) for model in (TimelineEntry, Post, Friendship, User)
+    )
+    with report.phase("timelines") as rows, transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {timeline} (owner_id, post_id, author_id, created_at)"
+            f" SELECT p.user_id, p.id, p.user_id, p.created_at FROM {post} p WHERE p.id >= %s",
+            [first_post],
+        )
+        rows["timeline entries"] += cursor.rowcount
+        cursor.execute(
+            f"INSERT INTO {timeline} (owner_id, post_id, author_id, created_at)"
+            f" SELECT f.to_user_id, p.id, p.user_id, p.created_at FROM {post} p"
+            f" JOIN {friends} f ON f.from_user_id = p.user_id"
+            f" JOIN {user} u ON u.id = p.user_id"
+            f" WHERE p.id >= %s AND u.friend_count <= %s",
+            [first_post, TIMELINE_FANOUT_LIMIT],
+        )
+        rows["timeline entries"] += cursor.rowcount
+
+    with report.phase("search index") as rows, transaction.atomic():
+        get_backend().rebuild()
+        get_post_backend().rebuild()
+        rows["indexed"] = args.users + total_posts
+
+    # Each image was saved once, which took one reference; account for the rest.
+    with report.phase("media refs") as rows, transaction.atomic():
+        by_delta = {}
+        for name, count in media_refs.items():
+            by_delta.setdefault(count - 1, []).append(name)
+        by_delta.pop(0, None)
+        for delta, names in by_delta.items():
+            for batch in chunks(names, 500):
+                rows["stored files"] += StoredFile.objects.filter(name__in=batch).update(refcount=F("refcount") + delta)
 
-    # wipe or create output file
     with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
         f.write("=== Generated User Accounts ===\n\n")
+        f.write("".join(f"Username: {username} | Password: {PASSWORD}\n" for username in usernames))
+
+    report.summary()
+    print(f"Credentials saved to {OUTPUT_FILE}")
 
-    created_users = []
-
-    # Create users
-    print(f"👥 Creating {NUM_USERS} users...")
-    for i in range(NUM_USERS):
-        # ensure unique-ish usernames
-        base = fake.user_name()
-        username = f"{base}{random.randint(100,999)}"
-        name = fake.name()
-        email = fake.unique.email()
-        raw_password = "password123"  # default password for generated users
-        hashed_password = make_password(raw_password)
-        bio = fake.sentence(nb_words=12)
-
-        # Download profile image
-        image_url = f"https://picsum.photos/seed/user{random.randint(1,10000)}/300"
-        try:
-            img_bytes = fetch_image_bytes(image_url)
-        except Exception:
-            img_bytes = None
-
-        # create user instance
-        user = User(username=username, name=name, bio=bio, email=email, password=hashed_password)
-        user.save()  # must save before saving image to field
-
-        if img_bytes:
-            try:
-                safe_save_image(user.photo, f"{username}.jpg", img_bytes)
-            except Exception as e:
-                print(f"⚠️ Could not save photo for {username}: {e}")
-
-        created_users.append((user, raw_password))
-
-        # write credentials to file
-        with open(OUTPUT_FILE, "a", encoding="utf-8") as f:
-            f.write(f"Username: {username} | Password: {raw_password}\n")
-
-    print(f"✅ Created {len(created_users)} users. Credentials saved to {OUTPUT_FILE}")
-
-    # Create posts
-    print("🖼️ Creating posts for each user...")
-    created_posts = []
-    for user, _ in created_users:
-        for _ in range(POSTS_PER_USER):
-            description = fake.sentence(nb_words=15)
-            post = Post(user=user, description=description)
-            post.save()
-
-            # fetch image and attach
-            post_img_url = f"https://picsum.photos/seed/post{random.randint(1,100000)}/1200/800"
-            try:
-                img_bytes = fetch_image_bytes(post_img_url)
-                safe_save_image(post.image, f"{user.username}_post_{random.randint(1,10000)}.jpg", img_bytes)
-            except Exception:
-                # if image fails, continue with a blank or existing placeholder
-                pass
-
-            created_posts.append(post)
-
-    print(f"✅ Created {len(created_posts)} posts.")
-
-    # Friend linking (mutual)
-    print("🤝 Creating friend relationships...")
-    users_only = [u for u, p in created_users]
-    for user in users_only:
-        possible = [u for u in users_only if u != user]
-        num_friends = random.randint(0, min(MAX_FRIENDS_PER_USER, len(possible)))
-        chosen = random.sample(possible, num_friends)
-        for friend in chosen:
-            try:
-                # use add() on M2M
-                user.friends.add(friend)
-                # if symmetrical=False on your model, also add reverse
-                # but if symmetrical=True, adding once is enough
-                # to be safe, attempt both
-                try:
-                    friend.friends.add(user)
-                except Exception:
-                    pass
-            except Exception as e:
-                print(f"⚠️ Couldn't add friend {friend} to {user}: {e}")
-
-    print("✅ Friends created (random).")
-
-    # Followers (optional): check if user has followers/followings attribute
-    supports_followers = any(hasattr(User, attr) for attr in ("followers", "followings", "following"))
-    if supports_followers:
-        print("👀 Creating follower relationships (detected follower field)...")
-        for user in users_only:
-            others = [u for u in users_only if u != user]
-            num_followers = random.randint(0, min(10, len(others)))
-            chosen = random.sample(others, num_followers)
-            for follower in chosen:
-                try:
-                    # prefer .followers.add(follower) if exists
-                    if hasattr(user, "followers"):
-                        user.followers.add(follower)
-                    elif hasattr(user, "followings"):
-                        user.followings.add(follower)
-                    elif hasattr(user, "following"):
-                        user.following.add(follower)
-                except Exception as e:
-                    print(f"⚠️ Couldn't add follower {follower} -> {user}: {e}")
-        print("✅ Followers created.")
-    else:
-        print("ℹ️ No followers/followings field detected on User model; skipping followers creation.")
-
-    # Random likes on posts
-    print("❤️ Adding random likes to posts...")
-    for post in created_posts:
-        num_likes = random.randint(0, min(MAX_LIKES_PER_POST, len(users_only)))
-        likers = random.sample(users_only, num_likes)
-        for liker in likers:
-            try:
-                post.likes.add(liker)
-                # create notification to post owner (if liker not owner)
-                if post.user != liker:
-                    create_notification_safe(sender=liker, receiver=post.user, message=f"{liker.username} liked your post", link=f"/post/{post.id}/")
-            except Exception as e:
-                print(f"⚠️ Couldn't add like by {liker} to post {post.id}: {e}")
-
-    print("✅ Likes added.")
-
-    # Random saved posts per user
-    print("🔖 Saving random posts for users...")
-    for user, _ in created_users:
-        # choose up to MAX_SAVED_PER_USER random posts
-        num_save = random.randint(0, min(MAX_SAVED_PER_USER, len(created_posts)))
-        to_save = random.sample(created_posts, num_save)
-        for p in to_save:
-            try:
-                user.saved_posts.add(p)
-            except Exception as e:
-                print(f"⚠️ Couldn't save post {p.id} for {user.username}: {e}")
-    print("✅ Saved posts created.")
-
-    # Random comments
-    print("💬 Creating random comments on posts...")
-    for post in created_posts:
-        num_comments = random.randint(0, MAX_COMMENTS_PER_POST)
-        commenters = random.choices(users_only, k=num_comments)
-        for commenter in commenters:
-            text = fake.sentence(nb_words=random.randint(3, 20))
-            try:
-                Comment.objects.create(post=post, user=commenter, text=text)
-                if post.user != commenter:
-                    create_notification_safe(sender=commenter, receiver=post.user, message=f"{commenter.username} commented on your post", link=f"/post/{post.id}/")
-            except Exception as e:
-                print(f"⚠️ Couldn't create comment by {commenter} on post {post.id}: {e}")
-
-    print("✅ Comments created.")
-
-    # Random chat messages between friend pairs
-    print("✉️ Creating random chat messages between friends...")
-    # Build pairs from friendships
-    for user in users_only:
-        # get friends queryset (if it's a manager)
-        try:
-            friends_qs = list(user.friends.all())
-        except Exception:
-            friends_qs = []
-        for friend in friends_qs:
-            # To avoid duplicating pairs twice, ensure lexical ordering
-            if user.id >= friend.id:
-                continue
-            num_msgs = random.randint(0, MAX_MESSAGES_PER_PAIR)
-            if num_msgs == 0:
-                continue
-            # simulate a conversation
-            for _ in range(num_msgs):
-                sender = random.choice([user, friend])
-                receiver = friend if sender == user else user
-                text = fake.sentence(nb_words=random.randint(1, 30))
-                try:
-                    Message.objects.create(sender=sender, receiver=receiver, text=text)
-                    # notify receiver
-                    create_notification_safe(sender=sender, receiver=receiver, message=f"{sender.username} sent you a message", link=f"/messages/?chat={sender.id}")
-                except Exception as e:
-                    print(f"⚠️ Couldn't create message {sender}->{receiver}: {e}")
-
-    print("✅ Messages created.")
-
-    print("🎉 Fake data generation complete!")
-    print(f"➡️ Credentials: open {OUTPUT_FILE}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,41 @@
+document.addEventListener("socialhub:message", (event) => {
+    const body = document.getElementById("chat-body");
+    const msg = event.detail.message;
+    const me = Number(document.body.dataset.userId);
+    const chatWith = body ? Number(body.dataset.chatWith) : null;
+    const other = msg.sender_id === me ? msg.receiver_id : msg.sender_id;
+
+    if (other !== chatWith) {
+        const badge = document.querySelector(`[data-friend-id="${other}"] .unread-badge`);
+        if (badge && msg.sender_id !== me) {
+            badge.textContent = (parseInt(badge.textContent, 10) || 0) + 1;
+            badge.classList.remove("d-none");
+        }
+        return;
+    }
+
+    const mine = msg.sender_id === me;
+    const row = document.createElement("div");
+    row.className = "d-flex mb-3 " + (mine ? "justify-content-end" : "justify-content-start");
+    const bubble = document.createElement("div");
+    bubble.className = "p-3 rounded shadow-sm " + (mine ? "bg-primary text-white" : "bg-white text-dark");
+    bubble.style.maxWidth = "75%";
+    const author = document.createElement("div");
+    author.className = "small fw-bold mb-1";
+    author.textContent = "@" + msg.sender_username;
+    const text = document.createElement("div");
+    text.className = "mb-1";
+    text.textContent = msg.text;
+    bubble.append(author, text);
+    if (msg.attachment) {
+        const link = document.createElement("a");
+        link.href = msg.attachment;
+        link.download = "";
+        link.className = "text-decoration-none";
+        link.textContent = "Attachment";
+        bubble.append(link);
+    }
+    row.append(bubble);
+    body.append(row);
+    body.scrollTop = body.scrollHeight;
+});
@@ -0,0 +1,38 @@
+function copyPostLink(url) {
+    navigator.clipboard.writeText(new URL(url, location.href).href);
+    alert("Post link copied to clipboard!");
+}
+
+// Cached post cards carry absolute timestamps; show them relative to now.
+(function showTimesince() {
+    const format = new Intl.RelativeTimeFormat(undefined, {numeric: "auto"});
+    const units = [["year", 31536000], ["month", 2592000], ["week", 604800], ["day", 86400], ["hour", 3600], ["minute", 60]];
+    document.querySelectorAll("time.timesince").forEach((node) => {
+        const seconds = (Date.parse(node.dateTime) - Date.now()) / 1000;
+        const [unit, size] = units.find(([, size]) => Math.abs(seconds) >= size) || ["second", 1];
+        node.title = node.textContent;
+        node.textContent = format.format(Math.round(seconds / size), unit);
+    });
+})();
+
+// Live updates pushed from /ws/; pages listen for "socialhub:<type>" events.
+if (document.body.dataset.realtime === "on") {
+    (function connect(delay) {
+        if (!("WebSocket" in window)) return;
+        const scheme = location.protocol === "https:" ? "wss://" : "ws://";
+        const socket = new WebSocket(scheme + location.host + "/ws/");
+        socket.onopen = () => { delay = 1000; };
+        socket.onmessage = (event) => {
+            const data = JSON.parse(event.data);
+            if (data.type === "notifications") {
+                const badge = document.getElementById("notification-badge");
+                badge.textContent = data.unread;
+                badge.classList.toggle("d-none", data.unread === 0);
+            }
+            document.dispatchEvent(new CustomEvent("socialhub:" + data.type, {detail: data}));
+        };
+        socket.onclose = (event) => {
+            if (event.code !== 4401) setTimeout(() => connect(Math.min(delay * 2, 30000)), delay);
+        };
+    })(1000);
+}